@@ -0,0 +1,247 @@
+"""
+Microbenchmarks of FileNameMatch, which parses and compares every library
+ name in the inner loops of a workspace scan.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_file_name --output file_name.json
+
+File names are drawn at random (with a fixed seed) from a mix like that of a
+ production folder: released eggs with and without -py3.x tags, jars,
+ SNAPSHOT builds with and without branch names, and names which cannot be
+ parsed. Each benchmark is timed over the whole list a number of times, and
+ the best and median times per operation are reported.
+"""
+import json
+import logging
+import platform
+import random
+import statistics
+import timeit
+
+import click
+
+from stork._version import __version__
+from stork.file_name import FileNameError, FileNameMatch
+
+logger = logging.getLogger(__name__)
+
+# share of each kind of file name, and how to make one from a library name
+#  and version
+NAME_KINDS = (
+    (0.35, 'egg-py', '{}-{}-py3.{}.egg'),
+    (0.10, 'egg', '{}-{}.egg'),
+    (0.20, 'jar', '{}-{}.jar'),
+    (0.05, 'snapshot-egg', '{}-{}-SNAPSHOT-py3.{}.egg'),
+    (0.05, 'snapshot-jar', '{}-{}-SNAPSHOT.jar'),
+    (0.10, 'branch-egg', '{}-{}-SNAPSHOT-my-branch-py3.{}.egg'),
+    (0.05, 'unparsable-version', '{}-{}.egg'),
+    (0.10, 'not-a-library', '{}-{}-py3.{}.whl'),
+)
+
+
+def make_file_names(size, seed=0):
+    """
+    random mix of size library file names, following NAME_KINDS
+
+    Returns
+    -------
+    list of (kind, file name) tuples
+    """
+    rng = random.Random(seed)
+    weights = [kind[0] for kind in NAME_KINDS]
+    names = []
+    for _, kind, template in rng.choices(
+        NAME_KINDS,
+        weights=weights,
+        k=size,
+    ):
+        library = 'library_{}'.format(rng.randrange(200))
+        if kind == 'unparsable-version':
+            version = '{}.{}'.format(rng.randrange(5), rng.randrange(20))
+        else:
+            version = '{}.{}.{}'.format(
+                rng.randrange(5),
+                rng.randrange(20),
+                rng.randrange(20),
+            )
+        names.append((
+            kind,
+            template.format(library, version, rng.randrange(6, 12)),
+        ))
+    return names
+
+
+def _parse_each(file_names):
+    for file_name in file_names:
+        try:
+            FileNameMatch(file_name)
+        except FileNameError:
+            pass
+
+
+def _replace_version_pairs(pairs):
+    for new, old in pairs:
+        new.replace_version(old, logger)
+
+
+def _eq_pairs(pairs):
+    for a, b in pairs:
+        a == b
+
+
+def _hash_each(matches):
+    for match in matches:
+        hash(match)
+
+
+def make_benchmarks(size, seed=0):
+    """
+    benchmarks over size file names
+
+    Returns
+    -------
+    dictionary mapping the name of each benchmark to a tuple of a function
+     of no arguments and the number of operations it carries out, which is 0
+     if size is too small to make any (e.g. no library has two versions in
+     the same major version to compare)
+    """
+    rng = random.Random(seed)
+    file_names = [name for kind, name in make_file_names(size, seed)]
+    matches = [
+        match for name, match, reason in FileNameMatch.parse_many(file_names)
+        if match is not None
+    ]
+    by_group = {}
+    for match in matches:
+        by_group.setdefault(
+            (match.library_name, match.major_version),
+            [],
+        ).append(match)
+    groups = [group for group in by_group.values() if len(group) > 1]
+    # versions of the same library and major version, which compare minor
+    #  versions - the path taken for every library a release may replace
+    same_group = [
+        tuple(rng.sample(rng.choice(groups), 2)) for _ in matches
+    ] if groups else []
+    # any two libraries, most of which differ by name
+    any_pair = [(rng.choice(matches), rng.choice(matches)) for _ in matches]
+    # the same version parsed from another copy of its file name
+    equal = [(match, FileNameMatch(match.filename)) for match in matches]
+    return {
+        'parse': (lambda: _parse_each(file_names), len(file_names)),
+        'parse_many': (
+            lambda: FileNameMatch.parse_many(file_names),
+            len(file_names),
+        ),
+        'replace_version_same_group': (
+            lambda: _replace_version_pairs(same_group),
+            len(same_group),
+        ),
+        'replace_version_any': (
+            lambda: _replace_version_pairs(any_pair),
+            len(any_pair),
+        ),
+        'eq_equal': (lambda: _eq_pairs(equal), len(equal)),
+        'eq_any': (lambda: _eq_pairs(any_pair), len(any_pair)),
+        'hash': (lambda: _hash_each(matches), len(matches)),
+    }
+
+
+def run_benchmark(func, operations, repeat):
+    """
+    time func repeat times
+
+    Returns
+    -------
+    dictionary with the number of operations per run, the best and median
+     nanoseconds per operation, and operations per second at the best time
+    """
+    times = timeit.Timer(func).repeat(repeat=repeat, number=1)
+    best = min(times)
+    return {
+        'operations': operations,
+        'best_ns': best / operations * 1e9,
+        'median_ns': statistics.median(times) / operations * 1e9,
+        'ops_per_second': operations / best,
+    }
+
+
+@click.command()
+@click.option(
+    '--size',
+    default=10000,
+    help='number of file names',
+)
+@click.option(
+    '--repeat',
+    default=7,
+    help='number of times each benchmark is run',
+)
+@click.option(
+    '--seed',
+    default=0,
+    help='seed of the random file names',
+)
+@click.option(
+    '-b',
+    '--benchmark',
+    'benchmarks',
+    multiple=True,
+    help='benchmark to run (repeat for several) - all by default',
+)
+@click.option(
+    '--output',
+    type=click.Path(dir_okay=False),
+    help='save the results to this JSON file',
+)
+def main(size, repeat, seed, benchmarks, output):
+    """
+    run the FileNameMatch microbenchmarks
+    """
+    available = make_benchmarks(size, seed)
+    unknown = set(benchmarks) - set(available)
+    if unknown:
+        raise click.UsageError('unknown benchmarks: {}'.format(
+            ', '.join(sorted(unknown))
+        ))
+    click.echo('{:<28} {:>16} {:>16} {:>17}'.format(
+        'benchmark', 'best', 'median', 'best throughput',
+    ))
+    results = {}
+    for name in benchmarks or list(available):
+        func, operations = available[name]
+        if operations == 0:
+            click.echo('{:<28} skipped: nothing to run with --size {}'
+                       .format(name, size))
+            continue
+        results[name] = run_benchmark(func, operations, repeat)
+        click.echo('{:<28} {:>10.0f} ns/op {:>10.0f} ns/op {:>12,.0f} op/s'
+                   .format(
+                       name,
+                       results[name]['best_ns'],
+                       results[name]['median_ns'],
+                       results[name]['ops_per_second'],
+                   ))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(
+                {
+                    'stork_version': __version__,
+                    'python_version': platform.python_version(),
+                    'python_implementation': platform.python_implementation(),
+                    'machine': platform.machine(),
+                    'size': size,
+                    'repeat': repeat,
+                    'seed': seed,
+                    'results': results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+"""
+End-to-end benchmarks of stork against a generated workspace served by
+ tests/fake_databricks.py, over a grid of workspace sizes and latencies.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_workspace              # quick grid
+    python -m benchmarks.bench_workspace --grid full  # up to 50,000 jobs
+
+Each case reports the wall time, the number of requests the server received
+ (retries included) and the peak memory allocated by stork, and is compared
+ with benchmarks/baseline.json: the run fails if a case sends more requests
+ than its baseline, or is slower or uses more memory by more than the
+ tolerance. The server runs in its own process, so neither its time nor its
+ memory is counted.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest import mock
+
+import click
+
+from stork.api_client import APIClient, DEFAULT_POOL_SIZE
+from stork.file_name import FileNameMatch
+from stork.rate_limiter import FAMILIES, RateLimiter
+from stork.update_databricks_library import (
+    delete_old_versions,
+    get_job_list,
+    get_library_mapping,
+    update_databricks,
+)
+from tests.fake_databricks import (
+    DEFAULT_PROD_FOLDER,
+    FakeDatabricks,
+    FakeWorkspace,
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+GRIDS = {
+    'quick': {
+        'jobs': (100, 1000),
+        'libraries': (100, 500),
+        'latencies': (0.01,),
+    },
+    'full': {
+        'jobs': (100, 1000, 10000, 50000),
+        'libraries': (100, 1000, 5000),
+        'latencies': (0, 0.01, 0.05),
+    },
+}
+
+# a new version of the first library in the synthetic workspace, which has
+#  versions 1.0.0 to 1.0.4
+RELEASE = 'library_0-1.0.5-py3.6.egg'
+
+# differences smaller than these are noise, whatever the tolerance
+MIN_SECONDS_CHANGE = 0.05
+MIN_MEMORY_CHANGE = 256 * 1024
+
+logger = logging.getLogger(__name__)
+_CONTEXT = multiprocessing.get_context('spawn')
+
+
+def _serve(conn, n_jobs, n_libraries, latency):
+    """
+    serve a synthetic workspace until told to stop, answering each other
+     message with the number of requests received so far
+    """
+    workspace = FakeWorkspace.synthetic(n_jobs, n_libraries)
+    with FakeDatabricks(workspace, latency=latency) as server:
+        conn.send(server.url)
+        while conn.recv() is not None:
+            conn.send(server.count())
+
+
+class _Server(object):
+    """
+    a FakeDatabricks server in a child process
+    """
+    def __init__(self, n_jobs, n_libraries, latency):
+        self._conn, child = _CONTEXT.Pipe()
+        self._process = _CONTEXT.Process(
+            target=_serve,
+            args=(child, n_jobs, n_libraries, latency),
+            daemon=True,
+        )
+        self._process.start()
+        self.url = self._conn.recv()
+
+    def count(self):
+        self._conn.send('count')
+        return self._conn.recv()
+
+    def stop(self):
+        self._conn.send(None)
+        self._process.join()
+
+
+@contextmanager
+def _server(case):
+    server = _Server(case['jobs'], case['libraries'], case['latency'])
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+def _client(server, case):
+    # with the same rate limits as update_databricks
+    return APIClient(
+        server.url,
+        '',
+        pool_size=max(case['workers'], DEFAULT_POOL_SIZE),
+        rate_limiter=RateLimiter(
+            {family: case['rate_limit'] for family in FAMILIES}
+        ),
+    )
+
+
+def _get_library_mapping(server, case, tmp_dir):
+    client = _client(server, case)
+    return lambda: get_library_mapping(
+        logger,
+        DEFAULT_PROD_FOLDER,
+        client,
+        max_workers=case['workers'],
+    )
+
+
+def _get_job_list(server, case, tmp_dir):
+    client = _client(server, case)
+    library_map, _ = get_library_mapping(
+        logger,
+        DEFAULT_PROD_FOLDER,
+        client,
+        max_workers=case['workers'],
+    )
+    return lambda: get_job_list(
+        logger,
+        FileNameMatch(RELEASE),
+        library_map,
+        client,
+    )
+
+
+def _delete_old_versions(server, case, tmp_dir):
+    client = _client(server, case)
+    _, id_nums = get_library_mapping(
+        logger,
+        DEFAULT_PROD_FOLDER,
+        client,
+        max_workers=case['workers'],
+    )
+    return lambda: delete_old_versions(
+        logger,
+        FileNameMatch(RELEASE),
+        id_nums,
+        client,
+        DEFAULT_PROD_FOLDER,
+        max_workers=case['workers'],
+    )
+
+
+def _update_databricks(server, case, tmp_dir):
+    library_path = os.path.join(tmp_dir, RELEASE)
+    with open(library_path, 'wb') as f:
+        f.write(b'egg')
+    cfg_path = os.path.join(tmp_dir, '.storkcfg')
+    with open(cfg_path, 'w') as f:
+        f.write('[DEFAULT]\nhost = {}\nprod_folder = {}\n'.format(
+            server.url,
+            DEFAULT_PROD_FOLDER,
+        ))
+        if case['rate_limit']:
+            for family in FAMILIES:
+                f.write('rate_limit_{} = {}\n'.format(
+                    family,
+                    case['rate_limit'],
+                ))
+
+    def run():
+        with mock.patch('stork.update_databricks_library.CFG_FILE', cfg_path):
+            update_databricks(
+                logger,
+                library_path,
+                token='',
+                folder=DEFAULT_PROD_FOLDER,
+                update_jobs=True,
+                cleanup=True,
+                max_workers=case['workers'],
+            )
+
+    return run
+
+
+BENCHMARKS = {
+    'get_library_mapping': _get_library_mapping,
+    'get_job_list': _get_job_list,
+    'delete_old_versions': _delete_old_versions,
+    'update_databricks': _update_databricks,
+}
+
+
+def case_name(case):
+    return (
+        '{benchmark}[jobs={jobs},libraries={libraries},latency={latency},'
+        'workers={workers},rate_limit={rate_limit:g}]'.format(**case)
+    )
+
+
+def run_case(case):
+    """
+    time one benchmark on a fresh workspace, then measure its peak memory on
+     another, as tracing allocations slows it down
+
+    Returns
+    -------
+    dictionary of the case with its wall time in seconds, number of requests
+     and peak memory in bytes
+    """
+    prepare = BENCHMARKS[case['benchmark']]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with _server(case) as server:
+            run = prepare(server, case, tmp_dir)
+            before = server.count()
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+            requests = server.count() - before
+        with _server(case) as server:
+            run = prepare(server, case, tmp_dir)
+            tracemalloc.start()
+            try:
+                run()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return dict(
+        case,
+        seconds=seconds,
+        requests=requests,
+        peak_memory=peak_memory,
+    )
+
+
+def iter_cases(grid, benchmarks, workers, rate_limit):
+    sizes = GRIDS[grid]
+    for n_jobs in sizes['jobs']:
+        for n_libraries in sizes['libraries']:
+            for latency in sizes['latencies']:
+                for benchmark in benchmarks:
+                    yield {
+                        'benchmark': benchmark,
+                        'jobs': n_jobs,
+                        'libraries': n_libraries,
+                        'latency': latency,
+                        'workers': workers,
+                        'rate_limit': rate_limit,
+                    }
+
+
+def compare(result, base, tolerance):
+    """
+    ways in which result is worse than its baseline
+
+    Returns
+    -------
+    list of strings, empty if result is no worse than base
+    """
+    regressions = []
+    if result['requests'] > base['requests']:
+        regressions.append('requests {} -> {}'.format(
+            base['requests'],
+            result['requests'],
+        ))
+    if (
+        result['seconds'] > base['seconds'] * (1 + tolerance)
+        and result['seconds'] - base['seconds'] > MIN_SECONDS_CHANGE
+    ):
+        regressions.append('time {:.3f}s -> {:.3f}s'.format(
+            base['seconds'],
+            result['seconds'],
+        ))
+    if (
+        result['peak_memory'] > base['peak_memory'] * (1 + tolerance)
+        and result['peak_memory'] - base['peak_memory'] > MIN_MEMORY_CHANGE
+    ):
+        regressions.append('peak memory {:.1f}MB -> {:.1f}MB'.format(
+            base['peak_memory'] / 1e6,
+            result['peak_memory'] / 1e6,
+        ))
+    return regressions
+
+
+def _change(value, base_value):
+    if not base_value:
+        return ''
+    return '{:+.0%}'.format(value / base_value - 1)
+
+
+def format_result(result, base):
+    base = base or {}
+    return (
+        '{:<95} {:>9.3f}s {:>5} {:>8} req {:>5} {:>8.1f}MB {:>5}'.format(
+            case_name(result),
+            result['seconds'],
+            _change(result['seconds'], base.get('seconds')),
+            result['requests'],
+            _change(result['requests'], base.get('requests')),
+            result['peak_memory'] / 1e6,
+            _change(result['peak_memory'], base.get('peak_memory')),
+        )
+    )
+
+
+@click.command()
+@click.option(
+    '--grid',
+    type=click.Choice(sorted(GRIDS)),
+    default='quick',
+    help='workspace sizes and latencies to run',
+)
+@click.option(
+    '-b',
+    '--benchmark',
+    'benchmarks',
+    type=click.Choice(list(BENCHMARKS)),
+    multiple=True,
+    help='benchmark to run (repeat for several) - all by default',
+)
+@click.option(
+    '--workers',
+    default=8,
+    help='concurrent API requests',
+)
+@click.option(
+    '--rate-limit',
+    default=0.0,
+    help='requests per second allowed to each family of endpoints, as set '
+         'by rate_limit_<family> in .storkcfg - 0 for no limit, as stork '
+         'runs by default',
+)
+@click.option(
+    '--baseline',
+    'baseline_path',
+    default=BASELINE,
+    type=click.Path(dir_okay=False),
+    help='baseline results to compare with',
+)
+@click.option(
+    '--tolerance',
+    default=0.25,
+    help='fraction by which time or memory may exceed the baseline',
+)
+@click.option(
+    '--save-baseline',
+    is_flag=True,
+    help='save the results as the new baseline instead of comparing',
+)
+@click.option(
+    '--output',
+    type=click.Path(dir_okay=False),
+    help='save the results to this JSON file',
+)
+def main(
+    grid,
+    benchmarks,
+    workers,
+    rate_limit,
+    baseline_path,
+    tolerance,
+    save_baseline,
+    output,
+):
+    """
+    run the workspace benchmarks and compare them with the baseline
+    """
+    baseline = {}
+    if os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = {}
+    cases = iter_cases(
+        grid,
+        benchmarks or list(BENCHMARKS),
+        workers,
+        rate_limit,
+    )
+    for case in cases:
+        name = case_name(case)
+        result = run_case(case)
+        results[name] = result
+        click.echo(format_result(result, baseline.get(name)))
+        if name in baseline:
+            case_regressions = compare(result, baseline[name], tolerance)
+            if case_regressions:
+                regressions[name] = case_regressions
+
+    report = {'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if save_baseline:
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                report['results'] = dict(
+                    json.load(f)['results'],
+                    **results
+                )
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        click.echo('saved baseline to {}'.format(baseline_path))
+    elif regressions:
+        for name, case_regressions in regressions.items():
+            click.echo('REGRESSION {}: {}'.format(
+                name,
+                '; '.join(case_regressions),
+            ))
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,7 @@ setup(
         'simplejson'
     ],
     extras_require={
+        'async': ['aiohttp'],
         'dev': [
             'flake8',
             'numpydoc',
@@ -1,4 +1,22 @@
+import sys
+
 from ._version import __version__
 
 from .configure import configure
-from .update_databricks_library import update_databricks
+
+if sys.version_info < (3, 7):
+    from .update_databricks_library import update_databricks
+else:
+    def __getattr__(name):
+        # update_databricks imports requests and the API client, so it is
+        #  only imported when first used rather than with the package
+        if name == 'update_databricks':
+            from .update_databricks_library import update_databricks
+            globals()[name] = update_databricks
+            return update_databricks
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name)
+        )
+
+    def __dir__():
+        return sorted(list(globals()) + ['update_databricks'])
@@ -0,0 +1,84 @@
+"""
+API calls written once for both APIClient and AsyncAPIClient.
+
+A function whose name ends in _calls is a generator: it yields each Call it
+ makes (or a Sleep to wait before a retry), is sent back the response, and
+ returns its result. run_calls carries the calls out with an APIClient and
+ run_calls_async with an AsyncAPIClient, so building requests and reading
+ responses lives in one place and each engine only does the I/O.
+"""
+import asyncio
+import time
+from collections import namedtuple
+
+Call = namedtuple('Call', ['method', 'path', 'kwargs'])
+Sleep = namedtuple('Sleep', ['seconds'])
+
+
+def get_call(path):
+    return Call('GET', path, {})
+
+
+def post_call(path, **kwargs):
+    return Call('POST', path, kwargs)
+
+
+def run_calls(client, calls):
+    """
+    carry out the calls of a _calls generator with an APIClient
+
+    Parameters
+    ----------
+    client: APIClient
+        client for the Databricks account
+    calls: generator
+        yielding Call and Sleep objects
+
+    Returns
+    -------
+    the return value of calls - any exception raised by a call is raised
+     inside calls, so it can handle it
+    """
+    try:
+        step = next(calls)
+        while True:
+            try:
+                if isinstance(step, Sleep):
+                    result = time.sleep(step.seconds)
+                else:
+                    result = client.request(
+                        step.method,
+                        step.path,
+                        **step.kwargs
+                    )
+            except Exception as err:
+                step = calls.throw(err)
+            else:
+                step = calls.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_calls_async(client, calls):
+    """
+    carry out the calls of a _calls generator with an AsyncAPIClient, as
+     run_calls does with an APIClient
+    """
+    try:
+        step = next(calls)
+        while True:
+            try:
+                if isinstance(step, Sleep):
+                    result = await asyncio.sleep(step.seconds)
+                else:
+                    result = await client.request(
+                        step.method,
+                        step.path,
+                        **step.kwargs
+                    )
+            except Exception as err:
+                step = calls.throw(err)
+            else:
+                step = calls.send(result)
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,166 @@
+"""
+APIClient owns the HTTP session used for every call to the Databricks API,
+ so that connections (and their TLS handshakes) are reused across calls.
+"""
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from ._version import __version__
+from .retry_policy import RetryPolicy
+
+DEFAULT_POOL_SIZE = 10
+
+
+class APIClient(object):
+    """
+    Client for the Databricks REST API backed by a single pooled session
+
+    Parameters
+    ----------
+    host: string
+        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    token: string
+        Databricks API key
+    pool_size: int
+        number of connections to the host kept alive - should be at least
+         the number of threads sharing the client
+    retry_policy: RetryPolicy
+        which failed calls to retry and how long to wait between attempts -
+         defaults to RetryPolicy()
+    rate_limiter: RateLimiter
+        limits the rate of calls to each family of endpoints - calls are not
+         limited if None
+    timings: CallTimings
+        if given, the time, status code, size and retries of every call are
+         recorded in it
+    """
+    def __init__(
+        self,
+        host,
+        token,
+        pool_size=DEFAULT_POOL_SIZE,
+        retry_policy=None,
+        rate_limiter=None,
+        timings=None,
+    ):
+        self.host = host
+        self.timings = timings
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': 'Bearer {}'.format(token),
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': 'stork/{}'.format(__version__),
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, path, **kwargs):
+        """
+        send a request to the Databricks API, retrying transient failures
+         according to the client's retry policy
+
+        Parameters
+        ----------
+        method: string
+            HTTP method (e.g. 'GET')
+        path: string
+            path of the endpoint, including the api version and any query
+             string (e.g. '/api/2.0/jobs/list')
+        **kwargs
+            passed on to requests.Session.request
+
+        Returns
+        -------
+        requests.Response
+            response to the last attempt
+        """
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                # only the last attempt's response is recorded
+                res = None
+                _rewind(kwargs)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(path)
+                try:
+                    res = self.session.request(
+                        method,
+                        self.host + path,
+                        **kwargs
+                    )
+                except RequestException as err:
+                    if not self.retry_policy.should_retry_error(
+                        method, path, err, attempt
+                    ):
+                        raise
+                    delay = self.retry_policy.backoff(attempt)
+                else:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.record(path, res.status_code)
+                    if not self.retry_policy.should_retry_response(
+                        method, path, res, attempt
+                    ):
+                        return res
+                    delay = self.retry_policy.backoff(attempt, res)
+                attempt += 1
+                time.sleep(delay)
+        finally:
+            if self.timings is not None:
+                self.timings.record(
+                    method,
+                    path,
+                    time.perf_counter() - start,
+                    None if res is None else res.status_code,
+                    0 if res is None else _body_size(res.request.body),
+                    0 if res is None else len(res.content),
+                    attempt,
+                )
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _body_size(body):
+    """
+    size in bytes of a request body already sent
+    """
+    if body is None:
+        return 0
+    elif isinstance(body, str):
+        return len(body.encode('utf-8'))
+    elif hasattr(body, 'tell'):
+        # a file sent as the body has been read to its end
+        return body.tell()
+    return len(body)
+
+
+def _rewind(kwargs):
+    """
+    seek any files being sent back to the start, so a retry sends them whole
+    """
+    files = kwargs.get('files') or {}
+    for file_obj in list(files.values()) + [kwargs.get('data')]:
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
@@ -1,5 +1,13 @@
 from simplejson.errors import JSONDecodeError
 
+# responses which mean "try again later" rather than "this request is wrong" -
+#  a plain 500 is not included, as Databricks also uses it for name conflicts
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+RETRYABLE_ERROR_CODES = (
+    'REQUEST_LIMIT_EXCEEDED',
+    'TEMPORARILY_UNAVAILABLE',
+)
+
 
 class APIError(Exception):
     """
@@ -8,6 +16,7 @@ class APIError(Exception):
     """
     def __init__(self, response):
         Exception.__init__(self, response)
+        self.status_code = response.status_code
         try:
             res_body = response.json()
         except JSONDecodeError:
@@ -22,5 +31,16 @@ class APIError(Exception):
                 self.code = 'http {}'.format(response.status_code)
                 self.message = res_body['error']
 
+    @property
+    def retryable(self):
+        """
+        True if the error is transient (e.g. rate limiting or an unavailable
+         service) and the same request may succeed later, False if it is fatal
+        """
+        return (
+            self.code in RETRYABLE_ERROR_CODES
+            or self.status_code in RETRYABLE_STATUS_CODES
+        )
+
     def __str__(self):
         return '{}: {}'.format(self.code, self.message)
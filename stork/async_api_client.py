@@ -0,0 +1,237 @@
+"""
+AsyncAPIClient is the asyncio counterpart of APIClient, sending calls to the
+ Databricks API through a single aiohttp session so that many calls can be in
+ flight at once without a thread for each.
+
+aiohttp is an optional dependency, installed with `pip install stork[async]`.
+"""
+import asyncio
+import io
+import time
+from os.path import basename
+from urllib.parse import urlencode
+
+import simplejson
+from requests.exceptions import ConnectionError, Timeout
+
+from ._version import __version__
+from .retry_policy import RetryPolicy
+
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError(
+            'aiohttp is needed to use stork with asyncio: please run '
+            '`pip install stork[async]`'
+        )
+    return aiohttp
+
+
+class AsyncResponse(object):
+    """
+    Fully read response to an API call, with the parts of requests.Response
+     used by APIError and RetryPolicy
+    """
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return simplejson.loads(self.text)
+
+
+class AsyncAPIClient(object):
+    """
+    Asynchronous client for the Databricks REST API, to be used as an async
+     context manager
+
+    Parameters
+    ----------
+    host: string
+        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    token: string
+        Databricks API key
+    max_connections: int
+        maximum number of connections to the host open at once - further
+         calls wait for a free connection
+    retry_policy: RetryPolicy
+        which failed calls to retry and how long to wait between attempts -
+         defaults to RetryPolicy()
+    rate_limiter: RateLimiter
+        limits the rate of calls to each family of endpoints - calls are not
+         limited if None
+    timings: CallTimings
+        if given, the time, status and size of every call is recorded in it
+    """
+    def __init__(
+        self,
+        host,
+        token,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        retry_policy=None,
+        rate_limiter=None,
+        timings=None,
+    ):
+        self.aiohttp = _import_aiohttp()
+        self.host = host
+        self.token = token
+        self.max_connections = max_connections
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.timings = timings
+        self.session = None
+
+    async def __aenter__(self):
+        # the session must be created inside the event loop it is used in
+        self.session = self.aiohttp.ClientSession(
+            headers={
+                'Authorization': 'Bearer {}'.format(self.token),
+                'Accept': 'application/json',
+                'User-Agent': 'stork/{}'.format(__version__),
+            },
+            connector=self.aiohttp.TCPConnector(limit=self.max_connections),
+        )
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _body(self, data, files):
+        """
+        request body for a single attempt - multipart forms are rebuilt each
+         time, with their files rewound, so a retry sends them whole
+        """
+        if not files:
+            return data
+        form = self.aiohttp.FormData()
+        for name, value in (data or {}).items():
+            form.add_field(name, str(value))
+        for name, file_obj in files.items():
+            file_obj.seek(0)
+            form.add_field(
+                name,
+                file_obj,
+                filename=basename(getattr(file_obj, 'name', name)),
+            )
+        return form
+
+    async def request(self, method, path, data=None, files=None):
+        """
+        send a request to the Databricks API, retrying transient failures
+         according to the client's retry policy
+
+        Parameters
+        ----------
+        method: string
+            HTTP method (e.g. 'GET')
+        path: string
+            path of the endpoint, including the api version and any query
+             string (e.g. '/api/2.0/jobs/list')
+        data: string or dict
+            body of the request - a dict is sent as a form
+        files: dict
+            file objects to send in a multipart form, along with data
+
+        Returns
+        -------
+        AsyncResponse
+            response to the last attempt
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+            if the last attempt failed to get a response, so that callers can
+             handle errors in the same way as with APIClient
+        """
+        start = time.perf_counter()
+        # aiohttp closes the files it sends, so they are measured up front
+        body_size = _body_size(data, files)
+        attempt = 0
+        # only the last attempt's response is recorded
+        response = None
+        try:
+            while True:
+                response = None
+                if self.rate_limiter is not None:
+                    await asyncio.sleep(self.rate_limiter.reserve(path))
+                try:
+                    async with self.session.request(
+                        method,
+                        self.host + path,
+                        data=self._body(data, files),
+                    ) as res:
+                        response = AsyncResponse(
+                            res.status,
+                            res.headers,
+                            await res.text(),
+                        )
+                except (self.aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    error = (
+                        Timeout(str(err))
+                        if isinstance(err, asyncio.TimeoutError)
+                        else ConnectionError(str(err))
+                    )
+                    if not self.retry_policy.should_retry_error(
+                        method, path, error, attempt
+                    ):
+                        raise error from err
+                    delay = self.retry_policy.backoff(attempt)
+                else:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.record(path, response.status_code)
+                    if not self.retry_policy.should_retry_response(
+                        method, path, response, attempt
+                    ):
+                        return response
+                    delay = self.retry_policy.backoff(attempt, response)
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            if self.timings is not None:
+                self.timings.record(
+                    method,
+                    path,
+                    time.perf_counter() - start,
+                    None if response is None else response.status_code,
+                    0 if response is None else body_size,
+                    0 if response is None else len(
+                        response.text.encode('utf-8')
+                    ),
+                    attempt,
+                )
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+
+def _body_size(data, files):
+    """
+    size in bytes of a request body about to be sent, leaving out the
+     multipart boundaries and headers
+    """
+    if isinstance(data, str):
+        size = len(data.encode('utf-8'))
+    elif data:
+        size = len(urlencode(data))
+    else:
+        size = 0
+    for file_obj in (files or {}).values():
+        start = file_obj.tell()
+        size += file_obj.seek(0, io.SEEK_END) - start
+        file_obj.seek(start)
+    return size
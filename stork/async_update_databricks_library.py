@@ -0,0 +1,375 @@
+"""
+asyncio counterparts of the functions in update_databricks_library, for
+ releasing libraries with every status, get and reset call in flight at once,
+ or from within another asyncio application.
+
+Each call is built and its response read by the same generators as in
+ update_databricks_library (see api_calls): only the way they are run
+ differs. aiohttp is needed (`pip install stork[async]`).
+"""
+import asyncio
+from contextlib import ExitStack
+from os.path import basename
+
+from .api_calls import run_calls_async
+from .async_api_client import AsyncAPIClient, DEFAULT_MAX_CONNECTIONS
+from .configure import PROFILE
+from .dbfs import DBFS_BLOCK_SIZE, upload_to_dbfs_calls
+from .file_name import FileNameMatch
+from .job_index import JobLibraryIndex
+from .library_digest import check_library_calls, file_digest
+from .rate_limiter import RateLimiter
+from .update_databricks_library import (
+    _check_duplicate_libraries,
+    _load_host_config,
+    _plan_job_updates,
+    _released_libraries,
+    cached_library_mapping,
+    delete_library_calls,
+    finish_release,
+    get_library_status_calls,
+    group_outcomes,
+    JOBS_PAGE_SIZE,
+    jobs_page_calls,
+    library_status_cache,
+    list_library_ids_calls,
+    load_library_calls,
+    merge_delete_results,
+    old_versions_in_use,
+    open_snapshot,
+    record_job_results,
+    should_delete_old_versions,
+    snapshot_library_mapping,
+    uncached_library_ids,
+    update_job_calls,
+    upload_library_calls,
+)
+from .version_index import VersionIndex
+
+
+async def upload_to_dbfs(
+    filename,
+    dbfs_path,
+    client,
+    block_size=DBFS_BLOCK_SIZE,
+):
+    """
+    async version of dbfs.upload_to_dbfs
+    """
+    await run_calls_async(
+        client,
+        upload_to_dbfs_calls(filename, dbfs_path, block_size),
+    )
+
+
+async def load_library(filename, match, folder, client):
+    """
+    async version of update_databricks_library.load_library
+    """
+    await run_calls_async(client, load_library_calls(filename, match, folder))
+
+
+async def iter_jobs(client, page_size=JOBS_PAGE_SIZE):
+    """
+    async version of update_databricks_library.iter_jobs
+    """
+    offset = 0
+    while offset is not None:
+        jobs, offset = await run_calls_async(
+            client,
+            jobs_page_calls(offset, page_size),
+        )
+        for job in jobs:
+            yield job
+
+
+async def get_job_lists(
+    logger,
+    matches,
+    library_mapping,
+    client,
+    snapshot=None,
+):
+    """
+    async version of update_databricks_library.get_job_lists
+    """
+    if snapshot is not None:
+        index = JobLibraryIndex.from_jobs(
+            logger,
+            snapshot.iter_jobs(),
+            library_mapping,
+        )
+    else:
+        index = JobLibraryIndex(library_mapping)
+        async for job in iter_jobs(client):
+            index.add_job(logger, job)
+    return [index.replaceable_by(logger, match) for match in matches]
+
+
+async def get_job_list(logger, match, library_mapping, client, snapshot=None):
+    """
+    async version of update_databricks_library.get_job_list
+    """
+    return (await get_job_lists(
+        logger,
+        [match],
+        library_mapping,
+        client,
+        snapshot=snapshot,
+    ))[0]
+
+
+async def get_library_status(library_id, client):
+    """
+    async version of update_databricks_library.get_library_status
+    """
+    return await run_calls_async(client, get_library_status_calls(library_id))
+
+
+async def get_library_mapping(
+    logger,
+    prod_folder,
+    client,
+    cache=None,
+    snapshot=None,
+):
+    """
+    async version of update_databricks_library.get_library_mapping, fetching
+     the status of every library at once
+    """
+    if snapshot is not None:
+        return snapshot_library_mapping(logger, snapshot)
+    library_ids = await run_calls_async(
+        client,
+        list_library_ids_calls(prod_folder),
+    )
+    new_ids = uncached_library_ids(logger, library_ids, cache)
+    statuses = await asyncio.gather(*[
+        get_library_status(library_id, client) for library_id in new_ids
+    ])
+    return cached_library_mapping(
+        logger,
+        library_ids,
+        dict(zip(new_ids, statuses)),
+        cache,
+    )
+
+
+async def replace_job_libraries(logger, job_updates, client, verify=False):
+    """
+    async version of update_databricks_library.replace_job_libraries,
+     updating every job at once
+    """
+    return group_outcomes(
+        await asyncio.gather(*[
+            run_calls_async(
+                client,
+                update_job_calls(logger, job_update, verify),
+            )
+            for job_update in job_updates
+        ]),
+        ('updated', 'skipped', 'failed'),
+    )
+
+
+async def update_job_libraries(
+    logger,
+    job_list,
+    match,
+    new_library_path,
+    client,
+    verify=False,
+):
+    """
+    async version of update_databricks_library.update_job_libraries
+    """
+    return await replace_job_libraries(
+        logger,
+        [
+            (job, {job['library_path']: (match.suffix, new_library_path)})
+            for job in job_list
+        ],
+        client,
+        verify=verify,
+    )
+
+
+async def delete_old_versions(
+    logger,
+    new_library_match,
+    id_nums,
+    client,
+    prod_folder,
+    versions=None,
+):
+    """
+    async version of update_databricks_library.delete_old_versions, deleting
+     every old version at once
+    """
+    if versions is None:
+        versions = VersionIndex.from_id_nums(id_nums)
+    return group_outcomes(
+        await asyncio.gather(*[
+            run_calls_async(client, delete_library_calls(logger, lib))
+            for lib in versions.older_than(new_library_match)
+        ]),
+        ('deleted', 'failed'),
+    )
+
+
+async def _check_library(path, match, folder, client):
+    """
+    async version of update_databricks_library._check_library
+    """
+    loop = asyncio.get_event_loop()
+    digest = await loop.run_in_executor(None, file_digest, path)
+    status = await run_calls_async(
+        client,
+        check_library_calls(folder, match, digest),
+    )
+    return digest, status
+
+
+async def _upload_library(logger, path, match, folder, digest, client):
+    """
+    async version of update_databricks_library._upload_library
+    """
+    return await run_calls_async(
+        client,
+        upload_library_calls(logger, path, match, folder, digest),
+    )
+
+
+async def update_databricks_async(
+    logger,
+    path,
+    token,
+    folder,
+    update_jobs,
+    cleanup,
+    verify_jobs=False,
+    use_cache=False,
+    use_snapshot=False,
+    timings=None,
+    profile=PROFILE,
+    max_connections=DEFAULT_MAX_CONNECTIONS,
+):
+    """
+    async version of update_databricks_library.update_databricks
+
+    Takes the same arguments, except that the number of calls in flight at
+     once is bounded by max_connections rather than a number of worker
+     threads.
+
+    Raises
+    ------
+    LibraryConflictError
+        if the same version of a library was already uploaded by stork
+         with different contents - nothing is uploaded in that case
+    JobUpdateError
+        if any job could not be updated - all other jobs are still updated,
+         but no old versions are removed
+    LibraryDeleteError
+        if any old version could not be removed - all other old versions are
+         still removed
+    """
+    config, host, prod_folder = _load_host_config(profile)
+
+    paths = [path] if isinstance(path, str) else list(path)
+    matches = [FileNameMatch(basename(library_path)) for library_path in paths]
+    _check_duplicate_libraries(matches)
+
+    with ExitStack() as stack:
+        snapshot = None
+        if use_snapshot and update_jobs and folder == prod_folder:
+            snapshot = stack.enter_context(open_snapshot(host))
+        async with AsyncAPIClient(
+            host,
+            token,
+            max_connections=max_connections,
+            rate_limiter=RateLimiter.from_config(config, profile),
+            timings=timings,
+        ) as client:
+            # check every library before uploading any, so a conflict leaves
+            #  Databricks untouched
+            checks = await asyncio.gather(*[
+                _check_library(library_path, match, folder, client)
+                for library_path, match in zip(paths, matches)
+            ])
+            statuses = await asyncio.gather(*[
+                _upload_library(
+                    logger,
+                    library_path,
+                    match,
+                    folder,
+                    digest,
+                    client,
+                )
+                if status == 'new' else asyncio.sleep(0, result=status)
+                for library_path, match, (digest, status)
+                in zip(paths, matches, checks)
+            ])
+            released = _released_libraries(logger, matches, statuses)
+            if not (update_jobs and folder == prod_folder and released):
+                return
+
+            library_map, id_nums = await get_library_mapping(
+                logger,
+                prod_folder,
+                client,
+                cache=library_status_cache(host, use_cache, snapshot),
+            )
+            job_lists = await get_job_lists(
+                logger,
+                released,
+                library_map,
+                client,
+                snapshot=snapshot,
+            )
+            job_updates = _plan_job_updates(
+                logger,
+                released,
+                library_map,
+                job_lists,
+            )
+
+            failed = []
+            if len(job_updates) != 0:
+                results = await replace_job_libraries(
+                    logger,
+                    list(job_updates.values()),
+                    client,
+                    # jobs may have changed since the snapshot was taken
+                    verify=verify_jobs or snapshot is not None,
+                )
+                failed = record_job_results(
+                    logger,
+                    job_updates,
+                    results,
+                    snapshot,
+                )
+
+            delete_results = None
+            if should_delete_old_versions(logger, cleanup, failed) and not (
+                snapshot is not None
+                and old_versions_in_use(
+                    logger,
+                    [job async for job in iter_jobs(client)],
+                    library_map,
+                    id_nums,
+                    released,
+                )
+            ):
+                versions = VersionIndex.from_id_nums(id_nums)
+                delete_results = merge_delete_results(await asyncio.gather(*[
+                    delete_old_versions(
+                        logger,
+                        match,
+                        id_nums=id_nums,
+                        client=client,
+                        prod_folder=prod_folder,
+                        versions=versions,
+                    )
+                    for match in released
+                ]))
+            finish_release(logger, failed, delete_results)
@@ -0,0 +1,183 @@
+"""
+CallTimings records how long each call to the Databricks API took, so that a
+ slow run can be traced to the endpoints it spent its time in.
+"""
+import json
+import math
+import threading
+from urllib.parse import urlsplit
+
+
+def _percentile(sorted_values, percent):
+    # nearest-rank percentile of an already sorted, non-empty list
+    rank = max(int(math.ceil(percent / 100.0 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+class CallTimings(object):
+    """
+    Thread-safe record of API calls, aggregated per endpoint
+
+    Each call is recorded once, however many times it was retried: its wall
+     time includes every attempt and the waits between them.
+
+    Parameters
+    ----------
+    workspace: string
+        if given, every call is recorded as made to this workspace (e.g. a
+         profile in .storkcfg), and aggregated apart from the calls to other
+         workspaces
+    """
+    def __init__(self, workspace=None):
+        self.workspace = workspace
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def for_workspace(self, workspace):
+        """
+        a CallTimings sharing the calls of this one, recording each call as
+         made to workspace - for releasing to several workspaces at once
+        """
+        timings = CallTimings(workspace)
+        timings.calls = self.calls
+        timings._lock = self._lock
+        return timings
+
+    @staticmethod
+    def endpoint(method, path):
+        """
+        endpoint of a call, without its query string
+         (e.g. 'GET /api/2.0/jobs/list')
+        """
+        return '{} {}'.format(method, urlsplit(path).path)
+
+    def record(
+        self,
+        method,
+        path,
+        seconds,
+        status_code,
+        bytes_sent,
+        bytes_received,
+        retries,
+    ):
+        """
+        record one API call
+
+        Parameters
+        ----------
+        method: string
+            HTTP method (e.g. 'GET')
+        path: string
+            path of the endpoint, with any query string
+        seconds: float
+            wall time of the call, including retries
+        status_code: int
+            status code of the last response, or None if no response came
+        bytes_sent: int
+            size of the body of the last request
+        bytes_received: int
+            size of the body of the last response
+        retries: int
+            number of attempts after the first
+        """
+        call = {
+            'workspace': self.workspace,
+            'endpoint': self.endpoint(method, path),
+            'seconds': seconds,
+            'status_code': status_code,
+            'bytes_sent': bytes_sent,
+            'bytes_received': bytes_received,
+            'retries': retries,
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        """
+        calls aggregated per workspace and endpoint, slowest total time first
+
+        Returns
+        -------
+        list of dictionaries with the workspace, endpoint, count, p50, p95 and
+         max
+         seconds, total seconds, bytes sent and received, retries and
+         errors (calls with no response or a status code of 400 or more)
+        """
+        with self._lock:
+            calls = list(self.calls)
+        by_endpoint = {}
+        for call in calls:
+            by_endpoint.setdefault(
+                (call['workspace'], call['endpoint']),
+                [],
+            ).append(call)
+        rows = []
+        for (workspace, endpoint), endpoint_calls in by_endpoint.items():
+            seconds = sorted(call['seconds'] for call in endpoint_calls)
+            rows.append({
+                'workspace': workspace,
+                'endpoint': endpoint,
+                'count': len(endpoint_calls),
+                'p50': _percentile(seconds, 50),
+                'p95': _percentile(seconds, 95),
+                'max': seconds[-1],
+                'total': sum(seconds),
+                'bytes_sent': sum(c['bytes_sent'] for c in endpoint_calls),
+                'bytes_received': sum(
+                    c['bytes_received'] for c in endpoint_calls
+                ),
+                'retries': sum(c['retries'] for c in endpoint_calls),
+                'errors': sum(
+                    1 for c in endpoint_calls
+                    if c['status_code'] is None or c['status_code'] >= 400
+                ),
+            })
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def format_table(self):
+        """
+        summary as a plain text table, with times in milliseconds - endpoints
+         of a workspace are prefixed with it (e.g. '[staging] GET ...')
+        """
+        rows = self.summary()
+        for row in rows:
+            if row['workspace'] is not None:
+                row['endpoint'] = '[{}] {}'.format(
+                    row['workspace'],
+                    row['endpoint'],
+                )
+        width = max([len('endpoint')] + [len(row['endpoint']) for row in rows])
+        header = '{:<{width}} {:>6} {:>9} {:>9} {:>9} {:>7} {:>6}'.format(
+            'endpoint', 'count', 'p50 ms', 'p95 ms', 'max ms', 'retries',
+            'errors', width=width,
+        )
+        lines = [header, '-' * len(header)]
+        for row in rows:
+            lines.append(
+                '{:<{width}} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>7} {:>6}'
+                .format(
+                    row['endpoint'],
+                    row['count'],
+                    row['p50'] * 1000,
+                    row['p95'] * 1000,
+                    row['max'] * 1000,
+                    row['retries'],
+                    row['errors'],
+                    width=width,
+                )
+            )
+        return '\n'.join(lines)
+
+    def save(self, path):
+        """
+        write the summary and every call to a JSON file
+        """
+        with self._lock:
+            calls = list(self.calls)
+        with open(path, 'w') as f:
+            json.dump(
+                {'summary': self.summary(), 'calls': calls},
+                f,
+                indent=2,
+            )
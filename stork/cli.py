@@ -1,10 +1,39 @@
+import importlib
+
 import click
 
 from . import __version__
-from .cli_commands import create_cluster, upload, upload_and_update
 from .configure import configure
 
 
+class LazyGroup(click.Group):
+    """
+    Group whose commands are only imported when they are looked up, so that
+     `stork --version` and `stork configure` do not import requests and the
+     API engines
+
+    Parameters
+    ----------
+    lazy_commands: dict
+        mapping command name to 'module:attribute' of the command
+    """
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super(LazyGroup, self).__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(
+            set(super(LazyGroup, self).list_commands(ctx))
+            | set(self.lazy_commands)
+        )
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_commands:
+            return super(LazyGroup, self).get_command(ctx, cmd_name)
+        module_name, attribute = self.lazy_commands[cmd_name].split(':')
+        return getattr(importlib.import_module(module_name), attribute)
+
+
 def print_version(ctx, param, value):
     if not value or ctx.resilient_parsing:
         return
@@ -12,7 +41,15 @@ def print_version(ctx, param, value):
     ctx.exit()
 
 
-@click.group()
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        'create-cluster': 'stork.cli_commands:create_cluster',
+        'sync': 'stork.cli_commands:sync',
+        'upload': 'stork.cli_commands:upload',
+        'upload-and-update': 'stork.cli_commands:upload_and_update',
+    },
+)
 @click.option('--version', '-v', is_flag=True, callback=print_version,
               help=__version__)
 def cli(version):
@@ -20,6 +57,3 @@ def cli(version):
 
 
 cli.add_command(configure)
-cli.add_command(create_cluster)
-cli.add_command(upload)
-cli.add_command(upload_and_update)
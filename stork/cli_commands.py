@@ -1,18 +1,30 @@
+import glob
 import logging
+from contextlib import contextmanager
 
 import click
 import click_log
-from configparser import NoOptionError
+from configparser import NoOptionError, NoSectionError
 
+from .call_timings import CallTimings
 from .configure import _load_config, CFG_FILE, PROFILE
-from .create_job_cluster import create_job_library
+from .create_job_cluster import create_job_library, DEFAULT_TIMEOUT
+from .deploy_plan import apply_plan, load_plan, plan_update, save_plan
+from .sync_workspace import sync_workspace
 from .update_databricks_library import update_databricks
+from .workspaces import update_workspaces
 
 logger = logging.getLogger(__name__)
 click_log.basic_config(logger)
 
 
-def _resolve_input(variable, variable_name, config_key, config):
+def _resolve_input(
+    variable,
+    variable_name,
+    config_key,
+    config,
+    profile=PROFILE,
+):
     """
     Resolve input entered as option values with config values
 
@@ -31,10 +43,17 @@ def _resolve_input(variable, variable_name, config_key, config):
         key in the config whose value could be used to fill in the variable
     config: ConfigParser
         contains keys/values in .storkcfg
+    profile: string
+        section of the config to look in
     """
     if variable is None:
         try:
-            variable = config.get(PROFILE, config_key)
+            variable = config.get(profile, config_key)
+        except NoSectionError:
+            raise ValueError(
+                'no profile {} found: please run `stork configure --profile '
+                '{}` to set it up'.format(profile, profile)
+            )
         except NoOptionError:
             raise ValueError((
                 'no {} found - either provide a command line argument or '
@@ -43,6 +62,70 @@ def _resolve_input(variable, variable_name, config_key, config):
     return variable
 
 
+def _expand_paths(paths):
+    """
+    Expand any glob patterns among the paths given on the command line
+
+    Parameters
+    ----------
+    paths: tuple of strings
+        paths to libraries, or patterns such as `dist/*.egg`
+    """
+    expanded = []
+    for path in paths:
+        if glob.has_magic(path):
+            matched = sorted(glob.glob(path))
+            if not matched:
+                raise click.BadParameter(
+                    'no files match {}'.format(path),
+                    param_hint='--path',
+                )
+            expanded.extend(matched)
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def _timings_options(func):
+    """
+    add the --timings and --timings-json options to a command
+    """
+    func = click.option(
+        '--timings-json',
+        type=click.Path(dir_okay=False, writable=True),
+        help='write the time, status and size of every API call to this file',
+    )(func)
+    return click.option(
+        '--timings/--no-timings',
+        help='print the time spent in each API endpoint when done',
+        default=False,
+        show_default=True,
+    )(func)
+
+
+@contextmanager
+def _report_timings(show, json_path):
+    """
+    collect the timings of the API calls made in the block, and report them
+     at the end even if the block fails
+
+    Yields
+    ------
+    CallTimings, or None if neither show nor json_path is set
+    """
+    if not show and json_path is None:
+        yield None
+        return
+    timings = CallTimings()
+    try:
+        yield timings
+    finally:
+        if show:
+            click.echo(timings.format_table())
+        if json_path is not None:
+            timings.save(json_path)
+
+
 @click.command(short_help='upload an egg or jar')
 @click.option(
     '-p',
@@ -66,8 +149,9 @@ def _resolve_input(variable, variable_name, config_key, config):
           '(e.g. `/Users/my_email@fake_organization.com`) '
           '- optional, read from `.storkcfg` if not provided'),
 )
+@_timings_options
 @click_log.simple_verbosity_option(logger)
-def upload(path, token, folder):
+def upload(path, token, folder, timings, timings_json):
     """
     The egg that the provided path points to will be uploaded to Databricks.
     """
@@ -75,23 +159,27 @@ def upload(path, token, folder):
     token = _resolve_input(token, 'token', 'token', config)
     folder = _resolve_input(folder, 'folder', 'prod_folder', config)
 
-    update_databricks(
-        logger,
-        path,
-        token,
-        folder,
-        update_jobs=False,
-        cleanup=False
-    )
+    with _report_timings(timings, timings_json) as call_timings:
+        update_databricks(
+            logger,
+            path,
+            token,
+            folder,
+            update_jobs=False,
+            cleanup=False,
+            timings=call_timings,
+        )
 
 
-@click.command(short_help='upload an egg and update jobs')
+@click.command(short_help='upload eggs and update jobs')
 @click.option(
     '-p',
     '--path',
     help=('path to egg file with name as output from setuptools '
-          '(e.g. dist/new_library-1.0.0-py3.6.egg)'),
-    required=True,
+          '(e.g. dist/new_library-1.0.0-py3.6.egg) or a glob pattern '
+          '(e.g. \'dist/*.egg\') - can be given more than once to release '
+          'several libraries together'),
+    multiple=True,
 )
 @click.option(
     '-t',
@@ -106,8 +194,80 @@ def upload(path, token, folder):
     default=True,
     show_default=True,
 )
+@click.option(
+    '-w',
+    '--workers',
+    type=click.IntRange(min=1),
+    help='maximum number of concurrent requests to Databricks - any '
+         'rate_limit_<family> in .storkcfg still applies',
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--verify-jobs/--no-verify-jobs',
+    help=('if verify-jobs, re-fetch each job before updating it and leave it '
+          'untouched if it changed while stork was running'),
+    default=False,
+    show_default=True,
+)
+@click.option(
+    '--cache/--no-cache',
+    help=('if cache, keep the status of production libraries in '
+          '~/.stork/cache and only fetch the status of new libraries'),
+    default=False,
+    show_default=True,
+)
+@click.option(
+    '--snapshot/--no-snapshot',
+    help=('if snapshot, find jobs to update in the snapshot saved by '
+          '`stork sync` instead of listing every job, and verify each job '
+          'before updating it'),
+    default=False,
+    show_default=True,
+)
+@click.option(
+    '--plan',
+    'plan_path',
+    type=click.Path(dir_okay=False, writable=True),
+    help=('write what would be uploaded, updated and deleted to this plan '
+          'file (e.g. plan.json) instead of doing it'),
+)
+@click.option(
+    '--apply',
+    'apply_path',
+    type=click.Path(exists=True, dir_okay=False),
+    help='upload, update and delete as in this plan file, without --path',
+)
+@click.option(
+    '--profile',
+    'profiles',
+    multiple=True,
+    help=('release to the workspace of this profile in `.storkcfg` (see '
+          '`stork configure --profile`) - can be given more than once to '
+          'release to several workspaces at the same time'),
+)
+@click.option(
+    '--all-profiles',
+    is_flag=True,
+    help='release to the workspaces of every profile in `.storkcfg` at once',
+)
+@_timings_options
 @click_log.simple_verbosity_option(logger)
-def upload_and_update(path, token, cleanup):
+def upload_and_update(
+    path,
+    token,
+    cleanup,
+    workers,
+    verify_jobs,
+    cache,
+    snapshot,
+    plan_path,
+    apply_path,
+    profiles,
+    all_profiles,
+    timings,
+    timings_json,
+):
     """
     The egg that the provided path points to will be uploaded to Databricks.
      All jobs which use the same major version of the library will be updated
@@ -115,6 +275,9 @@ def upload_and_update(path, token, cleanup):
      folder with the same major version and a lower minor version will
      be deleted.
 
+    When several paths are given, the libraries are uploaded together and
+     a job using more than one of them is updated only once.
+
     Unlike `upload`, `upload_and_update` does not ask for a folder because it
      relies on the production folder specified in the config. This is to
      protect against accidentally updating jobs to versions of a library still
@@ -122,19 +285,129 @@ def upload_and_update(path, token, cleanup):
 
     All egg names already in Databricks must be properly formatted
      with versions of the form <name>-0.0.0.
+
+    With --plan, nothing is changed: the jobs which would be updated and the
+     libraries which would be deleted are written to a plan file instead.
+     --apply then only sends the writes in the plan, verifying each job
+     first.
+
+    With --profile or --all-profiles, the libraries are released to several
+     workspaces at the same time, each with the host, token and production
+     folder of its profile, and the outcome is reported for each workspace.
     """
+    if apply_path is not None and path:
+        raise click.UsageError('--path cannot be used with --apply')
+    elif apply_path is None and not path:
+        raise click.UsageError('missing option --path')
+    elif plan_path is not None and apply_path is not None:
+        raise click.UsageError('--plan cannot be used with --apply')
+    elif (cache or snapshot) and (plan_path or apply_path):
+        raise click.UsageError(
+            '--cache and --snapshot cannot be used with --plan or --apply'
+        )
+    elif profiles and all_profiles:
+        raise click.UsageError('--profile cannot be used with --all-profiles')
+    elif (profiles or all_profiles) and (
+        token is not None or plan_path or apply_path
+    ):
+        raise click.UsageError(
+            '--token, --plan and --apply cannot be used with --profile or '
+            '--all-profiles'
+        )
+
+    if profiles or all_profiles:
+        with _report_timings(timings, timings_json) as call_timings:
+            update_workspaces(
+                logger,
+                _expand_paths(path),
+                profiles=list(profiles) or None,
+                cleanup=cleanup,
+                max_workers=workers,
+                verify_jobs=verify_jobs,
+                use_cache=cache,
+                use_snapshot=snapshot,
+                timings=call_timings,
+            )
+        return
+
     config = _load_config(CFG_FILE)
     token = _resolve_input(token, 'token', 'token', config)
     folder = _resolve_input(None, 'folder', 'prod_folder', config)
 
-    update_databricks(
-        logger,
-        path,
-        token,
-        folder,
-        update_jobs=True,
-        cleanup=cleanup
-    )
+    with _report_timings(timings, timings_json) as call_timings:
+        if plan_path is not None:
+            save_plan(
+                plan_update(
+                    logger,
+                    _expand_paths(path),
+                    token,
+                    cleanup=cleanup,
+                    max_workers=workers,
+                    timings=call_timings,
+                ),
+                plan_path,
+            )
+            logger.info('plan saved to {}'.format(plan_path))
+        elif apply_path is not None:
+            apply_plan(
+                logger,
+                load_plan(apply_path),
+                token,
+                cleanup=cleanup,
+                max_workers=workers,
+                timings=call_timings,
+            )
+        else:
+            update_databricks(
+                logger,
+                _expand_paths(path),
+                token,
+                folder,
+                update_jobs=True,
+                cleanup=cleanup,
+                max_workers=workers,
+                verify_jobs=verify_jobs,
+                use_cache=cache,
+                use_snapshot=snapshot,
+                timings=call_timings,
+            )
+
+
+@click.command(short_help='save a snapshot of jobs and libraries')
+@click.option(
+    '-t',
+    '--token',
+    help=('Databricks API key - '
+          'optional, read from `.storkcfg` if not provided'),
+)
+@click.option(
+    '-w',
+    '--workers',
+    type=click.IntRange(min=1),
+    help='maximum number of concurrent requests to Databricks - any '
+         'rate_limit_<family> in .storkcfg still applies',
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--profile',
+    help=('sync the workspace of this profile in `.storkcfg` (see '
+          '`stork configure --profile`), for '
+          '`upload-and-update --profile <name> --snapshot`'),
+    default=PROFILE,
+)
+@click_log.simple_verbosity_option(logger)
+def sync(token, workers, profile):
+    """
+    Save the jobs and production libraries of the workspace to a local
+     snapshot in ~/.stork/snapshots, for use by
+     `upload-and-update --snapshot`. Only jobs and libraries which are new or
+     changed since the last sync are written.
+    """
+    config = _load_config(CFG_FILE)
+    token = _resolve_input(token, 'token', 'token', config, profile)
+
+    sync_workspace(logger, token, max_workers=workers, profile=profile)
 
 
 @click.command(short_help='create a cluster based on a job_id')
@@ -157,17 +430,44 @@ def upload_and_update(path, token, cleanup):
     help=('Databricks API key - '
           'optional, read from `.storkcfg` if not provided'),
 )
+@click.option(
+    '--wait/--no-wait',
+    help=('if wait, return only once the cluster is running and all '
+          'libraries are installed'),
+    default=False,
+    show_default=True,
+)
+@click.option(
+    '--timeout',
+    type=click.IntRange(min=1),
+    help='seconds to wait for the cluster before giving up',
+    default=DEFAULT_TIMEOUT,
+    show_default=True,
+)
+@_timings_options
 @click_log.simple_verbosity_option(logger)
-def create_cluster(job_id, cluster_name, token):
+def create_cluster(
+    job_id,
+    cluster_name,
+    token,
+    wait,
+    timeout,
+    timings,
+    timings_json,
+):
     """
     Create a cluster based on a job id
     """
     config = _load_config(CFG_FILE)
     token = _resolve_input(token, 'token', 'token', config)
 
-    create_job_library(
-        logger,
-        job_id,
-        cluster_name,
-        token
-    )
+    with _report_timings(timings, timings_json) as call_timings:
+        create_job_library(
+            logger,
+            job_id,
+            cluster_name,
+            token,
+            wait=wait,
+            timeout=timeout,
+            timings=call_timings,
+        )
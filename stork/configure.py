@@ -20,7 +20,7 @@ def _load_config(filename):
     return config
 
 
-def _update_value(config, key, instruction, is_sensitive):
+def _update_value(config, key, instruction, is_sensitive, profile=PROFILE):
     """
     creates (if needed)  and updates the value of the key in the config with a
      value entered by the user
@@ -35,13 +35,15 @@ def _update_value(config, key, instruction, is_sensitive):
         text to show in the prompt
     is_sensitive: bool
         if true, require confirmation and do not show typed characters
+    profile: string
+        section of the config to update
 
     Notes
     -----
     sets key in config passed in
     """
-    if config.has_option(PROFILE, key):
-        current_value = config.get(PROFILE, key)
+    if config.has_option(profile, key):
+        current_value = config.get(profile, key)
     else:
         current_value = None
 
@@ -69,11 +71,18 @@ def _update_value(config, key, instruction, is_sensitive):
                 hide_input=is_sensitive,
                 confirmation_prompt=is_sensitive,
             )
-    config.set(PROFILE, key, proposed)
+    config.set(profile, key, proposed)
 
 
 @click.command(short_help='configure Databricks connection information')
-def configure():
+@click.option(
+    '--profile',
+    default=PROFILE,
+    help=('name of a workspace profile to configure, for releasing to '
+          'several workspaces with `upload-and-update --profile` - '
+          'configures the default workspace if not provided'),
+)
+def configure(profile):
     """
     Configure information about Databricks account and default behavior.
 
@@ -82,24 +91,29 @@ def configure():
      text file or generated using this configuration tool.
     """
     config = _load_config(CFG_FILE)
+    if profile != PROFILE and not config.has_section(profile):
+        config.add_section(profile)
 
     _update_value(
         config,
         'host',
         'Databricks host (e.g. https://my-organization.cloud.databricks.com)',
         is_sensitive=False,
+        profile=profile,
     )
     _update_value(
         config,
         'token',
         'Databricks API token',
         is_sensitive=True,
+        profile=profile,
     )
     _update_value(
         config,
         'prod_folder',
         'Databricks folder for production libraries',
         is_sensitive=False,
+        profile=profile,
     )
 
     with open(CFG_FILE, 'w+') as f:
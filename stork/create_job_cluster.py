@@ -5,14 +5,23 @@ an interactive Databricks cluster configured as a specific job cluster.
 import json
 import time
 
-import requests
 from configparser import NoOptionError
 
+from .api_client import APIClient
 from .api_error import APIError
 from .configure import _load_config, CFG_FILE, PROFILE
+from .rate_limiter import RateLimiter
 
+# seconds to wait between polls, doubling from the first to the second
+POLL_INITIAL_DELAY = 1
+POLL_MAX_DELAY = 15
+DEFAULT_TIMEOUT = 20 * 60
 
-def get_job_cluster_config(job_id, token, host):
+CLUSTER_FAILED_STATES = ('TERMINATING', 'TERMINATED', 'ERROR', 'UNKNOWN')
+LIBRARY_DONE_STATUSES = ('INSTALLED', 'SKIPPED')
+
+
+def get_job_cluster_config(job_id, client):
     """
     Get cluster config for a job.
 
@@ -20,15 +29,10 @@ def get_job_cluster_config(job_id, token, host):
     ----------
     job_id: int
         id of the job you are trying to debug
-    token: string
-        Databricks API key
-    host: string
-        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
     """
-    res = requests.get(
-        host + f'/api/2.0/jobs/get/?job_id={job_id}',
-        auth=('token', token),
-    )
+    res = client.get(f'/api/2.0/jobs/get/?job_id={job_id}')
 
     if res.status_code != 200:
         raise APIError(res)
@@ -42,7 +46,7 @@ def get_job_cluster_config(job_id, token, host):
         return cluster_config
 
 
-def create_new_cluster(job_id, cluster_name, cluster_config, token, host):
+def create_new_cluster(job_id, cluster_name, cluster_config, client):
     """
     Creat a new cluster based on a job cluster config.
 
@@ -54,10 +58,8 @@ def create_new_cluster(job_id, cluster_name, cluster_config, token, host):
         Name for your cluster, will be default if None
     cluster_config: dict
         dict containing the config details of the job cluster
-    token: string
-        Databricks API key
-    host: string
-        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
 
     Side Effects
     ------------
@@ -92,9 +94,8 @@ def create_new_cluster(job_id, cluster_name, cluster_config, token, host):
     if 'spark_conf' in cluster_config['new_cluster'].keys():
         data['spark_conf'] = cluster_config['new_cluster']['spark_conf']
 
-    res = requests.post(
-        host + '/api/2.0/clusters/create',
-        auth=('token', token),
+    res = client.post(
+        '/api/2.0/clusters/create',
         data=json.dumps(data)
     )
 
@@ -105,7 +106,7 @@ def create_new_cluster(job_id, cluster_name, cluster_config, token, host):
         return cluster_id, cluster_name
 
 
-def attach_job_libraries_to_cluster(cluster_id, cluster_config, token, host):
+def attach_job_libraries_to_cluster(cluster_id, cluster_config, client):
     """
     Attach job libraries to cluster
 
@@ -115,10 +116,8 @@ def attach_job_libraries_to_cluster(cluster_id, cluster_config, token, host):
         id of the cluster you want to attach libraries to
     cluster_config: dict
         dict containing the config details of the job cluster
-    token: string
-        Databricks API key
-    host: string
-        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
 
     Side Effects
     ------------
@@ -129,9 +128,8 @@ def attach_job_libraries_to_cluster(cluster_id, cluster_config, token, host):
         'libraries': cluster_config['libraries']
     }
 
-    res = requests.post(
-        host + '/api/2.0/libraries/install',
-        auth=('token', token),
+    res = client.post(
+        '/api/2.0/libraries/install',
         data=json.dumps(data)
     )
 
@@ -139,7 +137,151 @@ def attach_job_libraries_to_cluster(cluster_id, cluster_config, token, host):
         raise APIError(res)
 
 
-def create_job_library(logger, job_id, cluster_name, token):
+def _poll(check, deadline, description):
+    """
+    call check until it returns a truthy value, backing off exponentially
+     between calls
+
+    Parameters
+    ----------
+    check: callable
+        function with no arguments, returning a falsy value to keep polling
+    deadline: float
+        time.monotonic() value after which to give up
+    description: string
+        what is being waited for, used in the timeout message
+
+    Returns
+    -------
+    the first truthy value returned by check
+
+    Raises
+    ------
+    TimeoutError
+        if check has not succeeded by the deadline
+    """
+    delay = POLL_INITIAL_DELAY
+    while True:
+        result = check()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f'timed out waiting for {description}')
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+
+def get_cluster_info(cluster_id, client):
+    """
+    Get the state of a cluster
+
+    Parameters
+    ----------
+    cluster_id: string
+        id of the cluster
+    client: APIClient
+        client for the Databricks account
+
+    Returns
+    -------
+    dictionary of cluster info, as returned by the clusters/get API
+    """
+    res = client.get(f'/api/2.0/clusters/get?cluster_id={cluster_id}')
+
+    if res.status_code != 200:
+        raise APIError(res)
+    return res.json()
+
+
+def wait_for_cluster(cluster_id, client, states, deadline):
+    """
+    Wait for a cluster to reach one of the given states
+
+    Parameters
+    ----------
+    cluster_id: string
+        id of the cluster
+    client: APIClient
+        client for the Databricks account
+    states: tuple of strings
+        cluster states to wait for (e.g. ('RUNNING',))
+    deadline: float
+        time.monotonic() value after which to give up
+
+    Returns
+    -------
+    state reached by the cluster
+    """
+    def check():
+        cluster_info = get_cluster_info(cluster_id, client)
+        state = cluster_info['state']
+        if state in states:
+            return state
+        if state in CLUSTER_FAILED_STATES:
+            raise Exception(
+                f'Cluster {cluster_id} is {state}: '
+                f"{cluster_info.get('state_message', '')}"
+            )
+        return None
+
+    return _poll(check, deadline, f'cluster {cluster_id} to be {states}')
+
+
+def wait_for_libraries(cluster_id, client, deadline, n_libraries=0):
+    """
+    Wait for all libraries on a cluster to be installed
+
+    Parameters
+    ----------
+    cluster_id: string
+        id of the cluster
+    client: APIClient
+        client for the Databricks account
+    deadline: float
+        time.monotonic() value after which to give up
+    n_libraries: int
+        number of libraries attached to the cluster - keep waiting until
+         Databricks reports at least this many, as it may not list libraries
+         just attached yet
+    """
+    def check():
+        res = client.get(
+            f'/api/2.0/libraries/cluster-status?cluster_id={cluster_id}'
+        )
+        if res.status_code != 200:
+            raise APIError(res)
+        library_statuses = res.json().get('library_statuses', [])
+        failed = [
+            lib for lib in library_statuses if lib['status'] == 'FAILED'
+        ]
+        if failed:
+            raise Exception(
+                'Libraries failed to install: ' + '; '.join(
+                    f"{lib['library']}: {', '.join(lib.get('messages', []))}"
+                    for lib in failed
+                )
+            )
+        return len(library_statuses) >= n_libraries and all(
+            lib['status'] in LIBRARY_DONE_STATUSES for lib in library_statuses
+        )
+
+    _poll(
+        check,
+        deadline,
+        f'libraries to install on cluster {cluster_id}',
+    )
+
+
+def create_job_library(
+    logger,
+    job_id,
+    cluster_name,
+    token,
+    wait=False,
+    timeout=DEFAULT_TIMEOUT,
+    timings=None,
+):
     """
     Pull down a job cluster config, creates a new cluster with that config,
     and attaches job libraries to cluster
@@ -154,6 +296,13 @@ def create_job_library(logger, job_id, cluster_name, token):
         Name for your cluster, will be default if None
     token: string
         Databricks API key
+    wait: bool
+        if true, return only once the cluster is running and all libraries
+         are installed
+    timeout: int
+        seconds to wait for the cluster (and libraries) before giving up
+    timings: CallTimings
+        if given, every API call is recorded in it
 
     Side Effects
     ------------
@@ -168,31 +317,53 @@ def create_job_library(logger, job_id, cluster_name, token):
                          ' to get set up')
 
     try:
-        cluster_config = get_job_cluster_config(job_id, token, host)
-
-        cluster_id, cluster_name = create_new_cluster(
-            job_id,
-            cluster_name,
-            cluster_config,
-            token,
-            host
-        )
-
-        logger.info(
-            f'Cluster {cluster_name} will come up in 20 seconds'
-        )
-
-        time.sleep(20)  # Wait for cluster to be up before attaching libraries
-
-        attach_job_libraries_to_cluster(
-            cluster_id,
-            cluster_config,
+        with APIClient(
+            host,
             token,
-            host
-        )
-
-        logger.info(
-            f'New cluster {cluster_name} created on Databricks'
-        )
+            rate_limiter=RateLimiter.from_config(config),
+            timings=timings,
+        ) as client:
+            cluster_config = get_job_cluster_config(job_id, client)
+
+            cluster_id, cluster_name = create_new_cluster(
+                job_id,
+                cluster_name,
+                cluster_config,
+                client,
+            )
+
+            logger.info(f'Cluster {cluster_name} is starting')
+
+            deadline = time.monotonic() + timeout
+            # Wait for cluster to exist before attaching libraries
+            wait_for_cluster(
+                cluster_id,
+                client,
+                ('PENDING', 'RUNNING'),
+                deadline,
+            )
+
+            attach_job_libraries_to_cluster(
+                cluster_id,
+                cluster_config,
+                client,
+            )
+
+            logger.info(
+                f'New cluster {cluster_name} created on Databricks'
+            )
+
+            if wait:
+                wait_for_cluster(cluster_id, client, ('RUNNING',), deadline)
+                wait_for_libraries(
+                    cluster_id,
+                    client,
+                    deadline,
+                    len(cluster_config.get('libraries', [])),
+                )
+                logger.info(
+                    f'Cluster {cluster_name} is running with all '
+                    'libraries installed'
+                )
     except APIError as err:
         raise err
@@ -0,0 +1,161 @@
+"""
+Streaming upload of large files to DBFS, one block at a time, using the
+ create/add-block/close API.
+"""
+import base64
+import json
+from os.path import getsize
+
+from requests.exceptions import RequestException
+
+from .api_calls import get_call, post_call, run_calls, Sleep
+from .api_error import APIError
+
+# add-block accepts at most 1MB of data per call
+DBFS_BLOCK_SIZE = 1024 * 1024
+MAX_BLOCK_RETRIES = 5
+BLOCK_RETRY_DELAY = 2
+MAX_UPLOAD_RETRIES = 2
+
+
+class DBFSUploadError(Exception):
+    """
+    exception to handle when a file uploaded to DBFS does not have the size
+     of the local file
+    """
+    def __init__(self, dbfs_path, size, expected_size):
+        Exception.__init__(
+            self,
+            'upload to {} failed: {} bytes written instead of {}'
+            .format(dbfs_path, size, expected_size)
+        )
+        self.dbfs_path = dbfs_path
+        self.size = size
+        self.expected_size = expected_size
+
+
+def _dbfs_post_calls(endpoint, body):
+    res = yield post_call('/api/2.0/dbfs/' + endpoint, data=json.dumps(body))
+    if res.status_code != 200:
+        raise APIError(res)
+    return res.json()
+
+
+def get_dbfs_file_size(dbfs_path, client):
+    """
+    size in bytes of a file in DBFS, or None if it cannot be found
+
+    Parameters
+    ----------
+    dbfs_path: string
+        absolute path in DBFS, without the dbfs: prefix
+    client: APIClient
+        client for the Databricks account
+    """
+    return run_calls(client, get_dbfs_file_size_calls(dbfs_path))
+
+
+def get_dbfs_file_size_calls(dbfs_path):
+    """
+    get_dbfs_file_size, as a generator of API calls (see api_calls)
+    """
+    res = yield get_call(
+        '/api/2.0/dbfs/get-status?path={}'.format(dbfs_path)
+    )
+    if res.status_code != 200:
+        return None
+    return res.json().get('file_size')
+
+
+def _iter_blocks(filename, block_size):
+    """
+    read a local file one block at a time
+    """
+    with open(filename, 'rb') as file_obj:
+        yield from iter(lambda: file_obj.read(block_size), b'')
+
+
+def _add_block_calls(handle, data):
+    """
+    append one block to an open DBFS handle, resending it after a transient
+     failure - a fatal error (e.g. an invalid handle) is raised at once
+
+    A call which failed may still have written the block, so a resent block
+     can end up in the file twice: upload_to_dbfs_calls checks the size of
+     the file once it is closed.
+    """
+    body = {'handle': handle, 'data': base64.b64encode(data).decode('ascii')}
+    for attempt in range(MAX_BLOCK_RETRIES + 1):
+        try:
+            yield from _dbfs_post_calls('add-block', body)
+            return
+        except APIError as err:
+            if not err.retryable or attempt == MAX_BLOCK_RETRIES:
+                raise
+        except RequestException:
+            if attempt == MAX_BLOCK_RETRIES:
+                raise
+        yield Sleep(BLOCK_RETRY_DELAY * 2 ** attempt)
+
+
+def upload_to_dbfs(
+    filename,
+    dbfs_path,
+    client,
+    block_size=DBFS_BLOCK_SIZE,
+):
+    """
+    stream a local file to DBFS in fixed-size blocks
+
+    Only one block is held in memory at a time. Blocks must be appended to
+     the handle in order, so they are sent one after another. The file is
+     created anew, so an upload which was interrupted is not resumed: it
+     starts again from the first block.
+
+    Parameters
+    ----------
+    filename: string
+        local location of file to upload
+    dbfs_path: string
+        absolute path in DBFS to upload to, without the dbfs: prefix
+        (e.g. '/FileStore/jars/stork/new_library-1.0.0.jar')
+    client: APIClient
+        client for the Databricks account
+    block_size: int
+        bytes sent per add-block call, at most DBFS_BLOCK_SIZE
+
+    Side Effects
+    ------------
+    file (over)written in DBFS
+
+    Raises
+    ------
+    DBFSUploadError
+        if the file in DBFS still has the wrong size after MAX_UPLOAD_RETRIES
+         new uploads
+    """
+    run_calls(client, upload_to_dbfs_calls(filename, dbfs_path, block_size))
+
+
+def upload_to_dbfs_calls(filename, dbfs_path, block_size=DBFS_BLOCK_SIZE):
+    """
+    upload_to_dbfs, as a generator of API calls (see api_calls)
+
+    The size of the file is only checked once its handle is closed, as
+     nothing shows that DBFS reports the size of a file still being written.
+     A wrong size (e.g. a resent block which had been written after all)
+     starts the upload again from the first block.
+    """
+    expected_size = getsize(filename)
+    for attempt in range(MAX_UPLOAD_RETRIES + 1):
+        handle = (yield from _dbfs_post_calls('create', {
+            'path': dbfs_path,
+            'overwrite': True,
+        }))['handle']
+        for data in _iter_blocks(filename, block_size):
+            yield from _add_block_calls(handle, data)
+        yield from _dbfs_post_calls('close', {'handle': handle})
+        size = yield from get_dbfs_file_size_calls(dbfs_path)
+        if size == expected_size:
+            return
+    raise DBFSUploadError(dbfs_path, size, expected_size)
@@ -0,0 +1,355 @@
+"""
+This file handles splitting `upload-and-update` into a plan, made from the
+ read-only calls (checking the libraries, scanning the production folder and
+ listing jobs), and applying that plan later, which only sends the writes.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename
+
+from .api_client import APIClient, DEFAULT_POOL_SIZE
+from .file_name import FileNameMatch
+from .job_index import JobLibraryIndex
+from .library_cache import LibraryStatusCache
+from .library_digest import file_digest
+from .rate_limiter import RateLimiter
+from .update_databricks_library import (
+    _check_duplicate_libraries,
+    _check_library,
+    _group_job_updates,
+    _load_host_config,
+    _log_already_exists,
+    _map_concurrently,
+    _released_libraries,
+    _update_jobs_and_cleanup,
+    _upload_library,
+    get_library_mapping,
+    iter_jobs,
+)
+from .version_index import VersionIndex
+
+PLAN_VERSION = 1
+
+
+def _library_key(match):
+    # the name of the library in Databricks, as in the keys of id_nums
+    return '{}-{}'.format(match.library_name, match.version)
+
+
+def plan_update(
+    logger,
+    path,
+    token,
+    cleanup=True,
+    max_workers=1,
+    timings=None,
+):
+    """
+    work out everything upload-and-update would do, without writing anything
+
+    Checking the libraries, scanning the production folder and listing jobs
+     run at the same time.
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    path: string or list of strings
+        path(s) with name of egg as output from setuptools
+        (e.g. dist/new_library-1.0.0-py3.6.egg)
+    token: string
+        Databricks API key
+    cleanup: bool
+        if true, the plan includes deleting outdated libraries
+    max_workers: int
+        maximum number of concurrent API requests in each phase
+    timings: CallTimings
+        if given, every API call is recorded in it
+
+    Returns
+    -------
+    dictionary with the libraries to upload, the jobs to update (with their
+     settings as listed and the library paths to replace), the old library
+     versions to delete, and the statuses of the production libraries, which
+     can be saved with save_plan and applied with apply_plan
+
+    Raises
+    ------
+    LibraryConflictError
+        if the same version of a library was already uploaded by stork
+         with different contents
+    """
+    config, host, prod_folder = _load_host_config()
+
+    paths = [path] if isinstance(path, str) else list(path)
+    matches = [FileNameMatch(basename(library_path)) for library_path in paths]
+    _check_duplicate_libraries(matches)
+    # the statuses are kept in the plan rather than on disk
+    statuses = LibraryStatusCache(host, cache_dir=None)
+
+    with APIClient(
+        host,
+        token,
+        pool_size=max(3 * max_workers, DEFAULT_POOL_SIZE),
+        rate_limiter=RateLimiter.from_config(config),
+        timings=timings,
+    ) as client, ThreadPoolExecutor(max_workers=3) as executor:
+        checks_future = executor.submit(
+            _map_concurrently,
+            lambda item: _check_library(item[0], item[1], prod_folder, client),
+            list(zip(paths, matches)),
+            max_workers,
+        )
+        mapping_future = executor.submit(
+            get_library_mapping,
+            logger,
+            prod_folder,
+            client,
+            max_workers=max_workers,
+            cache=statuses,
+        )
+        jobs_future = executor.submit(lambda: list(iter_jobs(client)))
+        checks = checks_future.result()
+        library_map, id_nums = mapping_future.result()
+        jobs = jobs_future.result()
+
+    released = []
+    for match, (digest, status) in zip(matches, checks):
+        if status == 'exists':
+            _log_already_exists(logger, match)
+        else:
+            released.append(match)
+
+    index = JobLibraryIndex.from_jobs(logger, jobs, library_map)
+    job_updates = _group_job_updates(
+        logger,
+        released,
+        [_library_key(match) for match in released],
+        [index.replaceable_by(logger, match) for match in released],
+    )
+    deletes = []
+    if cleanup:
+        versions = VersionIndex.from_id_nums(id_nums)
+        for match in released:
+            for lib in versions.older_than(match):
+                deletes.append({
+                    'library': _library_key(match),
+                    'filename': lib['name_match'].filename,
+                    'id_num': lib['id_num'],
+                })
+
+    plan = {
+        'version': PLAN_VERSION,
+        'host': host,
+        'prod_folder': prod_folder,
+        'created_at': time.time(),
+        'libraries': [
+            {
+                'path': library_path,
+                'library': _library_key(match),
+                'digest': digest,
+                'status': status,
+            }
+            for library_path, match, (digest, status)
+            in zip(paths, matches, checks)
+        ],
+        'jobs': [
+            {
+                'job_id': job['job_id'],
+                'job_name': job['job_name'],
+                'settings': job['settings'],
+                'replacements': {
+                    library_path: list(replacement)
+                    for library_path, replacement in replacements.items()
+                },
+            }
+            for job, replacements in job_updates.values()
+        ],
+        'deletes': deletes,
+        'library_statuses': statuses.statuses,
+    }
+    logger.info(
+        'plan: upload {}; update jobs {}; delete {}'
+        .format(
+            ', '.join(
+                lib['library'] for lib in plan['libraries']
+                if lib['status'] == 'new'
+            ) or 'nothing',
+            ', '.join(job['job_name'] for job in plan['jobs']) or 'none',
+            ', '.join(lib['filename'] for lib in deletes) or 'nothing',
+        )
+    )
+    return plan
+
+
+def save_plan(plan, plan_path):
+    with open(plan_path, 'w') as f:
+        json.dump(plan, f, indent=2, sort_keys=True)
+
+
+def load_plan(plan_path):
+    with open(plan_path) as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(
+            '{} is not a plan made by this version of stork: please make a '
+            'new plan'.format(plan_path)
+        )
+    return plan
+
+
+def apply_plan(
+    logger,
+    plan,
+    token,
+    cleanup=True,
+    max_workers=1,
+    timings=None,
+):
+    """
+    upload libraries, update jobs and delete old versions as planned
+
+    Only the writes are sent, plus listing the production folder and
+     fetching the status of the new libraries, to find the paths jobs should
+     use. Each job is verified before it is updated, and left untouched if it
+     changed since the plan was made. Before old versions are deleted, jobs
+     are listed once more, and none is deleted while a job created or changed
+     since the plan was made still uses one.
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    plan: dict
+        output of plan_update (or load_plan)
+    token: string
+        Databricks API key
+    cleanup: bool
+        if false, no old versions are deleted, even if planned
+    max_workers: int
+        maximum number of concurrent API requests
+    timings: CallTimings
+        if given, every API call is recorded in it
+
+    Raises
+    ------
+    ValueError
+        if the plan was made for another workspace, or a library changed
+         or left the production folder since the plan was made
+    JobUpdateError
+        if any job could not be updated - all other jobs are still updated,
+         but no old versions are removed
+    LibraryDeleteError
+        if any old version could not be removed
+    """
+    config, host, prod_folder = _load_host_config()
+    if (plan['host'], plan['prod_folder']) != (host, prod_folder):
+        raise ValueError(
+            'plan was made for {} on {}, but stork is configured for {} on {}'
+            .format(plan['prod_folder'], plan['host'], prod_folder, host)
+        )
+    libraries = plan['libraries']
+    matches = [FileNameMatch(basename(lib['path'])) for lib in libraries]
+    for lib in libraries:
+        if file_digest(lib['path']) != lib['digest']:
+            raise ValueError(
+                '{} changed since the plan was made: please make a new plan'
+                .format(lib['path'])
+            )
+
+    with APIClient(
+        host,
+        token,
+        pool_size=max(max_workers, DEFAULT_POOL_SIZE),
+        rate_limiter=RateLimiter.from_config(config),
+        timings=timings,
+    ) as client:
+
+        def upload(item):
+            lib, match = item
+            if lib['status'] != 'new':
+                return lib['status']
+            return _upload_library(
+                logger,
+                lib['path'],
+                match,
+                prod_folder,
+                lib['digest'],
+                client,
+            )
+
+        statuses = _map_concurrently(
+            upload,
+            list(zip(libraries, matches)),
+            max_workers,
+        )
+        released = _released_libraries(logger, matches, statuses)
+        if not released:
+            return
+
+        library_map, _ = get_library_mapping(
+            logger,
+            prod_folder,
+            client,
+            max_workers=max_workers,
+            cache=LibraryStatusCache(
+                host,
+                cache_dir=None,
+                statuses=plan['library_statuses'],
+            ),
+        )
+        library_uris = {
+            _library_key(tmp_match): uri
+            for uri, tmp_match in library_map.items()
+        }
+        for match in released:
+            if _library_key(match) not in library_uris:
+                raise ValueError(
+                    '{} is no longer in {}: please make a new plan'
+                    .format(_library_key(match), prod_folder)
+                )
+        new_paths = {
+            _library_key(match):
+                'dbfs:/FileStore/jars/' + library_uris[_library_key(match)]
+            for match in released
+        }
+
+        job_updates = {}
+        for job in plan['jobs']:
+            replacements = {
+                library_path: (suffix, new_paths[library])
+                for library_path, (suffix, library)
+                in job['replacements'].items()
+                if library in new_paths
+            }
+            if replacements:
+                job_updates[job['job_id']] = (
+                    {
+                        'job_id': job['job_id'],
+                        'job_name': job['job_name'],
+                        'settings': job['settings'],
+                    },
+                    replacements,
+                )
+        planned_versions = {
+            lib['filename']: {
+                'name_match': FileNameMatch(lib['filename']),
+                'id_num': lib['id_num'],
+            }
+            for lib in plan['deletes']
+        }
+
+        _update_jobs_and_cleanup(
+            logger,
+            job_updates,
+            released,
+            planned_versions,
+            client,
+            prod_folder,
+            cleanup and len(planned_versions) != 0,
+            max_workers=max_workers,
+            # jobs may have changed since the plan was made
+            verify=True,
+            library_map=library_map,
+        )
@@ -36,39 +36,118 @@ class FileNameMatch(object):
         base name of library (e.g. 'test_library')
     version: string
         version of library (e.g. '1.0.0')
+    minor_key: tuple of ints
+        minor and patch version, for comparing versions (e.g. (10, 1) for
+         '1.10.1', which sorts after (9, 0) for '1.9.0')
 
     """
+    __slots__ = (
+        'filename',
+        'library_name',
+        'version',
+        'major_version',
+        'minor_version',
+        'minor_key',
+        'suffix',
+        'lib_type',
+    )
+
     file_pattern = (
         r'([a-zA-Z0-9-\._]+)-((\d+)\.(\d+\.\d+)'
         r'(?:-SNAPSHOT(?:[a-zA-Z_\-\.]+)?)?)(?:-py.+)?\.(egg|jar)'
     )
+    _pattern = re.compile(file_pattern)
 
     def __init__(self, filename):
-        match = re.match(FileNameMatch.file_pattern, filename)
-        try:
-            self.filename = filename
-            self.library_name = match.group(1)
-            self.version = match.group(2)
-            self.major_version = match.group(3)
-            self.minor_version = match.group(4)
-            self.suffix = match.group(5)
-            if self.suffix == 'jar':
-                self.lib_type = 'java-jar'
-            elif self.suffix == 'egg':
-                self.lib_type = 'python-egg'
-        except (IndexError, AttributeError):
+        match = FileNameMatch._pattern.match(filename)
+        if match is None:
             raise FileNameError(filename)
+        self._set_groups(filename, match)
+
+    def _set_groups(self, filename, match):
+        # instances are immutable, so attributes are only set here
+        set_attr = object.__setattr__
+        set_attr(self, 'filename', filename)
+        set_attr(self, 'library_name', match.group(1))
+        set_attr(self, 'version', match.group(2))
+        set_attr(self, 'major_version', match.group(3))
+        set_attr(self, 'minor_version', match.group(4))
+        set_attr(self, 'minor_key', tuple(
+            int(part) for part in match.group(4).split('.')
+        ))
+        set_attr(self, 'suffix', match.group(5))
+        set_attr(
+            self,
+            'lib_type',
+            'java-jar' if match.group(5) == 'jar' else 'python-egg',
+        )
+
+    @classmethod
+    def parse_many(cls, filenames):
+        """
+        parse many file names at once, without raising for those which do not
+         match
+
+        Parameters
+        ----------
+        filenames: iterable of strings
+            file names of eggs or jars (e.g. 'new_library-1.0.0-py3.6.egg')
+
+        Returns
+        -------
+        list of (filename, match, reason) tuples, in the same order as
+         filenames - match is a FileNameMatch object and reason is None if the
+         file name was parsed, otherwise match is None and reason says why
+        """
+        pattern = cls._pattern
+        results = []
+        for filename in filenames:
+            match = pattern.match(filename)
+            if match is not None:
+                name_match = cls.__new__(cls)
+                name_match._set_groups(filename, match)
+                results.append((filename, name_match, None))
+            elif not filename.endswith(('.egg', '.jar')):
+                results.append((filename, None, 'not an egg or jar'))
+            else:
+                results.append((filename, None, 'file name is not parsable'))
+        return results
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FileNameMatch objects are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('FileNameMatch objects are immutable')
+
+    def __reduce__(self):
+        return (self.__class__, (self.filename,))
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.filename)
+
+    def _key(self):
+        # the file name is left out, so that matches differing only by python
+        #  version tag are equal
+        return (
+            self.library_name,
+            self.version,
+            self.major_version,
+            self.minor_version,
+            self.suffix,
+        )
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            self_attrs = {k: v for k, v in vars(self).items()}
-            self_attrs.pop('filename')
-            other_attrs = {k: v for k, v in vars(other).items()}
-            other_attrs.pop('filename')
-            return self_attrs == other_attrs
+            return self._key() == other._key()
         else:
             return False
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
     def replace_version(self, other, logger):
         """
         True if self can safely replace other
@@ -92,7 +171,7 @@ class FileNameMatch(object):
                 )
             )
             return False
-        elif float(other.minor_version) >= float(self.minor_version):
+        elif other.minor_key >= self.minor_key:
             logger.debug(
                 'not replacable: {} >= {} ({})'
                 .format(
@@ -0,0 +1,161 @@
+"""
+JobLibraryIndex maps each library used by jobs to the jobs using it, so that
+ jobs/list only has to be walked once however many libraries are looked up.
+"""
+from itertools import count
+from operator import itemgetter
+from os.path import basename
+
+from .version_index import VersionIndex
+
+SUFFIXES = ('egg', 'jar')
+
+
+class JobLibraryIndex(object):
+    """
+    Index of jobs by the production libraries they use, keyed by library
+     name, major version and suffix (e.g. ('test-library', 1, 'egg'))
+
+    Only libraries in the production folder (i.e. in the library mapping)
+     are indexed, as only those can be replaced.
+
+    Parameters
+    ----------
+    library_mapping: dict
+        first element of get_library_mapping output
+    """
+    def __init__(self, library_mapping):
+        self.library_mapping = library_mapping
+        self.entries = {}
+        self.versions = VersionIndex()
+        self._order = count()
+
+    @staticmethod
+    def key(match):
+        """
+        index key of a FileNameMatch object
+        """
+        return (match.library_name, int(match.major_version), match.suffix)
+
+    @classmethod
+    def from_jobs(cls, logger, jobs, library_mapping):
+        """
+        build an index in a single pass over jobs
+
+        Parameters
+        ----------
+        logger: logging object
+            configured in cli_commands.py
+        jobs: iterable of dicts
+            jobs as returned by the jobs/list API (e.g. iter_jobs(client))
+        library_mapping: dict
+            first element of get_library_mapping output
+        """
+        index = cls(library_mapping)
+        for job in jobs:
+            index.add_job(logger, job)
+        return index
+
+    @staticmethod
+    def job_libraries(logger, job, library_mapping):
+        """
+        production libraries of one job from jobs/list
+
+        Yields
+        ------
+        dictionary containing the job id, job name, library path, job
+         settings, and name match object of each library of the job in
+         library_mapping
+        """
+        logger.debug('job: {}'.format(job['settings']['name']))
+        for library in job['settings'].get('libraries', []):
+            for suffix in SUFFIXES:
+                if suffix not in library:
+                    continue
+                job_library_uri = basename(library[suffix])
+                job_match = library_mapping.get(job_library_uri)
+                if job_match is None:
+                    logger.debug(
+                        'not in library map: {}'.format(job_library_uri)
+                    )
+                    continue
+                yield {
+                    'job_id': job['job_id'],
+                    'job_name': job['settings']['name'],
+                    'library_path': library[suffix],
+                    'settings': job['settings'],
+                    'name_match': job_match,
+                }
+
+    @classmethod
+    def replaceable_in_job(cls, logger, job, library_mapping, match):
+        """
+        replaceable_by for the libraries of a single job, without building an
+         index
+        """
+        return [
+            _job_library(entry)
+            for entry in cls.job_libraries(logger, job, library_mapping)
+            if cls.key(entry['name_match']) == cls.key(match)
+            and entry['name_match'].minor_key < match.minor_key
+        ]
+
+    def add_job(self, logger, job):
+        """
+        index the production libraries of one job from jobs/list
+        """
+        for entry in self.job_libraries(logger, job, self.library_mapping):
+            job_match = entry['name_match']
+            self.entries.setdefault(self.key(job_match), []).append(entry)
+            self.versions.add(job_match, (next(self._order), entry))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def jobs_using(self, library_name, major_version, suffix):
+        """
+        jobs using any version of a library with the given major version
+
+        Returns
+        -------
+        list of dictionaries containing the job id, job name, library path,
+         job settings, and name match object of the library used
+        """
+        return list(
+            self.entries.get((library_name, int(major_version), suffix), [])
+        )
+
+    def replaceable_by(self, logger, match):
+        """
+        jobs using an older version of the same major version of a library
+
+        Parameters
+        ----------
+        logger: logging object
+            configured in cli_commands.py
+        match: FilenameMatch object
+            match object for the new version of the library
+
+        Returns
+        -------
+        list of dictionaries containing the job id, job name, library path,
+         and job settings for each job library the new version can replace,
+         in the same form as get_job_list
+        """
+        # older versions are found by version, but listed in job order
+        return [
+            _job_library(entry)
+            for _, entry in sorted(
+                self.versions.older_than(match),
+                key=itemgetter(0),
+            )
+            if entry['name_match'].suffix == match.suffix
+        ]
+
+
+def _job_library(entry):
+    # an index entry in the form of get_job_list
+    return {key: value for key, value in entry.items() if key != 'name_match'}
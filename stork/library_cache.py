@@ -0,0 +1,107 @@
+"""
+LibraryStatusCache keeps libraries/status results on disk between runs, so
+ that only libraries new to the production folder need to be fetched. Without
+ a cache folder it only keeps them in memory, as deploy plans do.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from os.path import expanduser, join
+
+
+CACHE_DIR = join(expanduser('~'), '.stork', 'cache')
+
+# the only parts of the libraries/status output stork relies on
+CACHED_FIELDS = ('name', 'libType', 'files')
+
+
+class LibraryStatusCache(object):
+    """
+    On-disk cache of library status, keyed by library id, for a single host
+
+    Parameters
+    ----------
+    host: string
+        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    cache_dir: string
+        folder holding the cache files, one per host, or None to keep the
+         cache in memory only, so that save does nothing
+    statuses: dict
+        if given, library status keyed by library id (as a string) to start
+         from instead of the statuses read from disk
+    """
+    def __init__(self, host, cache_dir=CACHE_DIR, statuses=None):
+        self.host = host
+        if cache_dir is None:
+            self.path = None
+        else:
+            host_hash = hashlib.sha1(host.encode('utf-8')).hexdigest()[:16]
+            self.path = join(
+                cache_dir, 'library_status_{}.json'.format(host_hash)
+            )
+        if statuses is not None:
+            self.statuses = dict(statuses)
+        else:
+            self.statuses = self._read()
+
+    def _read(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                contents = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if contents.get('host') != self.host:
+            return {}
+        return contents.get('statuses', {})
+
+    def get(self, library_id):
+        """
+        cached library status, or None if library_id has not been seen
+        """
+        return self.statuses.get(str(library_id))
+
+    def set(self, library_id, library_info):
+        self.statuses[str(library_id)] = {
+            k: library_info[k] for k in CACHED_FIELDS if k in library_info
+        }
+
+    def evict_missing(self, library_ids):
+        """
+        remove every library not in library_ids from the cache
+
+        Returns
+        -------
+        list of evicted library ids
+        """
+        keep = {str(library_id) for library_id in library_ids}
+        evicted = [k for k in self.statuses if k not in keep]
+        for k in evicted:
+            del self.statuses[k]
+        return evicted
+
+    def save(self):
+        """
+        write the cache to disk, replacing the previous file atomically
+
+        Each save writes to its own temporary file, so that processes saving
+         the cache of the same host at once can't mix their contents.
+        """
+        if self.path is None:
+            return
+        cache_dir = os.path.dirname(self.path)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=cache_dir,
+            prefix=os.path.basename(self.path) + '.',
+            suffix='.tmp',
+        )
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'host': self.host, 'statuses': self.statuses}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
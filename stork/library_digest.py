@@ -0,0 +1,175 @@
+"""
+Content digests of uploaded libraries, stored in DBFS next to the libraries
+ themselves, so that re-uploading an identical build can be skipped before
+ any bytes are sent.
+"""
+import base64
+import hashlib
+import json
+
+from .api_calls import get_call, post_call, run_calls
+from .api_error import APIError
+
+DIGEST_FOLDER = '/FileStore/stork/digests'
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class LibraryConflictError(Exception):
+    """
+    exception to handle when a library version already exists in Databricks
+     with different contents
+    """
+    def __init__(self, library_name, folder):
+        Exception.__init__(
+            self,
+            'Library \'{}\' already exists in {} with different contents: '
+            'if a change has been made please update your version number'
+            .format(library_name, folder)
+        )
+        self.library_name = library_name
+        self.folder = folder
+
+
+def file_digest(filename):
+    """
+    sha256 hex digest of a local file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _library_name(match):
+    return '{}-{}'.format(match.library_name, match.version)
+
+
+def _digest_folder(folder):
+    return DIGEST_FOLDER + folder.rstrip('/')
+
+
+def _digest_path(folder, match):
+    return '{}/{}.{}.sha256'.format(
+        _digest_folder(folder),
+        _library_name(match),
+        match.suffix,
+    )
+
+
+def library_exists(folder, match, client):
+    """
+    True if a library with the same name and version is already in folder
+
+    Parameters
+    ----------
+    folder: string
+        Databricks folder to look in
+    match: FilenameMatch object
+        match object with library_name and version
+    client: APIClient
+        client for the Databricks account
+    """
+    return run_calls(client, library_exists_calls(folder, match))
+
+
+def library_exists_calls(folder, match):
+    """
+    library_exists, as a generator of API calls (see api_calls)
+    """
+    res = yield get_call('/api/2.0/workspace/get-status?path={}/{}'.format(
+        folder.rstrip('/'),
+        _library_name(match),
+    ))
+    if res.status_code == 200:
+        return res.json().get('object_type') == 'LIBRARY'
+    return _not_found(res, False)
+
+
+def _not_found(res, value):
+    # value if res says the path does not exist, else raise
+    err = APIError(res)
+    if err.code == 'RESOURCE_DOES_NOT_EXIST' or res.status_code == 404:
+        return value
+    raise err
+
+
+def get_stored_digest(folder, match, client):
+    """
+    digest recorded when the library was uploaded by stork, or None if the
+     library was uploaded without one
+    """
+    return run_calls(client, get_stored_digest_calls(folder, match))
+
+
+def get_stored_digest_calls(folder, match):
+    """
+    get_stored_digest, as a generator of API calls (see api_calls)
+    """
+    res = yield get_call(
+        '/api/2.0/dbfs/read?path={}'.format(_digest_path(folder, match))
+    )
+    if res.status_code == 200:
+        return base64.b64decode(res.json().get('data', '')).decode('ascii')
+    return _not_found(res, None)
+
+
+def check_library_calls(folder, match, digest):
+    """
+    compare a local library with any existing library of the same name and
+     version in folder, as a generator of API calls (see api_calls)
+
+    Parameters
+    ----------
+    folder: string
+        Databricks folder to look in
+    match: FilenameMatch object
+        match object with library_name and version
+    digest: string
+        output of file_digest for the local library
+
+    Returns
+    -------
+    'new' if the library is not in folder yet, 'identical' if it is there
+     with the same contents, or 'exists' if it is there without a digest
+     (uploaded before digests were recorded, or whose digest could not be
+     stored), so its contents can't be compared
+
+    Raises
+    ------
+    LibraryConflictError
+        if the library is in folder with different contents
+    """
+    if not (yield from library_exists_calls(folder, match)):
+        return 'new'
+    stored_digest = yield from get_stored_digest_calls(folder, match)
+    if stored_digest is None:
+        return 'exists'
+    elif stored_digest != digest:
+        raise LibraryConflictError(_library_name(match), folder)
+    return 'identical'
+
+
+def store_digest(folder, match, digest, client):
+    """
+    record the digest of a library just uploaded to folder
+
+    Side Effects
+    ------------
+    writes a small file under DIGEST_FOLDER in DBFS
+    """
+    run_calls(client, store_digest_calls(folder, match, digest))
+
+
+def store_digest_calls(folder, match, digest):
+    """
+    store_digest, as a generator of API calls (see api_calls)
+    """
+    res = yield post_call('/api/2.0/dbfs/put', data=json.dumps({
+        'path': _digest_path(folder, match),
+        'contents': base64.b64encode(digest.encode('ascii')).decode('ascii'),
+        # also makes a retried put safe (see retry_policy.IDEMPOTENT_POSTS)
+        'overwrite': True,
+    }))
+    if res.status_code != 200:
+        raise APIError(res)
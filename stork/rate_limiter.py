@@ -0,0 +1,171 @@
+"""
+RateLimiter keeps the requests stork makes to each family of Databricks
+ endpoints under a configurable rate, shared by every thread using a client.
+"""
+import threading
+import time
+
+from configparser import NoOptionError
+
+from .configure import PROFILE
+
+# families of endpoints which may be limited in .storkcfg
+#  (e.g. `rate_limit_jobs = 5` for at most 5 requests per second to jobs/*)
+#  - there is no limit unless one is set, so that --workers is not capped
+FAMILIES = ('clusters', 'dbfs', 'jobs', 'libraries', 'workspace')
+
+# the rate never drops below this, however many 429s are seen
+MIN_RATE = 0.5
+# fraction of the configured rate kept after a 429
+BACKOFF_RATIO = 0.5
+# fraction of the configured rate regained after each successful call
+RECOVERY_RATIO = 0.05
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket which adapts its rate to rate limiting
+
+    Parameters
+    ----------
+    rate: float
+        requests per second allowed once the bucket is empty
+    capacity: float
+        number of requests allowed in a burst - defaults to one second's worth
+    """
+    def __init__(self, rate, capacity=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate,
+        )
+        self.updated = now
+
+    def reserve(self):
+        """
+        take a token, returning the seconds to wait before it may be used
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            # a negative balance reserves a slot for this caller, so
+            #  concurrent callers queue up instead of all waking at once
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        """
+        take a token, sleeping until one is available
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.rate * BACKOFF_RATIO, MIN_RATE)
+
+    def speed_up(self):
+        with self.lock:
+            self._refill()
+            self.rate = min(
+                self.rate + self.max_rate * RECOVERY_RATIO,
+                self.max_rate,
+            )
+
+
+class RateLimiter(object):
+    """
+    One token bucket per family of endpoints (jobs, libraries, workspace,
+     clusters, and dbfs)
+
+    Each bucket halves its rate whenever Databricks responds with a 429, then
+     gradually recovers to the configured rate as calls succeed.
+
+    Families without a rate are not limited, and calls to them which are
+     rate limited are only retried as set by the client's RetryPolicy.
+
+    Parameters
+    ----------
+    rates: dict
+        requests per second for each endpoint family - a family which is
+         missing or has a rate of None or 0 is not limited
+    """
+    def __init__(self, rates=None):
+        self.buckets = {
+            family: TokenBucket(rate) for family, rate in (rates or {}).items()
+            if rate
+        }
+
+    @classmethod
+    def from_config(cls, config, profile=PROFILE):
+        """
+        build a rate limiter from `rate_limit_<family>` keys in .storkcfg
+
+        Parameters
+        ----------
+        config: ConfigParser
+            contains keys/values in .storkcfg
+        profile: string
+            section of .storkcfg to read - keys missing from a named profile
+             are read from the default one
+        """
+        rates = {}
+        for family in FAMILIES:
+            key = 'rate_limit_{}'.format(family)
+            try:
+                value = config.get(profile, key)
+            except NoOptionError:
+                continue
+            try:
+                rates[family] = float(value)
+            except ValueError:
+                raise ValueError(
+                    '{} must be a number of requests per second, not {}'
+                    .format(key, value)
+                )
+        return cls(rates)
+
+    @staticmethod
+    def endpoint_family(path):
+        """
+        family of an endpoint (e.g. 'jobs' for '/api/2.0/jobs/list')
+        """
+        parts = path.split('?')[0].split('/')
+        return parts[3] if len(parts) > 3 else None
+
+    def reserve(self, path):
+        """
+        reserve a call to path, returning the seconds to wait before making it
+         - for callers which cannot block, such as coroutines
+        """
+        bucket = self.buckets.get(self.endpoint_family(path))
+        return bucket.reserve() if bucket is not None else 0
+
+    def acquire(self, path):
+        """
+        wait until a call to path is allowed
+        """
+        bucket = self.buckets.get(self.endpoint_family(path))
+        if bucket is not None:
+            bucket.acquire()
+
+    def record(self, path, status_code):
+        """
+        adapt the rate of path's family to the status code of a call to it
+        """
+        bucket = self.buckets.get(self.endpoint_family(path))
+        if bucket is None:
+            return
+        if status_code == 429:
+            bucket.slow_down()
+        else:
+            bucket.speed_up()
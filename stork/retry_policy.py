@@ -0,0 +1,164 @@
+"""
+RetryPolicy decides which failed Databricks API calls are retried, and how
+ long to wait before each retry.
+"""
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.exceptions import ConnectionError, ConnectTimeout, Timeout
+
+from .api_error import RETRYABLE_ERROR_CODES, RETRYABLE_STATUS_CODES
+
+# POST endpoints which leave the workspace in the same state however many
+#  times they are repeated - dbfs/put only because stork always sends it with
+#  overwrite set, and a repeated libraries/delete finds the library gone, which
+#  delete_old_versions counts as deleted
+IDEMPOTENT_POSTS = (
+    '/api/1.2/libraries/delete',
+    '/api/2.0/dbfs/put',
+    '/api/2.0/jobs/reset',
+    '/api/2.0/libraries/install',
+)
+
+# a non-idempotent call is only retried if it was certainly not carried out
+NON_IDEMPOTENT_STATUS_CODES = (429,)
+NON_IDEMPOTENT_ERROR_CODES = ('REQUEST_LIMIT_EXCEEDED',)
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with jitter for transient API failures
+
+    Idempotent calls (GETs and the POSTs in IDEMPOTENT_POSTS) are retried on
+     any retryable status code or connection error. Other calls (e.g. library
+     uploads) are only retried when Databricks rejected them without acting
+     on them - rate limiting or a failure to connect.
+
+    Parameters
+    ----------
+    max_retries: int
+        maximum number of retries of an idempotent call
+    max_non_idempotent_retries: int
+        maximum number of retries of any other call
+    backoff_factor: float
+        seconds to wait before the first retry, doubling for each retry after
+    max_backoff: float
+        maximum seconds to wait before a retry, including any Retry-After
+    """
+    def __init__(
+        self,
+        max_retries=5,
+        max_non_idempotent_retries=3,
+        backoff_factor=0.5,
+        max_backoff=60,
+    ):
+        self.max_retries = max_retries
+        self.max_non_idempotent_retries = max_non_idempotent_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    @staticmethod
+    def is_idempotent(method, path):
+        return method == 'GET' or path.split('?')[0] in IDEMPOTENT_POSTS
+
+    def max_attempts(self, method, path):
+        if self.is_idempotent(method, path):
+            return self.max_retries + 1
+        return self.max_non_idempotent_retries + 1
+
+    def should_retry_response(self, method, path, response, attempt):
+        """
+        True if a call which returned response should be retried
+
+        Parameters
+        ----------
+        method: string
+            HTTP method of the call
+        path: string
+            endpoint of the call
+        response: requests.Response
+            response to the call
+        attempt: int
+            number of the attempt which returned response, starting from 0
+        """
+        if attempt + 1 >= self.max_attempts(method, path):
+            return False
+        if response.status_code == 200:
+            return False
+        error_code = _error_code(response)
+        if self.is_idempotent(method, path):
+            return (
+                response.status_code in RETRYABLE_STATUS_CODES
+                or error_code in RETRYABLE_ERROR_CODES
+            )
+        return (
+            response.status_code in NON_IDEMPOTENT_STATUS_CODES
+            or error_code in NON_IDEMPOTENT_ERROR_CODES
+        )
+
+    def should_retry_error(self, method, path, error, attempt):
+        """
+        True if a call which raised error should be retried
+
+        Parameters
+        ----------
+        method: string
+            HTTP method of the call
+        path: string
+            endpoint of the call
+        error: requests.exceptions.RequestException
+            error raised by the call
+        attempt: int
+            number of the attempt which raised error, starting from 0
+        """
+        if attempt + 1 >= self.max_attempts(method, path):
+            return False
+        if self.is_idempotent(method, path):
+            return isinstance(error, (ConnectionError, Timeout))
+        return isinstance(error, ConnectTimeout)
+
+    def backoff(self, attempt, response=None):
+        """
+        seconds to wait before retrying, honouring any Retry-After header
+
+        Parameters
+        ----------
+        attempt: int
+            number of the failed attempt, starting from 0
+        response: requests.Response
+            response to the failed attempt, if there was one
+        """
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * 2 ** attempt, self.max_backoff)
+        # "equal jitter" - stops concurrent callers retrying in lockstep
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _error_code(response):
+    try:
+        return response.json().get('error_code')
+    except (ValueError, AttributeError):
+        return None
+
+
+def _retry_after(response):
+    """
+    seconds requested by a Retry-After header, or None if there is none
+    """
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at - time.time(), 0)
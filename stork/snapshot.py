@@ -0,0 +1,199 @@
+"""
+WorkspaceSnapshot keeps the jobs and production libraries of a workspace in a
+ local SQLite file, so that planning a release can read them without calling
+ the API, and `stork sync` only has to write what changed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from os.path import expanduser, join
+
+from .library_cache import CACHED_FIELDS
+
+SNAPSHOT_DIR = join(expanduser('~'), '.stork', 'snapshots')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    ' job_id INTEGER PRIMARY KEY,'
+    ' settings TEXT NOT NULL,'
+    ' settings_hash TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS libraries ('
+    ' library_id INTEGER PRIMARY KEY,'
+    ' status TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS meta ('
+    ' key TEXT PRIMARY KEY,'
+    ' value TEXT NOT NULL)',
+)
+
+
+def _settings_hash(settings_json):
+    return hashlib.sha1(settings_json.encode('utf-8')).hexdigest()
+
+
+class WorkspaceSnapshot(object):
+    """
+    SQLite snapshot of the jobs and production library statuses of a single
+     host
+
+    Library statuses are read and written through the same get, set,
+     evict_missing and save methods as LibraryStatusCache, so a snapshot can
+     be passed to get_library_mapping as its cache.
+
+    Parameters
+    ----------
+    host: string
+        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    snapshot_dir: string
+        folder holding the snapshot files, one per host
+    """
+    def __init__(self, host, snapshot_dir=SNAPSHOT_DIR):
+        self.host = host
+        host_hash = hashlib.sha1(host.encode('utf-8')).hexdigest()[:16]
+        self.path = join(snapshot_dir, 'workspace_{}.db'.format(host_hash))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    @property
+    def synced_at(self):
+        """
+        unix time of the last complete sync, or None if there has been none
+        """
+        row = self.connection.execute(
+            'SELECT value FROM meta WHERE key = ?', ('synced_at',)
+        ).fetchone()
+        return float(row[0]) if row else None
+
+    def mark_synced(self):
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ('synced_at', str(time.time())),
+            )
+
+    def iter_jobs(self):
+        """
+        iterate over the stored jobs, in the same form as iter_jobs
+        """
+        rows = self.connection.execute(
+            'SELECT job_id, settings FROM jobs ORDER BY job_id'
+        ).fetchall()
+        for job_id, settings in rows:
+            yield {'job_id': job_id, 'settings': json.loads(settings)}
+
+    def set_job(self, job_id, settings):
+        """
+        store the settings of a single job
+        """
+        settings_json = json.dumps(settings, sort_keys=True)
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)',
+                (job_id, settings_json, _settings_hash(settings_json)),
+            )
+
+    def sync_jobs(self, jobs):
+        """
+        make the stored jobs match jobs, writing only those which are new or
+         whose settings changed
+
+        Parameters
+        ----------
+        jobs: iterable of dicts
+            every job in the workspace, as returned by the jobs/list API
+
+        Returns
+        -------
+        dictionary with the number of jobs 'added', 'changed' and 'removed'
+        """
+        stored = dict(self.connection.execute(
+            'SELECT job_id, settings_hash FROM jobs'
+        ))
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        seen = set()
+        with self.connection:
+            for job in jobs:
+                seen.add(job['job_id'])
+                settings_json = json.dumps(job['settings'], sort_keys=True)
+                settings_hash = _settings_hash(settings_json)
+                if stored.get(job['job_id']) == settings_hash:
+                    continue
+                counts['changed' if job['job_id'] in stored else 'added'] += 1
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)',
+                    (job['job_id'], settings_json, settings_hash),
+                )
+            removed = [job_id for job_id in stored if job_id not in seen]
+            self.connection.executemany(
+                'DELETE FROM jobs WHERE job_id = ?',
+                [(job_id,) for job_id in removed],
+            )
+        counts['removed'] = len(removed)
+        return counts
+
+    def library_ids(self):
+        """
+        ids of the stored production libraries
+        """
+        return [
+            row[0] for row in self.connection.execute(
+                'SELECT library_id FROM libraries ORDER BY library_id'
+            )
+        ]
+
+    def get(self, library_id):
+        """
+        stored library status, or None if library_id has not been seen
+        """
+        row = self.connection.execute(
+            'SELECT status FROM libraries WHERE library_id = ?',
+            (int(library_id),),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, library_id, library_info):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO libraries VALUES (?, ?)',
+            (
+                int(library_id),
+                json.dumps({
+                    k: library_info[k] for k in CACHED_FIELDS
+                    if k in library_info
+                }),
+            ),
+        )
+
+    def evict_missing(self, library_ids):
+        """
+        remove every library not in library_ids from the snapshot
+
+        Returns
+        -------
+        list of evicted library ids
+        """
+        keep = {int(library_id) for library_id in library_ids}
+        evicted = [k for k in self.library_ids() if k not in keep]
+        self.connection.executemany(
+            'DELETE FROM libraries WHERE library_id = ?',
+            [(k,) for k in evicted],
+        )
+        return evicted
+
+    def save(self):
+        """
+        commit library statuses written with set and evict_missing
+        """
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,74 @@
+"""
+This file handles saving the jobs and production libraries of a workspace to
+ a local snapshot, refreshing only what changed since the last sync.
+"""
+from .api_client import APIClient, DEFAULT_POOL_SIZE
+from .configure import PROFILE
+from .rate_limiter import RateLimiter
+from .snapshot import WorkspaceSnapshot
+from .update_databricks_library import (
+    _load_host_config,
+    get_library_mapping,
+    iter_jobs,
+)
+
+
+def sync_workspace(logger, token, max_workers=1, profile=PROFILE):
+    """
+    bring the snapshot of a configured workspace up to date
+
+    Every job is listed (jobs/list already returns their settings), but only
+     new or changed jobs are written. The status of a production library is
+     only fetched the first time it is seen.
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    token: string
+        Databricks API key
+    max_workers: int
+        maximum number of library status requests in flight at once
+    profile: string
+        section of .storkcfg with the host, production folder and rate limits
+         of the workspace to sync
+
+    Returns
+    -------
+    dictionary with the number of jobs 'added', 'changed' and 'removed'
+
+    Side Effects
+    ------------
+    updated snapshot file in ~/.stork/snapshots
+    """
+    config, host, prod_folder = _load_host_config(profile)
+
+    with APIClient(
+        host,
+        token,
+        pool_size=max(max_workers, DEFAULT_POOL_SIZE),
+        rate_limiter=RateLimiter.from_config(config, profile),
+    ) as client, WorkspaceSnapshot(host) as snapshot:
+        counts = snapshot.sync_jobs(iter_jobs(client))
+        get_library_mapping(
+            logger,
+            prod_folder,
+            client,
+            max_workers=max_workers,
+            cache=snapshot,
+        )
+        snapshot.mark_synced()
+        n_libraries = len(snapshot.library_ids())
+
+    logger.info(
+        'synced jobs ({} added, {} changed, {} removed) and {} production '
+        'libraries from {}'
+        .format(
+            counts['added'],
+            counts['changed'],
+            counts['removed'],
+            n_libraries,
+            host,
+        )
+    )
+    return counts
@@ -4,17 +4,39 @@ The core of the program, update_databricks_library handles all the logic and
  in Databricks.
 """
 import json
-from os.path import basename
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from os.path import basename, getsize
 
-import requests
 from configparser import NoOptionError
+from requests.exceptions import RequestException
 
+from .api_calls import get_call, post_call, run_calls
+from .api_client import APIClient, DEFAULT_POOL_SIZE
 from .api_error import APIError
 from .configure import _load_config, CFG_FILE, PROFILE
-from .file_name import FileNameError, FileNameMatch
+from .dbfs import upload_to_dbfs_calls
+from .file_name import FileNameError, FileNameMatch  # noqa: F401
+from .job_index import JobLibraryIndex
+from .library_cache import LibraryStatusCache
+from .library_digest import (
+    check_library_calls,
+    file_digest,
+    store_digest_calls,
+)
+from .library_digest import LibraryConflictError  # noqa: F401
+from .rate_limiter import RateLimiter
+from .snapshot import WorkspaceSnapshot
+from .version_index import VersionIndex
 
+JOBS_PAGE_SIZE = 25
+# files larger than this are streamed to DBFS in blocks before being
+#  registered as a library, instead of being sent in a single request
+CHUNKED_UPLOAD_THRESHOLD = 50 * 1024 * 1024
+DBFS_UPLOAD_FOLDER = '/FileStore/jars/stork'
 
-def load_library(filename, match, folder, token, host):
+
+def load_library(filename, match, folder, client):
     """
     upload an egg to the Databricks filesystem.
 
@@ -27,32 +49,141 @@ def load_library(filename, match, folder, token, host):
     folder: string
         Databricks folder to upload to
         (e.g. '/Users/htorrence@shoprunner.com/')
-    token: string
-        Databricks API key
-    host: string
-        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
 
     Side Effects
     ------------
     uploads egg to Databricks
+
+    Notes
+    -----
+    files larger than CHUNKED_UPLOAD_THRESHOLD are first streamed to
+     DBFS_UPLOAD_FOLDER in DBFS, so that a failed block can be resent on its
+     own, and then registered from their DBFS path -
+     tests/test_large_library_upload.py checks the registration against a
+     real workspace
+    """
+    run_calls(client, load_library_calls(filename, match, folder))
+
+
+def load_library_calls(filename, match, folder):
+    """
+    load_library, as a generator of API calls (see api_calls)
     """
-    with open(filename, 'rb') as file_obj:
-        res = requests.post(
-            host + '/api/1.2/libraries/upload',
-            auth=('token', token),
-            data={
-                'libType': match.lib_type,
-                'name': '{0}-{1}'.format(match.library_name, match.version),
-                'folder': folder,
-            },
-            files={'uri': file_obj}
+    data = {
+        'libType': match.lib_type,
+        'name': '{0}-{1}'.format(match.library_name, match.version),
+        'folder': folder,
+    }
+    if getsize(filename) > CHUNKED_UPLOAD_THRESHOLD:
+        dbfs_path = '{}/{}-{}.{}'.format(
+            DBFS_UPLOAD_FOLDER,
+            match.library_name,
+            match.version,
+            match.suffix,
         )
+        yield from upload_to_dbfs_calls(filename, dbfs_path)
+        res = yield post_call(
+            '/api/1.2/libraries/upload',
+            data=dict(data, uri='dbfs:' + dbfs_path),
+        )
+    else:
+        with open(filename, 'rb') as file_obj:
+            res = yield post_call(
+                '/api/1.2/libraries/upload',
+                data=data,
+                files={'uri': file_obj}
+            )
+
+    if res.status_code != 200:
+        raise APIError(res)
+
 
+def iter_jobs(client, page_size=JOBS_PAGE_SIZE):
+    """
+    iterate over every job in the workspace, fetching one page of jobs/list
+     at a time
+
+    Parameters
+    ----------
+    client: APIClient
+        client for the Databricks account
+    page_size: int
+        number of jobs requested per page
+
+    Yields
+    ------
+    dictionary with the job id and settings of each job, as returned by the
+     jobs/list API
+    """
+    offset = 0
+    while offset is not None:
+        jobs, offset = run_calls(client, jobs_page_calls(offset, page_size))
+        yield from jobs
+
+
+def jobs_page_calls(offset, page_size=JOBS_PAGE_SIZE):
+    """
+    fetch the page of jobs/list starting at offset, as a generator of API
+     calls (see api_calls)
+
+    Returns
+    -------
+    tuple of the jobs in the page, and the offset of the next page or None
+     if this is the last one
+    """
+    res = yield get_call(
+        '/api/2.0/jobs/list?limit={}&offset={}'.format(page_size, offset)
+    )
     if res.status_code != 200:
         raise APIError(res)
+    page = res.json()
+    jobs = page.get('jobs', [])
+    if not page.get('has_more', False) or len(jobs) == 0:
+        return jobs, None
+    return jobs, offset + len(jobs)
+
 
+def _list_jobs(client, snapshot):
+    if snapshot is not None:
+        return snapshot.iter_jobs()
+    return iter_jobs(client)
 
-def get_job_list(logger, match, library_mapping, token, host):
+
+def iter_job_list(logger, match, library_mapping, client, snapshot=None):
+    """
+    iterate over the jobs using the major version of the given library,
+     filtering each page of jobs as soon as it arrives
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    match: FilenameMatch object
+        match object with suffix
+    library_mapping: dict
+        first element of get_library_mapping output
+    client: APIClient
+        client for the Databricks account
+    snapshot: WorkspaceSnapshot
+        if given, jobs are read from the snapshot instead of the API
+
+    Yields
+    ------
+    dictionary containing the job id, job name, library path, and job
+     settings (as listed) for each job
+    """
+    for job in _list_jobs(client, snapshot):
+        yield from JobLibraryIndex.replaceable_in_job(
+            logger,
+            job,
+            library_mapping,
+            match,
+        )
+
+
+def get_job_list(logger, match, library_mapping, client, snapshot=None):
     """
     get a list of jobs using the major version of the given library
 
@@ -64,61 +195,173 @@ def get_job_list(logger, match, library_mapping, token, host):
         match object with suffix
     library_mapping: dict
         first element of get_library_mapping output
-    token: string
-        Databricks API key
-    host: string
-        Databricks host (e.g. https://my-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
+    snapshot: WorkspaceSnapshot
+        if given, jobs are read from the snapshot instead of the API
 
     Returns
     -------
-    list of dictionaries containing the job id, job name, and library path
-     for each job
+    list of dictionaries containing the job id, job name, library path, and
+     job settings (as listed) for each job
     """
-    res = requests.get(
-        host + '/api/2.0/jobs/list',
-        auth=('token', token),
+    return list(iter_job_list(
+        logger,
+        match,
+        library_mapping,
+        client,
+        snapshot=snapshot,
+    ))
+
+
+def get_job_lists(logger, matches, library_mapping, client, snapshot=None):
+    """
+    get the jobs using the major version of each of several libraries,
+     listing the jobs in the workspace only once to build a JobLibraryIndex
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    matches: list of FilenameMatch objects
+        match objects with suffix
+    library_mapping: dict
+        first element of get_library_mapping output
+    client: APIClient
+        client for the Databricks account
+    snapshot: WorkspaceSnapshot
+        if given, jobs are read from the snapshot instead of the API
+
+    Returns
+    -------
+    list with an output of get_job_list for each element of matches
+    """
+    index = JobLibraryIndex.from_jobs(
+        logger,
+        _list_jobs(client, snapshot),
+        library_mapping,
     )
-    if res.status_code == 200:
-        job_list = []
-        if len(res.json()['jobs']) == 0:
-            return []
-        for job in res.json()['jobs']:
-            logger.debug('job: {}'.format(job['settings']['name']))
-            if 'libraries' in job['settings'].keys():
-                for library in job['settings']['libraries']:
-                    if match.suffix in library.keys():
-                        try:  # if in prod_folder, mapping turns uri into name
-                            job_library_uri = basename(library[match.suffix])
-                            job_match = library_mapping[job_library_uri]
-                        except KeyError:
-                            logger.debug(
-                                'not in library map: {}'
-                                .format(job_library_uri)
-                            )
-                            pass
-                        else:
-                            if match.replace_version(job_match, logger):
-                                job_list.append({
-                                    'job_id': job['job_id'],
-                                    'job_name': job['settings']['name'],
-                                    'library_path': library[match.suffix],
-                                })
-                            else:
-                                logger.debug(
-                                    'not replacable: {}'
-                                    .format(job_match.filename)
-                                )
-                    else:
-                        logger.debug(
-                            'no matching suffix: looking for {}, found {}'
-                            .format(match.suffix, str(library.keys()))
-                        )
-        return job_list
-    else:
+    return [index.replaceable_by(logger, match) for match in matches]
+
+
+def _map_concurrently(func, items, max_workers):
+    """
+    apply func to every item, using a pool of at most max_workers threads
+
+    Parameters
+    ----------
+    func: callable
+        function of a single argument
+    items: iterable
+        arguments to call func with
+    max_workers: int
+        maximum number of concurrent calls - with 1 (or None) the calls are
+         made one after another in the current thread
+
+    Returns
+    -------
+    list of results, in the same order as items
+    """
+    if max_workers is None or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
+
+
+def get_library_status(library_id, client):
+    """
+    get the name, type, and files of a library
+
+    Parameters
+    ----------
+    library_id: int
+        id of the library, as found in the workspace
+    client: APIClient
+        client for the Databricks account
+
+    Returns
+    -------
+    dictionary of library info, as returned by the libraries/status API
+    """
+    return run_calls(client, get_library_status_calls(library_id))
+
+
+def get_library_status_calls(library_id):
+    """
+    get_library_status, as a generator of API calls (see api_calls)
+    """
+    res = yield get_call(
+        '/api/1.2/libraries/status?libraryId={}'.format(library_id)
+    )
+    if res.status_code != 200:
         raise APIError(res)
+    return res.json()
 
 
-def get_library_mapping(logger, prod_folder, token, host):
+def _library_file_name(logger, library_info):
+    """
+    file name of a library from the output of get_library_status, or None
+     if the library is not a jar or egg
+    """
+    if library_info['libType'] == 'python-egg':
+        return library_info['name'] + '.egg'
+    elif library_info['libType'] == 'java-jar':
+        return library_info['name'] + '.jar'
+    logger.debug(
+        'excluded library type: {} is of libType {}, '
+        'not jar or egg'
+        .format(
+            library_info['name'],
+            library_info['libType'],
+        )
+    )
+    return None
+
+
+def _build_library_mapping(logger, library_statuses):
+    """
+    turn (library id, library status) pairs into the output of
+     get_library_mapping
+
+    Libraries which are not parsable jars or eggs are left out.
+    """
+    libraries = []
+    for library_id, library_info in library_statuses:
+        full_name = _library_file_name(logger, library_info)
+        if full_name is not None:
+            libraries.append((library_id, library_info, full_name))
+
+    library_map = {}
+    id_nums = {}
+    parsed = FileNameMatch.parse_many(
+        full_name for _, _, full_name in libraries
+    )
+    for (library_id, library_info, _), (full_name, name_match, reason) in zip(
+        libraries,
+        parsed,
+    ):
+        if name_match is None:
+            logger.debug('FileNameError: {} {}'.format(full_name, reason))
+            continue
+        # map uri to name match object
+        library_map[library_info['files'][0]] = name_match
+        # map name to name match object and id number - we'll need the id
+        #  number to clean up old libraries
+        id_nums[library_info['name']] = {
+            'name_match': name_match,
+            'id_num': library_id,
+        }
+    return library_map, id_nums
+
+
+def get_library_mapping(
+    logger,
+    prod_folder,
+    client,
+    max_workers=1,
+    cache=None,
+    snapshot=None,
+):
     """
     returns a pair of library mappings, the first mapping library uri to a
      library name for all libraries in the production folder, and the second
@@ -131,11 +374,15 @@ def get_library_mapping(logger, prod_folder, token, host):
         configured in cli_commands.py
     prod_folder: string
         name of folder in Databricks UI containing production libraries
-    token: string
-        Databricks API key
-    host: string
-        Databricks account url
-        (e.g. https://fake-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account
+    max_workers: int
+        maximum number of library status requests in flight at once
+    cache: LibraryStatusCache or WorkspaceSnapshot
+        if given, only libraries missing from the cache are fetched, and the
+         cache is updated to match the production folder
+    snapshot: WorkspaceSnapshot
+        if given, libraries are read from the snapshot instead of the API
 
     Returns
     -------
@@ -143,62 +390,325 @@ def get_library_mapping(logger, prod_folder, token, host):
     dictionary mapping library UI path to base name, major version,
         minor version, and id number
     """
-    res = requests.get(
-        host + f'/api/2.0/workspace/list?path={prod_folder}',
-        auth=('token', token),
+    if snapshot is not None:
+        return snapshot_library_mapping(logger, snapshot)
+    library_ids = run_calls(client, list_library_ids_calls(prod_folder))
+    new_ids = uncached_library_ids(logger, library_ids, cache)
+    statuses = _map_concurrently(
+        lambda library_id: get_library_status(library_id, client),
+        new_ids,
+        max_workers,
+    )
+    return cached_library_mapping(
+        logger,
+        library_ids,
+        dict(zip(new_ids, statuses)),
+        cache,
+    )
+
+
+def snapshot_library_mapping(logger, snapshot):
+    """
+    output of get_library_mapping, from the libraries in a WorkspaceSnapshot
+    """
+    return _build_library_mapping(logger, [
+        (library_id, snapshot.get(library_id))
+        for library_id in snapshot.library_ids()
+    ])
+
+
+def list_library_ids_calls(prod_folder):
+    """
+    ids of the libraries in prod_folder, as a generator of API calls (see
+     api_calls)
+    """
+    res = yield get_call(
+        '/api/2.0/workspace/list?path={}'.format(prod_folder)
+    )
+    if res.status_code != 200:
+        raise APIError(res)
+    return [
+        file['object_id'] for file in res.json()['objects']
+        if file['object_type'] == 'LIBRARY'
+    ]
+
+
+def uncached_library_ids(logger, library_ids, cache):
+    """
+    the library_ids whose status get_library_mapping has to fetch, evicting
+     the libraries no longer in the production folder from cache
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    library_ids: list of ints
+        output of list_library_ids_calls
+    cache: LibraryStatusCache or WorkspaceSnapshot
+        cache of library statuses, or None to fetch every status
+    """
+    if cache is None:
+        return library_ids
+    evicted = cache.evict_missing(library_ids)
+    new_ids = [i for i in library_ids if cache.get(i) is None]
+    logger.debug(
+        'library status cache: {} cached, {} new, {} evicted'
+        .format(
+            len(library_ids) - len(new_ids),
+            len(new_ids),
+            len(evicted),
+        )
     )
-    if res.status_code == 200:
-        file_list = res.json()['objects']
-        library_map = {}
-        id_nums = {}
-        for file in file_list:
-            if file['object_type'] == 'LIBRARY':
-                library_id = file['object_id']
-                status_res = (
-                    requests
-                    .get(
-                        host + '/api/1.2/libraries/status?libraryId={}'
-                        .format(library_id),
-                        auth=('token', token),
-                    )
+    return new_ids
+
+
+def cached_library_mapping(logger, library_ids, statuses, cache):
+    """
+    output of get_library_mapping, saving the statuses just fetched to cache
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    library_ids: list of ints
+        output of list_library_ids_calls
+    statuses: dict
+        status of each library in the output of uncached_library_ids
+    cache: LibraryStatusCache or WorkspaceSnapshot
+        cache holding the status of every other library, or None
+    """
+    if cache is not None:
+        for library_id, library_info in statuses.items():
+            cache.set(library_id, library_info)
+        cache.save()
+    return _build_library_mapping(logger, [
+        (
+            library_id,
+            statuses[library_id] if library_id in statuses
+            else cache.get(library_id),
+        )
+        for library_id in library_ids
+    ])
+
+
+class JobUpdateError(Exception):
+    """
+    exception to handle when some jobs could not be updated to a new library
+    """
+    def __init__(self, failed):
+        Exception.__init__(
+            self,
+            'failed to update jobs: {}'.format(
+                ', '.join(
+                    '{} ({})'.format(job['job_name'], job['error'])
+                    for job in failed
+                )
+            )
+        )
+        self.failed = failed
+
+
+class JobChangedError(Exception):
+    """
+    exception to handle when a job's settings changed after it was listed
+    """
+    def __init__(self, job_name):
+        Exception.__init__(
+            self,
+            'settings of job \'{}\' changed since it was listed'
+            .format(job_name)
+        )
+        self.job_name = job_name
+
+
+class LibraryDeleteError(Exception):
+    """
+    exception to handle when some old library versions could not be deleted
+    """
+    def __init__(self, failed):
+        Exception.__init__(
+            self,
+            'failed to remove old versions: {}'.format(
+                ', '.join(
+                    '{} ({})'.format(lib['filename'], lib['error'])
+                    for lib in failed
                 )
-                if status_res.status_code == 200:
-                    library_info = status_res.json()
-                    if library_info['libType'] == 'python-egg':
-                        full_name = library_info['name'] + '.egg'
-                    elif library_info['libType'] == 'java-jar':
-                        full_name = library_info['name'] + '.jar'
-                    else:
-                        logger.debug(
-                            'excluded library type: {} is of libType {}, '
-                            'not jar or egg'
-                            .format(
-                                library_info['name'],
-                                library_info['libType'],
-                            )
-                        )
-                        continue
-                    try:
-                        name_match = FileNameMatch(full_name)
-                        # map uri to name match object
-                        library_map[library_info['files'][0]] = name_match
-                        # map name to name match object and id number
-                        # we'll need the id number to clean up old libraries
-                        id_nums[library_info['name']] = {
-                            'name_match': name_match,
-                            'id_num': library_id,
-                        }
-                    except FileNameError:
-                        logger.debug(
-                            'FileNameError: {} file name is not parsable'
-                            .format(full_name)
-                        )
-                        pass
-                else:
-                    raise APIError(status_res)
-        return library_map, id_nums
+            )
+        )
+        self.failed = failed
+
+
+def _replace_libraries(libraries, replacements):
+    """
+    apply replacements (as taken by _reset_job_libraries) to the libraries
+     of a job
+
+    Returns
+    -------
+    new list of libraries, or None if none of the libraries were replaced
+    """
+    new_libraries = []
+    replaced = False
+    for lib in libraries:
+        for old_path, (suffix, new_path) in replacements.items():
+            if lib.get(suffix) == old_path:
+                # replace entry for old library path with new one
+                lib = {suffix: new_path}
+                replaced = True
+                break
+        new_libraries.append(lib)
+    return new_libraries if replaced else None
+
+
+def _reset_job_libraries_calls(job, replacements, verify):
+    """
+    point a single job at new library paths, with a single jobs/reset call,
+     as a generator of API calls (see api_calls)
+
+    Parameters
+    ----------
+    job: dict
+        job with job_id and job_name, and the settings from jobs/list if
+         available
+    replacements: dict
+        maps each library path to replace to a tuple of the library suffix
+         and the new library path (including uri)
+    verify: bool
+        if true, fetch the job again and check its settings have not changed
+         since it was listed
+
+    Returns
+    -------
+    True if the job was updated, False if it no longer uses any of the
+     library paths and so was left untouched
+    """
+    if 'settings' in job and not verify:
+        settings = job['settings']
     else:
-        raise APIError(res)
+        get_res = yield get_call(
+            '/api/2.0/jobs/get?job_id={}'.format(job['job_id'])
+        )
+        if get_res.status_code != 200:
+            raise APIError(get_res)
+        settings = get_res.json()['settings']
+        if 'settings' in job and settings != job['settings']:
+            raise JobChangedError(job['job_name'])
+
+    new_libraries = _replace_libraries(
+        settings.get('libraries', []),
+        replacements,
+    )
+    if new_libraries is None:
+        return False
+    post_res = yield post_call(
+        '/api/2.0/jobs/reset',
+        data=json.dumps({
+            'job_id': job['job_id'],
+            'new_settings': dict(settings, libraries=new_libraries),
+        })
+    )
+    if post_res.status_code != 200:
+        raise APIError(post_res)
+    return True
+
+
+def update_job_calls(logger, job_update, verify=False):
+    """
+    update one job for replace_job_libraries, as a generator of API calls
+     (see api_calls)
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    job_update: tuple
+        element of the job_updates taken by replace_job_libraries
+    verify: bool
+        if true, fail the job if its settings changed since it was listed
+
+    Returns
+    -------
+    tuple of 'updated', 'skipped' or 'failed', and the job - with an 'error'
+     message if it failed
+    """
+    job, replacements = job_update
+    try:
+        if (yield from _reset_job_libraries_calls(job, replacements, verify)):
+            logger.debug('updated job: {}'.format(job['job_name']))
+            return 'updated', job
+        logger.debug(
+            'skipped job: {} no longer uses {}'
+            .format(job['job_name'], ', '.join(replacements))
+        )
+        return 'skipped', job
+    except (APIError, JobChangedError, RequestException) as err:
+        logger.debug(
+            'failed to update job: {} ({})'.format(job['job_name'], err)
+        )
+        return 'failed', dict(job, error=str(err))
+
+
+def group_outcomes(outcomes, statuses):
+    """
+    turn (status, item) pairs into a dictionary mapping each of statuses to
+     the list of its items
+    """
+    results = {status: [] for status in statuses}
+    for status, item in outcomes:
+        results[status].append(item)
+    return results
+
+
+def replace_job_libraries(
+    logger,
+    job_updates,
+    client,
+    max_workers=1,
+    verify=False,
+):
+    """
+    replace libraries on many jobs, each with a single jobs/reset call
+
+    A failure on one job does not stop the others from being updated -
+     every job is attempted and its outcome reported.
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    job_updates: list of tuples
+        pairs of a job (with job_id, job_name, and optionally settings as
+         listed) and a dictionary mapping each of its library paths to
+         replace to the library suffix and new library path
+    client: APIClient
+        client for the Databricks account, with admin permissions
+    max_workers: int
+        maximum number of jobs updated at once
+    verify: bool
+        if true, fetch each job before updating it and fail it if its
+         settings changed since it was listed
+
+    Returns
+    -------
+    dictionary with keys 'updated', 'skipped' (jobs which no longer use any
+     of the library paths) and 'failed', each a list of jobs - failed jobs
+     also have an 'error' message
+
+    Side Effects
+    ------------
+    jobs now require updated versions of libraries
+    """
+    return group_outcomes(
+        _map_concurrently(
+            lambda job_update: run_calls(
+                client,
+                update_job_calls(logger, job_update, verify),
+            ),
+            job_updates,
+            max_workers,
+        ),
+        ('updated', 'skipped', 'failed'),
+    )
 
 
 def update_job_libraries(
@@ -206,72 +716,67 @@ def update_job_libraries(
     job_list,
     match,
     new_library_path,
-    token,
-    host,
+    client,
+    max_workers=1,
+    verify=False,
 ):
     """
     update libraries on jobs using same major version
 
+    Jobs are rewritten from the settings already fetched by get_job_list, so
+     each job costs a single jobs/reset call. A failure on one job does not
+     stop the others from being updated - every job is attempted and its
+     outcome reported.
+
     Parameters
     ----------
     logger: logging object
         configured in cli_commands.py
     job_list: list of strings
-        output of get_job_list
+        output of get_job_list - jobs without 'settings' are fetched with
+         jobs/get before being updated
     match: FilenameMatch object
         match object with suffix
     new_library_path: string
         path to library in dbfs (including uri)
-    token: string
-        Databricks API key with admin permissions
-    host: string
-        Databricks account url
-        (e.g. https://fake-organization.cloud.databricks.com)
+    client: APIClient
+        client for the Databricks account, with admin permissions
+    max_workers: int
+        maximum number of jobs updated at once
+    verify: bool
+        if true, fetch each job before updating it and fail it if its
+         settings changed since get_job_list ran
+
+    Returns
+    -------
+    dictionary with keys 'updated', 'skipped' (jobs which no longer use the
+     library path) and 'failed', each a list of elements of job_list - failed
+     jobs also have an 'error' message
 
     Side Effects
     ------------
     jobs now require updated version of library
     """
-
-    for job in job_list:
-        get_res = requests.get(
-            host + '/api/2.0/jobs/get?job_id={}'.format(job['job_id']),
-            auth=('token', token),
-        )
-        if get_res.status_code == 200:
-            job_specs = get_res.json()  # copy current job specs
-            settings = job_specs['settings']
-            job_specs.pop('settings')
-            new_libraries = []
-            for lib in settings['libraries']:
-                if (
-                    match.suffix in lib.keys()
-                    and lib[match.suffix] == job['library_path']
-                ):
-                    # replace entry for old library path with new one
-                    new_libraries.append({match.suffix: new_library_path})
-                else:
-                    new_libraries.append(lib)
-            settings['libraries'] = new_libraries
-            job_specs['new_settings'] = settings
-            post_res = requests.post(
-                host + '/api/2.0/jobs/reset',
-                auth=('token', token),
-                data=json.dumps(job_specs)
-            )
-            if post_res.status_code != 200:
-                raise APIError(post_res)
-        else:
-            raise APIError(get_res)
+    return replace_job_libraries(
+        logger,
+        [
+            (job, {job['library_path']: (match.suffix, new_library_path)})
+            for job in job_list
+        ],
+        client,
+        max_workers=max_workers,
+        verify=verify,
+    )
 
 
 def delete_old_versions(
     logger,
     new_library_match,
     id_nums,
-    token,
+    client,
     prod_folder,
-    host
+    max_workers=1,
+    versions=None,
 ):
     """
     delete any other versions of the same library where:
@@ -279,6 +784,9 @@ def delete_old_versions(
         it has a smaller minor version
         it lives in prod_folder
 
+    A failure to delete one version does not stop the others from being
+     deleted - every old version is attempted and its outcome reported.
+
     Parameters
     ----------
     logger: logging object
@@ -287,46 +795,594 @@ def delete_old_versions(
         match object with library_name_, major_version, minor_version
     id_nums: dict
         second output of get_library_mapping
-    token: string
-        Databricks API key with admin permissions
+    client: APIClient
+        client for the Databricks account, with admin permissions
     prod_folder: string
         name of folder in Databricks UI containing production libraries
-    host: string
-        Databricks account url
-        (e.g. https://fake-organization.cloud.databricks.com)
+    max_workers: int
+        maximum number of libraries deleted at once
+    versions: VersionIndex
+        index of id_nums, to reuse when deleting the old versions of several
+         libraries - built from id_nums if not given
+
+    Returns
+    -------
+    dictionary with keys 'deleted', a list of the file names of deleted
+     libraries, and 'failed', a list of dictionaries with the 'filename',
+     'id_num' and 'error' message of each library which could not be deleted
 
     Side Effects
     ------------
     delete any other versions of the same library with the same major version
         and smaller minor versions
     """
+    if versions is None:
+        versions = VersionIndex.from_id_nums(id_nums)
+    old_versions = versions.older_than(new_library_match)
+    return group_outcomes(
+        _map_concurrently(
+            lambda lib: run_calls(client, delete_library_calls(logger, lib)),
+            old_versions,
+            max_workers,
+        ),
+        ('deleted', 'failed'),
+    )
+
+
+def delete_library_calls(logger, lib):
+    """
+    delete one old version for delete_old_versions, as a generator of API
+     calls (see api_calls)
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    lib: dict
+        value of id_nums, with the name_match and id_num of the library
+
+    Returns
+    -------
+    tuple of 'deleted' and the file name of the library, or 'failed' and a
+     dictionary with its 'filename', 'id_num' and 'error' message
+    """
+    filename = lib['name_match'].filename
+    try:
+        res = yield post_call(
+            '/api/1.2/libraries/delete',
+            data={'libraryId': lib['id_num']},
+        )
+        if res.status_code != 200:
+            err = APIError(res)
+            # a retry after a delete which went through finds it gone
+            if err.code != 'RESOURCE_DOES_NOT_EXIST':
+                raise err
+            logger.debug('old version already removed: {}'.format(filename))
+    except (APIError, RequestException) as err:
+        logger.debug(
+            'failed to remove old version: {} ({})'.format(filename, err)
+        )
+        return 'failed', {
+            'filename': filename,
+            'id_num': lib['id_num'],
+            'error': str(err),
+        }
+    logger.debug('removed old version: {}'.format(filename))
+    return 'deleted', filename
+
+
+def _log_already_exists(logger, match):
+    logger.info(
+        'This version ({}) already exists: '.format(match.version) +
+        'if a change has been made please update your version number. '
+        'Note this error can also occur if you are uploading a jar '
+        'and an egg already exists with the same name and version, '
+        'or vice versa. In this case you will need to choose a '
+        'different library name or a different folder for either the '
+        'egg or the jar.'
+    )
 
-    old_versions = []
-    for name, lib in id_nums.items():
-        if new_library_match.replace_version(lib['name_match'], logger):
-            old_versions.append(lib['name_match'].filename)
-            res = requests.post(
-                host + '/api/1.2/libraries/delete',
-                auth=('token', token),
-                data={'libraryId': lib['id_num']},
+
+def _check_duplicate_libraries(matches):
+    seen = set()
+    for match in matches:
+        key = (match.library_name, int(match.major_version))
+        if key in seen:
+            raise ValueError(
+                'more than one version {} of {} given: only one version of '
+                'each major version of a library can be uploaded at once'
+                .format(match.major_version, match.library_name)
             )
-            if res.status_code != 200:
-                raise APIError(res)
-    return old_versions
+        seen.add(key)
+
+
+def _check_library(path, match, folder, client):
+    """
+    compare a local library with any existing library of the same name and
+     version in folder
+
+    Returns
+    -------
+    tuple of the digest of the local file and the output of
+     check_library_calls
+
+    Raises
+    ------
+    LibraryConflictError
+        if the library is in folder with different contents
+    """
+    digest = file_digest(path)
+    status = run_calls(client, check_library_calls(folder, match, digest))
+    return digest, status
+
+
+def _upload_library(logger, path, match, folder, digest, client):
+    """
+    upload a library and record its digest
+
+    Returns
+    -------
+    'loaded', or 'exists' if Databricks reports the library already exists
+    """
+    return run_calls(
+        client,
+        upload_library_calls(logger, path, match, folder, digest),
+    )
+
+
+def upload_library_calls(logger, path, match, folder, digest):
+    """
+    _upload_library, as a generator of API calls (see api_calls)
+
+    The library is released even if its digest can not be recorded, as it is
+     already in Databricks by then.
+    """
+    try:
+        yield from load_library_calls(path, match, folder)
+    except APIError as err:
+        if err.code == 'http 500' and 'already exists' in err.message:
+            return 'exists'
+        else:
+            raise err
+    try:
+        yield from store_digest_calls(folder, match, digest)
+    except (APIError, RequestException) as err:
+        logger.warning(
+            'could not record the digest of {}-{}: {} - releasing it again '
+            'will not update jobs, as its contents can\'t be compared'
+            .format(match.library_name, match.version, err)
+        )
+    return 'loaded'
 
 
-def update_databricks(logger, path, token, folder, update_jobs, cleanup):
+def _load_host_config(profile=PROFILE):
     """
-    upload library, update jobs using the same major version,
+    read the config, with the host and production folder it must contain
+
+    Parameters
+    ----------
+    profile: string
+        section of .storkcfg to read
+
+    Returns
+    -------
+    tuple of the ConfigParser, host, and production folder
+    """
+    config = _load_config(CFG_FILE)
+    if profile != PROFILE and not config.has_section(profile):
+        raise ValueError('no profile {} found: please run `stork configure '
+                         '--profile {}` to set it up'.format(profile, profile))
+    try:
+        host = config.get(profile, 'host')
+    except NoOptionError:
+        raise ValueError('no host provided: please run `stork configure`'
+                         ' to get set up')
+    try:
+        prod_folder = config.get(profile, 'prod_folder')
+    except NoOptionError:
+        raise ValueError('no prod_folder provided: please run '
+                         '`stork configure` to get set up')
+    return config, host, prod_folder
+
+
+def _released_libraries(logger, matches, statuses):
+    """
+    report the outcome of uploading each library
+
+    Returns
+    -------
+    list of the match objects of the libraries jobs can be moved to
+    """
+    released = []
+    for match, status in zip(matches, statuses):
+        if status == 'exists':
+            _log_already_exists(logger, match)
+            continue
+        elif status == 'identical':
+            logger.info(
+                'library {}-{} already exists with identical contents: '
+                'skipping upload'
+                .format(match.library_name, match.version)
+            )
+        else:
+            logger.info(
+                'new library {}-{} loaded to Databricks'
+                .format(match.library_name, match.version)
+            )
+        released.append(match)
+    return released
+
+
+def _plan_job_updates(logger, released, library_map, job_lists):
+    """
+    group the library replacements of every job, so each job is updated once
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    released: list of FilenameMatch objects
+        libraries uploaded to the production folder
+    library_map: dict
+        first element of get_library_mapping output
+    job_lists: list
+        output of get_job_lists for released
+
+    Returns
+    -------
+    dictionary mapping job id to a job and its replacements, as taken by
+     replace_job_libraries
+    """
+    library_uris = {
+        (tmp_match.library_name, tmp_match.version): uri
+        for uri, tmp_match in library_map.items()
+    }
+    return _group_job_updates(
+        logger,
+        released,
+        [
+            'dbfs:/FileStore/jars/' + library_uris[
+                (match.library_name, match.version)
+            ]
+            for match in released
+        ],
+        job_lists,
+    )
+
+
+def _group_job_updates(logger, released, new_paths, job_lists):
+    """
+    _plan_job_updates, given the path each released library will be used
+     from by jobs
+    """
+    job_updates = {}
+    for match, library_path, job_list in zip(released, new_paths, job_lists):
+        logger.info(
+            'current major version of {} used by jobs: {}'
+            .format(
+                match.library_name,
+                ', '.join([i['job_name'] for i in job_list]),
+            )
+        )
+        for job in job_list:
+            job_update = job_updates.setdefault(job['job_id'], (
+                {
+                    'job_id': job['job_id'],
+                    'job_name': job['job_name'],
+                    'settings': job['settings'],
+                },
+                {},
+            ))
+            job_update[1][job['library_path']] = (match.suffix, library_path)
+    return job_updates
+
+
+def _log_job_results(logger, results):
+    """
+    report the output of replace_job_libraries
+
+    Returns
+    -------
+    list of failed jobs
+    """
+    logger.info(
+        'updated jobs: {}'
+        .format(', '.join([i['job_name'] for i in results['updated']]))
+    )
+    if results['skipped']:
+        logger.info(
+            'skipped jobs no longer using the library: {}'
+            .format(', '.join([i['job_name'] for i in results['skipped']]))
+        )
+    for job in results['failed']:
+        logger.error(
+            'failed to update job {}: {}'
+            .format(job['job_name'], job['error'])
+        )
+    return results['failed']
+
+
+def _log_delete_results(logger, results):
+    """
+    report the combined output of delete_old_versions
+
+    Returns
+    -------
+    list of libraries which could not be deleted
+    """
+    logger.info(
+        'removed old versions: {}'.format(', '.join(results['deleted']))
+    )
+    for lib in results['failed']:
+        logger.error(
+            'failed to remove old version {}: {}'
+            .format(lib['filename'], lib['error'])
+        )
+    return results['failed']
+
+
+def _update_jobs_and_cleanup(
+    logger,
+    job_updates,
+    released,
+    id_nums,
+    client,
+    prod_folder,
+    cleanup,
+    max_workers=1,
+    verify=False,
+    snapshot=None,
+    library_map=None,
+):
+    """
+    update jobs to the released libraries, then delete the old versions of
+     the released libraries unless some job failed to update
+
+    Parameters
+    ----------
+    job_updates: dict
+        output of _plan_job_updates
+    released: list of FilenameMatch objects
+        libraries jobs are moved to
+    id_nums: dict
+        second output of get_library_mapping, with the old versions
+    snapshot: WorkspaceSnapshot
+        if given, updated jobs are also updated in the snapshot
+    library_map: dict
+        first output of get_library_mapping - if given, jobs are listed again
+         before deleting, and no old version is deleted while a job not
+         updated still uses one (see old_versions_in_use)
+
+    Raises
+    ------
+    JobUpdateError
+        if any job could not be updated
+    LibraryDeleteError
+        if any old version could not be removed
+    """
+    failed = []
+    if len(job_updates) != 0:
+        results = replace_job_libraries(
+            logger,
+            list(job_updates.values()),
+            client,
+            max_workers=max_workers,
+            verify=verify,
+        )
+        failed = record_job_results(logger, job_updates, results, snapshot)
+
+    delete_results = None
+    if should_delete_old_versions(logger, cleanup, failed) and not (
+        library_map is not None
+        and old_versions_in_use(
+            logger,
+            iter_jobs(client),
+            library_map,
+            id_nums,
+            released,
+        )
+    ):
+        versions = VersionIndex.from_id_nums(id_nums)
+        delete_results = merge_delete_results(
+            delete_old_versions(
+                logger,
+                match,
+                id_nums=id_nums,
+                client=client,
+                prod_folder=prod_folder,
+                max_workers=max_workers,
+                versions=versions,
+            )
+            for match in released
+        )
+    finish_release(logger, failed, delete_results)
+
+
+def record_job_results(logger, job_updates, results, snapshot=None):
+    """
+    report the output of replace_job_libraries, and apply the updates to
+     snapshot if given
+
+    Parameters
+    ----------
+    job_updates: dict
+        output of _plan_job_updates
+    results: dict
+        output of replace_job_libraries for job_updates
+    snapshot: WorkspaceSnapshot
+        if given, updated jobs are also updated in the snapshot
+
+    Returns
+    -------
+    list of jobs which could not be updated
+    """
+    if snapshot is not None:
+        for job in results['updated']:
+            replacements = job_updates[job['job_id']][1]
+            snapshot.set_job(job['job_id'], dict(
+                job['settings'],
+                libraries=_replace_libraries(
+                    job['settings'].get('libraries', []),
+                    replacements,
+                ),
+            ))
+    return _log_job_results(logger, results)
+
+
+def should_delete_old_versions(logger, cleanup, failed):
+    """
+    True if the old versions of the released libraries are to be deleted -
+     not if any job failed to update, as it still points at them
+    """
+    if cleanup and failed:
+        logger.warning(
+            'not removing old versions: some jobs failed to update'
+        )
+        return False
+    return cleanup
+
+
+def old_versions_in_use(logger, jobs, library_map, id_nums, released):
+    """
+    True if any of jobs uses an old version of a released library - one
+     created or changed after the jobs to update were listed (e.g. by
+     `stork sync`), which would be left pointing at a deleted library
+
+    Parameters
+    ----------
+    jobs: iterable of dicts
+        jobs as returned by the jobs/list API, listed after the updates
+    library_map: dict
+        first output of get_library_mapping
+    id_nums: dict
+        second output of get_library_mapping, with the old versions
+    released: list of FilenameMatch objects
+        libraries jobs were moved to
+    """
+    versions = VersionIndex.from_id_nums(id_nums)
+    old_versions = {
+        lib['name_match'].filename
+        for match in released
+        for lib in versions.older_than(match)
+    }
+    in_use = sorted({
+        job_library['job_name']
+        for job in jobs
+        for job_library in JobLibraryIndex.job_libraries(
+            logger,
+            job,
+            library_map,
+        )
+        if job_library['name_match'].filename in old_versions
+    })
+    if in_use:
+        logger.warning(
+            'not removing old versions: still used by jobs changed since '
+            'the jobs to update were listed: {}'.format(', '.join(in_use))
+        )
+    return len(in_use) != 0
+
+
+def merge_delete_results(results):
+    """
+    combine the outputs of delete_old_versions for several libraries
+    """
+    merged = {'deleted': [], 'failed': []}
+    for match_results in results:
+        for status in merged:
+            merged[status].extend(match_results[status])
+    return merged
+
+
+def finish_release(logger, failed, delete_results=None):
+    """
+    report the old versions deleted, and raise if anything failed
+
+    Parameters
+    ----------
+    failed: list
+        output of record_job_results
+    delete_results: dict
+        output of merge_delete_results, or None if nothing was deleted
+
+    Raises
+    ------
+    LibraryDeleteError
+        if any old version could not be removed
+    JobUpdateError
+        if any job could not be updated
+    """
+    if delete_results is not None:
+        failed_deletes = _log_delete_results(logger, delete_results)
+        if failed_deletes:
+            raise LibraryDeleteError(failed_deletes)
+    if failed:
+        raise JobUpdateError(failed)
+
+
+def open_snapshot(host):
+    """
+    the WorkspaceSnapshot of host saved by `stork sync`, to be closed by the
+     caller
+
+    Raises
+    ------
+    ValueError
+        if host was never synced
+    """
+    snapshot = WorkspaceSnapshot(host)
+    if snapshot.synced_at is None:
+        snapshot.close()
+        raise ValueError(
+            'no snapshot of {} found: please run `stork sync` first'
+            .format(host)
+        )
+    return snapshot
+
+
+def library_status_cache(host, use_cache, snapshot=None):
+    """
+    cache of production library statuses for get_library_mapping: snapshot
+     if given, else a LibraryStatusCache if use_cache, else None
+    """
+    if snapshot is not None:
+        # the folder is still listed, to pick up the new libraries
+        return snapshot
+    elif use_cache:
+        return LibraryStatusCache(host)
+    return None
+
+
+def update_databricks(
+    logger,
+    path,
+    token,
+    folder,
+    update_jobs,
+    cleanup,
+    max_workers=1,
+    verify_jobs=False,
+    use_cache=False,
+    use_snapshot=False,
+    timings=None,
+    profile=PROFILE,
+):
+    """
+    upload libraries, update jobs using the same major versions,
     and delete libraries with the same major and lower minor versions
     (depending on update_jobs and cleanup flags)
 
+    Several libraries can be released together: the production folder and
+     the jobs are then only scanned once, the libraries are uploaded
+     concurrently, and a job using more than one of them is updated with a
+     single call.
+
     Parameters
     ----------
     logger: logging object
         configured in cli_commands.py
-    path: string
-        path with name of egg as output from setuptools
+    path: string or list of strings
+        path(s) with name of egg as output from setuptools
         (e.g. dist/new_library-1.0.0-py3.6.egg)
     token: string
         Databricks API key
@@ -334,99 +1390,134 @@ def update_databricks(logger, path, token, folder, update_jobs, cleanup):
         Databricks folder to upload to
         (e.g. '/Users/my_email@fake_organization.com/')
     update_jobs: bool
-        if true, jobs using this library will be updated to point to the
-            new version
+        if true, jobs using these libraries will be updated to point to the
+            new versions
         if false, will not touch jobs or other library versions at all
     cleanup: bool
         if true, outdated libraries will be deleted
         if false, nothing will be deleted
+    max_workers: int
+        maximum number of concurrent API requests when uploading libraries,
+         scanning the production folder, updating jobs and deleting old
+         versions
+    verify_jobs: bool
+        if true, re-fetch each job before updating it and leave it untouched
+         if it changed since the jobs were listed
+    use_cache: bool
+        if true, keep library statuses from the production folder in a local
+         cache and only fetch those of new libraries
+    use_snapshot: bool
+        if true, find the jobs to update in the snapshot saved by `stork sync`
+         instead of listing them - each job is verified before it is updated,
+         and the snapshot is kept up to date with the changes; with cleanup,
+         jobs are listed again first, and old versions still used by a job
+         created or changed since the sync are kept
+    timings: CallTimings
+        if given, every API call is recorded in it
+    profile: string
+        section of .storkcfg with the host, production folder and rate limits
+         of the workspace to deploy to
 
     Side Effects
     ------------
-    new library in Databricks
+    new libraries in Databricks, unless ones with identical contents exist
     if update_jobs is true, then updated jobs
     if update_jobs and cleanup are true, removed outdated libraries
+
+    Raises
+    ------
+    LibraryConflictError
+        if the same version of a library was already uploaded by stork
+         with different contents - nothing is uploaded in that case
+    JobUpdateError
+        if any job could not be updated - all other jobs are still updated,
+         but no old versions are removed
+    LibraryDeleteError
+        if any old version could not be removed - all other old versions are
+         still removed
     """
 
-    config = _load_config(CFG_FILE)
-    try:
-        host = config.get(PROFILE, 'host')
-    except NoOptionError:
-        raise ValueError('no host provided: please run `stork configure`'
-                         ' to get set up')
-    try:
-        prod_folder = config.get(PROFILE, 'prod_folder')
-    except NoOptionError:
-        raise ValueError('no prod_folder provided: please run '
-                         '`stork configure` to get set up')
+    config, host, prod_folder = _load_host_config(profile)
 
-    match = FileNameMatch(basename(path))
+    paths = [path] if isinstance(path, str) else list(path)
+    matches = [FileNameMatch(basename(library_path)) for library_path in paths]
+    _check_duplicate_libraries(matches)
 
-    try:
-        load_library(path, match, folder, token, host)
-        logger.info(
-            'new library {}-{} loaded to Databricks'
-            .format(match.library_name, match.version)
-        )
-    except APIError as err:
-        if err.code == 'http 500' and 'already exists' in err.message:
-            logger.info(
-                'This version ({}) already exists: '.format(match.version) +
-                'if a change has been made please update your version number. '
-                'Note this error can also occur if you are uploading a jar '
-                'and an egg already exists with the same name and version, '
-                'or vice versa. In this case you will need to choose a '
-                'different library name or a different folder for either the '
-                'egg or the jar.'
-            )
-            return
-        else:
-            raise err
-
-    if update_jobs and folder == prod_folder:
-        library_map, id_nums = get_library_mapping(
-            logger,
-            prod_folder,
-            token,
+    with ExitStack() as stack:
+        client = stack.enter_context(APIClient(
             host,
+            token,
+            pool_size=max(max_workers, DEFAULT_POOL_SIZE),
+            rate_limiter=RateLimiter.from_config(config, profile),
+            timings=timings,
+        ))
+        snapshot = None
+        if use_snapshot and update_jobs and folder == prod_folder:
+            snapshot = stack.enter_context(open_snapshot(host))
+
+        # check every library before uploading any, so a conflict leaves
+        #  Databricks untouched
+        checks = _map_concurrently(
+            lambda item: _check_library(item[0], item[1], folder, client),
+            list(zip(paths, matches)),
+            max_workers,
         )
-        library_uri = [
-            uri for uri, tmp_match in library_map.items()
-            if (
-                match.library_name == tmp_match.library_name
-                and match.version == tmp_match.version
+
+        def upload(item):
+            library_path, match, (digest, status) = item
+            if status != 'new':
+                return status
+            return _upload_library(
+                logger,
+                library_path,
+                match,
+                folder,
+                digest,
+                client,
             )
-        ][0]
-        library_path = 'dbfs:/FileStore/jars/' + library_uri
-        job_list = get_job_list(logger, match, library_map, token, host)
-        logger.info(
-            'current major version of library used by jobs: {}'
-            .format(', '.join([i['job_name'] for i in job_list]))
+
+        statuses = _map_concurrently(
+            upload,
+            list(zip(paths, matches, checks)),
+            max_workers,
         )
 
-        if len(job_list) != 0:
-            update_job_libraries(
+        released = _released_libraries(logger, matches, statuses)
+
+        if update_jobs and folder == prod_folder and released:
+            library_map, id_nums = get_library_mapping(
                 logger,
-                job_list,
-                match,
-                library_path,
-                token,
-                host,
+                prod_folder,
+                client,
+                max_workers=max_workers,
+                cache=library_status_cache(host, use_cache, snapshot),
             )
-            logger.info(
-                'updated jobs: {}'
-                .format(', '.join([i['job_name'] for i in job_list]))
+            job_lists = get_job_lists(
+                logger,
+                released,
+                library_map,
+                client,
+                snapshot=snapshot,
             )
 
-        if cleanup:
-            old_versions = delete_old_versions(
+            job_updates = _plan_job_updates(
                 logger,
-                match,
-                id_nums=id_nums,
-                token=token,
-                prod_folder=prod_folder,
-                host=host,
+                released,
+                library_map,
+                job_lists,
             )
-            logger.info(
-                'removed old versions: {}'.format(', '.join(old_versions))
+
+            _update_jobs_and_cleanup(
+                logger,
+                job_updates,
+                released,
+                id_nums,
+                client,
+                prod_folder,
+                cleanup,
+                max_workers=max_workers,
+                # jobs may have changed since the snapshot was taken
+                verify=verify_jobs or snapshot is not None,
+                snapshot=snapshot,
+                library_map=None if snapshot is None else library_map,
             )
@@ -0,0 +1,68 @@
+"""
+VersionIndex keeps the versions of each library sorted by major and minor
+ version, so that finding every older version a new one can replace is a
+ binary search instead of a comparison with every library.
+"""
+from bisect import bisect_left, bisect_right
+
+
+class VersionIndex(object):
+    """
+    Index of values (e.g. id_nums entries or job libraries) by the library
+     version they belong to
+
+    Versions are grouped by library name and major version, and kept sorted
+     by FileNameMatch.minor_key within each group.
+    """
+    def __init__(self):
+        self.versions = {}
+
+    @staticmethod
+    def key(match):
+        """
+        group of a FileNameMatch object
+        """
+        return (match.library_name, int(match.major_version))
+
+    @classmethod
+    def from_id_nums(cls, id_nums):
+        """
+        build an index of the second output of get_library_mapping
+
+        Parameters
+        ----------
+        id_nums: dict
+            mapping library name to a dictionary with the name match object
+             and id number
+        """
+        index = cls()
+        for lib in id_nums.values():
+            index.add(lib['name_match'], lib)
+        return index
+
+    def add(self, match, value):
+        """
+        index value under the version of match
+        """
+        group = self.versions.setdefault(self.key(match), ([], []))
+        sort_key = (match.minor_key, match.filename)
+        # keys and values are kept in step, as values need not be comparable -
+        #  equal versions stay in the order they were added
+        position = bisect_right(group[0], sort_key)
+        group[0].insert(position, sort_key)
+        group[1].insert(position, value)
+
+    def __len__(self):
+        return sum(len(keys) for keys, values in self.versions.values())
+
+    def older_than(self, match):
+        """
+        values of every version match can replace: same library name and
+         major version, smaller minor version
+
+        Returns
+        -------
+        list of values, oldest version first
+        """
+        keys, values = self.versions.get(self.key(match), ([], []))
+        return values[:bisect_left(keys, (match.minor_key,))]
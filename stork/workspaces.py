@@ -0,0 +1,207 @@
+"""
+This file handles releasing the same libraries to several Databricks
+ workspaces at once, each described by a named profile in .storkcfg.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from configparser import NoOptionError
+
+from .configure import _load_config, CFG_FILE
+from .update_databricks_library import update_databricks
+
+
+class WorkspaceDeployError(Exception):
+    """
+    exception to handle when the release to one or more workspaces failed
+    """
+    def __init__(self, failed):
+        Exception.__init__(
+            self,
+            'failed to deploy to: {}'.format(', '.join(
+                '{} ({})'.format(profile, error)
+                for profile, error in failed.items()
+            ))
+        )
+        self.failed = failed
+
+
+class _WorkspaceLogger(logging.LoggerAdapter):
+    # prefixes every message with the profile, as workspaces log at once
+    def process(self, msg, kwargs):
+        return '[{}] {}'.format(self.extra['profile'], msg), kwargs
+
+
+def load_profiles(profiles=None):
+    """
+    read the host, token and production folder of named profiles
+
+    Keys missing from a profile are read from the default one, but no two
+     profiles may share a host, so that a profile without its own host can
+     not release to another profile's workspace.
+
+    Parameters
+    ----------
+    profiles: list of strings
+        names of sections of .storkcfg - every named profile if None
+
+    Returns
+    -------
+    dictionary mapping each profile to a dictionary with its host, token and
+     prod_folder
+
+    Raises
+    ------
+    ValueError
+        if there are no profiles, a profile does not exist or lacks a key,
+         or two profiles have the same host
+    """
+    config = _load_config(CFG_FILE)
+    if profiles is None:
+        profiles = config.sections()
+        if not profiles:
+            raise ValueError('no profiles found: please run `stork configure '
+                             '--profile <name>` for each workspace')
+    workspaces = {}
+    hosts = {}
+    for profile in profiles:
+        if not config.has_section(profile):
+            raise ValueError('no profile {} found: please run `stork '
+                             'configure --profile {}` to set it up'
+                             .format(profile, profile))
+        try:
+            workspace = {
+                key: config.get(profile, key)
+                for key in ('host', 'token', 'prod_folder')
+            }
+        except NoOptionError as err:
+            raise ValueError('no {} provided for profile {}: please run '
+                             '`stork configure --profile {}`'
+                             .format(err.option, profile, profile))
+        if workspace['host'] in hosts:
+            raise ValueError('profiles {} and {} have the same host {}'
+                             .format(hosts[workspace['host']], profile,
+                                     workspace['host']))
+        hosts[workspace['host']] = profile
+        workspaces[profile] = workspace
+    return workspaces
+
+
+def update_workspaces(
+    logger,
+    path,
+    profiles=None,
+    cleanup=True,
+    max_workers=1,
+    verify_jobs=False,
+    use_cache=False,
+    use_snapshot=False,
+    timings=None,
+):
+    """
+    upload libraries and update jobs in several workspaces at the same time,
+     as update_databricks does for one
+
+    Each workspace is released in its own thread, so a release takes as long
+     as the slowest workspace. A failure in one workspace does not stop the
+     others.
+
+    Parameters
+    ----------
+    logger: logging object
+        configured in cli_commands.py
+    path: string or list of strings
+        path(s) with name of egg as output from setuptools
+        (e.g. dist/new_library-1.0.0-py3.6.egg)
+    profiles: list of strings
+        names of the profiles in .storkcfg to release to - every named
+         profile if None
+    cleanup: bool
+        if true, outdated libraries will be deleted in each workspace
+    max_workers: int
+        maximum number of concurrent API requests to each workspace
+    verify_jobs: bool
+        if true, re-fetch each job before updating it
+    use_cache: bool
+        if true, use the library status cache of each workspace
+    use_snapshot: bool
+        if true, find the jobs to update in each workspace's snapshot
+    timings: CallTimings
+        if given, every API call to every workspace is recorded in it, under
+         the profile of the workspace
+
+    Returns
+    -------
+    dictionary mapping each profile to a dictionary with its 'status'
+     ('deployed' or 'failed'), wall time in 'seconds' and any 'error'
+
+    Raises
+    ------
+    ValueError
+        if the profiles are not all configured - nothing is released then
+    WorkspaceDeployError
+        if the release to any workspace failed, once every workspace is done
+    """
+    workspaces = load_profiles(profiles)
+
+    def deploy(profile):
+        workspace = workspaces[profile]
+        start = time.perf_counter()
+        try:
+            update_databricks(
+                _WorkspaceLogger(logger, {'profile': profile}),
+                path,
+                workspace['token'],
+                workspace['prod_folder'],
+                update_jobs=True,
+                cleanup=cleanup,
+                max_workers=max_workers,
+                verify_jobs=verify_jobs,
+                use_cache=use_cache,
+                use_snapshot=use_snapshot,
+                timings=(
+                    None if timings is None
+                    else timings.for_workspace(profile)
+                ),
+                profile=profile,
+            )
+        except Exception as err:
+            return {
+                'status': 'failed',
+                'seconds': time.perf_counter() - start,
+                'error': '{}: {}'.format(type(err).__name__, err),
+            }
+        return {
+            'status': 'deployed',
+            'seconds': time.perf_counter() - start,
+            'error': None,
+        }
+
+    with ThreadPoolExecutor(max_workers=len(workspaces)) as executor:
+        results = dict(zip(
+            workspaces,
+            executor.map(deploy, list(workspaces)),
+        ))
+
+    for profile, result in results.items():
+        if result['status'] == 'deployed':
+            logger.info('{} ({}): deployed in {:.1f}s'.format(
+                profile,
+                workspaces[profile]['host'],
+                result['seconds'],
+            ))
+        else:
+            logger.error('{} ({}): failed after {:.1f}s: {}'.format(
+                profile,
+                workspaces[profile]['host'],
+                result['seconds'],
+                result['error'],
+            ))
+    failed = {
+        profile: result['error'] for profile, result in results.items()
+        if result['status'] == 'failed'
+    }
+    if failed:
+        raise WorkspaceDeployError(failed)
+    return results
@@ -29,6 +29,13 @@ def pytest_addoption(parser):
         default=None,
         help='test production folder',
     )
+    parser.addoption(
+        '--upload_folder',
+        action='store',
+        default=None,
+        help='Databricks folder to upload test libraries to, in tests '
+             'which write to the workspace',
+    )
 
 
 def _resolve_test_config(metafunc, config, key):
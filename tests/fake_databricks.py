@@ -0,0 +1,736 @@
+"""
+A local stand-in for the parts of the Databricks REST API stork uses, backed
+ by an in-memory workspace, so that stork can be load tested and benchmarked
+ against workspaces of any size without a network.
+
+Only the standard library is used, so the server runs wherever the tests do:
+
+    workspace = FakeWorkspace.synthetic(n_jobs=1000, n_libraries=200)
+    with FakeDatabricks(workspace, latency=0.02) as server:
+        client = APIClient(server.url, 'token')
+"""
+import base64
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PROD_FOLDER = '/databricks/folder'
+JOBS_MAX_PAGE_SIZE = 25
+
+
+class FakeAPIError(Exception):
+    """
+    error response of the fake API, in the same shape as Databricks' own
+    """
+    def __init__(self, status, error_code, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.payload = {'error_code': error_code, 'message': message}
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available from Python 3.7
+    daemon_threads = True
+
+
+def _not_found(message):
+    return FakeAPIError(404, 'RESOURCE_DOES_NOT_EXIST', message)
+
+
+def _library_uri(library_id, name, lib_type):
+    # e.g. 0000002a-test-library_1_0_1-5f1e3.egg, like the uris Databricks
+    #  gives uploaded libraries
+    return '{:08x}-{}-{:05x}.{}'.format(
+        library_id,
+        name.replace('.', '_'),
+        library_id * 7919 % 0xfffff,
+        'egg' if lib_type == 'python-egg' else 'jar',
+    )
+
+
+class FakeWorkspace(object):
+    """
+    In-memory state of a Databricks workspace: libraries and the folders
+     they are in, jobs, DBFS files and clusters
+
+    Every method is safe to call from several server threads at once.
+
+    Parameters
+    ----------
+    prod_folder: string
+        production folder libraries are added to by default
+    """
+    def __init__(self, prod_folder=DEFAULT_PROD_FOLDER):
+        self.prod_folder = prod_folder
+        self.libraries = {}
+        self.objects = {}
+        self.jobs = {}
+        self.dbfs = {}
+        self.clusters = {}
+        self._handles = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def synthetic(
+        cls,
+        n_jobs,
+        n_libraries,
+        prod_folder=DEFAULT_PROD_FOLDER,
+        versions_per_library=5,
+        libraries_per_job=2,
+        seed=0,
+    ):
+        """
+        generate a workspace of n_libraries eggs and jars in prod_folder and
+         n_jobs jobs using them
+
+        Libraries come in groups of versions_per_library minor versions of
+         the same library name and major version (e.g. library_3-1.0.0 to
+         library_3-1.0.4), and each job uses libraries_per_job of them, picked
+         at random.
+
+        Parameters
+        ----------
+        n_jobs: int
+            number of jobs
+        n_libraries: int
+            number of libraries in prod_folder
+        prod_folder: string
+            production folder of the workspace
+        versions_per_library: int
+            number of versions of each library
+        libraries_per_job: int
+            number of libraries used by each job
+        seed: int
+            seed of the random choices, so a workspace can be regenerated
+        """
+        workspace = cls(prod_folder)
+        rng = random.Random(seed)
+        libraries = []
+        for i in range(n_libraries):
+            library = workspace.add_library(
+                'library_{}-{}.0.{}'.format(
+                    i // versions_per_library,
+                    i // versions_per_library % 3 + 1,
+                    i % versions_per_library,
+                ),
+                'java-jar' if i // versions_per_library % 4 == 3
+                else 'python-egg',
+            )
+            libraries.append(library)
+        for i in range(n_jobs):
+            used = rng.sample(libraries, min(libraries_per_job, n_libraries))
+            workspace.add_job('job_{}'.format(i), [
+                workspace.job_library(library) for library in used
+            ])
+        return workspace
+
+    def add_library(self, name, lib_type='python-egg', folder=None):
+        """
+        add a library to folder (prod_folder by default)
+
+        Returns
+        -------
+        dictionary of library info, as returned by the libraries/status API
+        """
+        folder = (folder or self.prod_folder).rstrip('/')
+        path = '{}/{}'.format(folder, name)
+        with self._lock:
+            if path in self.objects:
+                raise FakeAPIError(
+                    500,
+                    'INTERNAL_ERROR',
+                    'Library {} already exists'.format(path),
+                )
+            library_id = next(self._ids)
+            library = {
+                'id': str(library_id),
+                'name': name,
+                'folder': folder,
+                'libType': lib_type,
+                'files': [_library_uri(library_id, name, lib_type)],
+                'attachAllClusters': False,
+                'statuses': [],
+            }
+            self.libraries[library_id] = library
+            self.objects[path] = {
+                'object_type': 'LIBRARY',
+                'path': path,
+                'object_id': library_id,
+            }
+        return library
+
+    @staticmethod
+    def job_library(library):
+        """
+        entry of a job's libraries pointing at a library
+        """
+        suffix = 'egg' if library['libType'] == 'python-egg' else 'jar'
+        return {suffix: 'dbfs:/FileStore/jars/' + library['files'][0]}
+
+    def add_job(self, name, libraries):
+        """
+        add a job running on a new cluster with the given libraries
+
+        Returns
+        -------
+        id of the job
+        """
+        with self._lock:
+            job_id = next(self._ids)
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'creator_user_name': 'stork@fake-org.com',
+                'created_time': 1500000000000 + job_id,
+                'settings': {
+                    'name': name,
+                    'new_cluster': {
+                        'spark_version': '4.0.x-scala2.11',
+                        'node_type_id': 'r3.xlarge',
+                        'aws_attributes': {'availability': 'ON_DEMAND'},
+                        'num_workers': 2,
+                    },
+                    'libraries': libraries,
+                    'email_notifications': {},
+                    'max_retries': 0,
+                    'timeout_seconds': 0,
+                },
+            }
+        return job_id
+
+    def get_library(self, library_id):
+        with self._lock:
+            try:
+                return self.libraries[int(library_id)]
+            except (KeyError, ValueError):
+                raise _not_found('library {} not found'.format(library_id))
+
+    def delete_library(self, library_id):
+        with self._lock:
+            library = self.get_library(library_id)
+            del self.libraries[int(library_id)]
+            del self.objects[
+                '{}/{}'.format(library['folder'], library['name'])
+            ]
+
+    def get_object(self, path):
+        with self._lock:
+            try:
+                return self.objects[path.rstrip('/')]
+            except KeyError:
+                raise _not_found('Path ({}) doesn\'t exist.'.format(path))
+
+    def list_folder(self, path):
+        folder = path.rstrip('/')
+        with self._lock:
+            return [
+                obj for obj_path, obj in self.objects.items()
+                if obj_path.rsplit('/', 1)[0] == folder
+            ]
+
+    def list_jobs(self, offset, limit):
+        """
+        one page of jobs, in order of job id, and the total number of jobs
+        """
+        with self._lock:
+            job_ids = sorted(self.jobs)
+            page = job_ids[offset:offset + limit]
+            return [self.jobs[job_id] for job_id in page], len(job_ids)
+
+    def get_job(self, job_id):
+        with self._lock:
+            try:
+                return self.jobs[int(job_id)]
+            except (KeyError, ValueError):
+                raise FakeAPIError(
+                    400,
+                    'INVALID_PARAMETER_VALUE',
+                    'Job {} does not exist.'.format(job_id),
+                )
+
+    def reset_job(self, job_id, new_settings):
+        with self._lock:
+            self.get_job(job_id)['settings'] = new_settings
+
+    def read_file(self, path):
+        with self._lock:
+            try:
+                return bytes(self.dbfs[path])
+            except KeyError:
+                raise _not_found('No file or directory exists on path {}.'
+                                 .format(path))
+
+    def write_file(self, path, contents, overwrite=False):
+        with self._lock:
+            if path in self.dbfs and not overwrite:
+                raise FakeAPIError(
+                    400,
+                    'RESOURCE_ALREADY_EXISTS',
+                    'A file or directory already exists at the input path {}.'
+                    .format(path),
+                )
+            self.dbfs[path] = bytearray(contents)
+
+    def open_handle(self, path, overwrite=False):
+        with self._lock:
+            self.write_file(path, b'', overwrite)
+            handle = next(self._ids)
+            self._handles[handle] = path
+        return handle
+
+    def add_block(self, handle, data):
+        with self._lock:
+            try:
+                self.dbfs[self._handles[handle]].extend(data)
+            except KeyError:
+                raise _not_found('handle {} not found'.format(handle))
+
+    def close_handle(self, handle):
+        with self._lock:
+            if self._handles.pop(handle, None) is None:
+                raise _not_found('handle {} not found'.format(handle))
+
+    def create_cluster(self, settings):
+        with self._lock:
+            cluster_id = '{:04d}-000000-fake{}'.format(
+                next(self._ids) % 10000,
+                len(self.clusters),
+            )
+            self.clusters[cluster_id] = dict(
+                settings,
+                cluster_id=cluster_id,
+                state='RUNNING',
+                libraries=[],
+            )
+        return cluster_id
+
+    def get_cluster(self, cluster_id):
+        with self._lock:
+            try:
+                return self.clusters[cluster_id]
+            except KeyError:
+                raise FakeAPIError(
+                    400,
+                    'INVALID_PARAMETER_VALUE',
+                    'Cluster {} does not exist'.format(cluster_id),
+                )
+
+    def install_libraries(self, cluster_id, libraries):
+        with self._lock:
+            self.get_cluster(cluster_id)['libraries'].extend(libraries)
+
+
+def _parse_multipart(content_type, body):
+    """
+    fields of a multipart/form-data body, with files read as bytes
+    """
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        'Content-Type: {}\r\n\r\n'.format(content_type).encode('ascii') + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        value = part.get_payload(decode=True)
+        if part.get_filename() is None:
+            value = value.decode('utf-8')
+        fields[part.get_param('name', header='content-disposition')] = value
+    return fields
+
+
+class _Request(object):
+    """
+    what a route is given of a request: its query string and body, parsed
+    """
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def param(self, name):
+        try:
+            return self.query[name][0]
+        except KeyError:
+            raise FakeAPIError(
+                400,
+                'INVALID_PARAMETER_VALUE',
+                'Missing required field: {}'.format(name),
+            )
+
+    def json(self):
+        return json.loads(self.body or b'{}')
+
+    def form(self):
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            return _parse_multipart(content_type, self.body)
+        return {
+            key: values[0] for key, values
+            in parse_qs(self.body.decode('utf-8')).items()
+        }
+
+
+class FakeDatabricks(object):
+    """
+    HTTP server answering the Databricks API calls stork makes from a
+     FakeWorkspace, on a free local port
+
+    Latency, rate limiting and errors can be injected to see how stork
+     behaves against a slow or struggling workspace. Every call is counted,
+     including rejected ones.
+
+    Parameters
+    ----------
+    workspace: FakeWorkspace
+        state the API reads and changes - an empty workspace if None
+    latency: float
+        seconds every call takes before it is answered
+    rate_limit: int
+        calls accepted per second - calls over the limit get a 429 with
+         error code REQUEST_LIMIT_EXCEEDED, as from Databricks
+    error_rate: float
+        fraction of calls, chosen at random, answered with a 503 with error
+         code TEMPORARILY_UNAVAILABLE
+    seed: int
+        seed of the random choice of failing calls
+    """
+    def __init__(
+        self,
+        workspace=None,
+        latency=0,
+        rate_limit=None,
+        error_rate=0,
+        seed=0,
+    ):
+        self.workspace = workspace or FakeWorkspace()
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.calls = []
+        self._failures = []
+        self._random = random.Random(seed)
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._routes = {
+            ('POST', '/api/1.2/libraries/upload'): self._upload_library,
+            ('GET', '/api/1.2/libraries/status'): self._library_status,
+            ('POST', '/api/1.2/libraries/delete'): self._delete_library,
+            ('GET', '/api/2.0/workspace/list'): self._list_workspace,
+            ('GET', '/api/2.0/workspace/get-status'): self._workspace_status,
+            ('GET', '/api/2.0/jobs/list'): self._list_jobs,
+            ('GET', '/api/2.0/jobs/get'): self._get_job,
+            ('POST', '/api/2.0/jobs/reset'): self._reset_job,
+            ('POST', '/api/2.0/dbfs/put'): self._dbfs_put,
+            ('GET', '/api/2.0/dbfs/read'): self._dbfs_read,
+            ('GET', '/api/2.0/dbfs/get-status'): self._dbfs_status,
+            ('POST', '/api/2.0/dbfs/create'): self._dbfs_create,
+            ('POST', '/api/2.0/dbfs/add-block'): self._dbfs_add_block,
+            ('POST', '/api/2.0/dbfs/close'): self._dbfs_close,
+            ('POST', '/api/2.0/clusters/create'): self._create_cluster,
+            ('GET', '/api/2.0/clusters/get'): self._get_cluster,
+            ('POST', '/api/2.0/libraries/install'): self._install_libraries,
+            ('GET', '/api/2.0/libraries/cluster-status'):
+                self._cluster_library_status,
+        }
+
+    @property
+    def url(self):
+        """
+        host to configure stork with (e.g. http://127.0.0.1:51234)
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def fail(
+        self,
+        method,
+        path,
+        status=503,
+        error_code='TEMPORARILY_UNAVAILABLE',
+        times=1,
+    ):
+        """
+        answer the next `times` calls to an endpoint with an error
+
+        Parameters
+        ----------
+        method: string
+            HTTP method (e.g. 'POST')
+        path: string
+            path of the endpoint, without a query string
+            (e.g. '/api/2.0/jobs/reset')
+        status: int
+            status code of the error
+        error_code: string
+            Databricks error code in the body of the error
+        times: int
+            number of calls to fail
+        """
+        with self._lock:
+            self._failures.extend(
+                [(method, path, status, error_code)] * times
+            )
+
+    def count(self, method=None, path=None):
+        """
+        number of calls received, optionally only those to one endpoint
+        """
+        with self._lock:
+            calls = list(self.calls)
+        return sum(
+            1 for call_method, call_path in calls
+            if method in (None, call_method) and path in (None, call_path)
+        )
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+
+    def _injected_error(self, method, path):
+        """
+        error to answer a call with instead of carrying it out, if any
+        """
+        with self._lock:
+            self.calls.append((method, path))
+            for i, (fail_method, fail_path, status, code) in enumerate(
+                self._failures
+            ):
+                if (fail_method, fail_path) == (method, path):
+                    del self._failures[i]
+                    return FakeAPIError(status, code, 'injected failure')
+            if self.rate_limit is not None:
+                second, count = self._window
+                now = int(time.monotonic())
+                count = count + 1 if now == second else 1
+                self._window = (now, count)
+                if count > self.rate_limit:
+                    return FakeAPIError(
+                        429,
+                        'REQUEST_LIMIT_EXCEEDED',
+                        'Too many requests. Please wait a moment and try '
+                        'again.',
+                    )
+            if self.error_rate and self._random.random() < self.error_rate:
+                return FakeAPIError(
+                    503,
+                    'TEMPORARILY_UNAVAILABLE',
+                    'The service is temporarily unavailable.',
+                )
+        return None
+
+    def handle(self, request):
+        """
+        answer a request
+
+        Returns
+        -------
+        tuple of the status code and the JSON payload of the response
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        # clusters/get is also called as clusters/get/
+        path = request.path.rstrip('/')
+        try:
+            err = self._injected_error(request.method, path)
+            if err is not None:
+                raise err
+            route = self._routes.get((request.method, path))
+            if route is None:
+                raise FakeAPIError(
+                    404,
+                    'ENDPOINT_NOT_FOUND',
+                    'No API found for \'{} {}\''.format(request.method, path),
+                )
+            return 200, route(request)
+        except FakeAPIError as err:
+            return err.status, err.payload
+
+    def _upload_library(self, request):
+        form = request.form()
+        uri = form.get('uri')
+        if isinstance(uri, str) and uri.startswith('dbfs:'):
+            # uploaded to DBFS first, which must have happened
+            self.workspace.read_file(uri[len('dbfs:'):])
+        try:
+            self.workspace.add_library(
+                form['name'],
+                form['libType'],
+                form['folder'],
+            )
+        except FakeAPIError as err:
+            if err.status != 500:
+                raise
+            # older API: an error without an error code
+            err.payload = {'error': err.payload['message']}
+            raise err
+        return {}
+
+    def _library_status(self, request):
+        return self.workspace.get_library(request.param('libraryId'))
+
+    def _delete_library(self, request):
+        self.workspace.delete_library(request.form()['libraryId'])
+        return {}
+
+    def _list_workspace(self, request):
+        return {'objects': self.workspace.list_folder(request.param('path'))}
+
+    def _workspace_status(self, request):
+        return self.workspace.get_object(request.param('path'))
+
+    def _list_jobs(self, request):
+        limit = int(request.query.get('limit', ['20'])[0])
+        offset = int(request.query.get('offset', ['0'])[0])
+        if not 0 < limit <= JOBS_MAX_PAGE_SIZE:
+            raise FakeAPIError(
+                400,
+                'INVALID_PARAMETER_VALUE',
+                'limit must be between 1 and {}'.format(JOBS_MAX_PAGE_SIZE),
+            )
+        jobs, total = self.workspace.list_jobs(offset, limit)
+        return {'jobs': jobs, 'has_more': offset + limit < total}
+
+    def _get_job(self, request):
+        return self.workspace.get_job(request.param('job_id'))
+
+    def _reset_job(self, request):
+        body = request.json()
+        self.workspace.reset_job(body['job_id'], body['new_settings'])
+        return {}
+
+    def _dbfs_put(self, request):
+        body = request.json()
+        self.workspace.write_file(
+            body['path'],
+            base64.b64decode(body.get('contents', '')),
+            body.get('overwrite', False),
+        )
+        return {}
+
+    def _dbfs_read(self, request):
+        contents = self.workspace.read_file(request.param('path'))
+        offset = int(request.query.get('offset', ['0'])[0])
+        length = int(request.query.get('length', [str(1024 * 1024)])[0])
+        data = contents[offset:offset + length]
+        return {
+            'bytes_read': len(data),
+            'data': base64.b64encode(data).decode('ascii'),
+        }
+
+    def _dbfs_status(self, request):
+        path = request.param('path')
+        return {
+            'path': path,
+            'is_dir': False,
+            'file_size': len(self.workspace.read_file(path)),
+        }
+
+    def _dbfs_create(self, request):
+        body = request.json()
+        return {'handle': self.workspace.open_handle(
+            body['path'],
+            body.get('overwrite', False),
+        )}
+
+    def _dbfs_add_block(self, request):
+        body = request.json()
+        self.workspace.add_block(
+            body['handle'],
+            base64.b64decode(body['data']),
+        )
+        return {}
+
+    def _dbfs_close(self, request):
+        self.workspace.close_handle(request.json()['handle'])
+        return {}
+
+    def _create_cluster(self, request):
+        return {'cluster_id': self.workspace.create_cluster(request.json())}
+
+    def _get_cluster(self, request):
+        cluster = self.workspace.get_cluster(request.param('cluster_id'))
+        return {k: v for k, v in cluster.items() if k != 'libraries'}
+
+    def _install_libraries(self, request):
+        body = request.json()
+        self.workspace.install_libraries(body['cluster_id'], body['libraries'])
+        return {}
+
+    def _cluster_library_status(self, request):
+        cluster_id = request.param('cluster_id')
+        cluster = self.workspace.get_cluster(cluster_id)
+        return {
+            'cluster_id': cluster_id,
+            'library_statuses': [
+                {'library': library, 'status': 'INSTALLED'}
+                for library in cluster['libraries']
+            ],
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep connections alive, as Databricks does
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, which Nagle's algorithm would
+    #  hold back for the client's delayed ACK (~40ms a call)
+    disable_nagle_algorithm = True
+    server_fake = None
+
+    def _answer(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        request = _Request(
+            self.command,
+            url.path,
+            parse_qs(url.query),
+            self.headers,
+            self.rfile.read(length),
+        )
+        status, payload = self.server_fake.handle(request)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, format, *args):
+        pass
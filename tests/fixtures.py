@@ -1,9 +1,35 @@
 # flake8: noqa E501
 
+from unittest import mock
+
 import pytest
 from configparser import ConfigParser
+from stork.api_client import APIClient
 from stork.update_databricks_library import FileNameMatch
 
+from .unittest_helpers import calls_returning
+
+
+@pytest.fixture
+def client(host):
+    with APIClient(host, '') as client:
+        yield client
+
+
+@pytest.fixture
+def new_library():
+    """
+    the library being uploaded isn't in Databricks yet
+    """
+    module = 'stork.update_databricks_library'
+    with mock.patch(module + '.file_digest', return_value='abc123'), \
+            mock.patch(
+                'stork.library_digest.library_exists_calls',
+                calls_returning(False),
+            ), \
+            mock.patch(module + '.store_digest_calls') as store_mock:
+        yield store_mock
+
 
 @pytest.fixture
 def delete_library_response_list():
@@ -52,6 +78,14 @@ def job_list():
             'job_id': 3,
             'job_name': 'job_3',
             'library_path': 'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg',
+            'settings': {
+                'name': 'job_3',
+                'new_cluster': {'cluster_attributes': 'attrs'},
+                'libraries': [
+                    {'egg': 'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg'},
+                    {'egg': 'dbfs:/FileStore/jars/01832402-test-library-plus-stuff_0_0_0_py3_6-e5f8c.egg'},
+                ],
+            },
         },
     ]
     return job_list
@@ -131,7 +165,6 @@ def job_update_response_list_new():
                     {'egg': 'dbfs:/FileStore/jars/01832402-test-library-plus-stuff_0_0_0_py3_6-e5f8c.egg'}
                 ]
             },
-            'creator_user_name': 'tests@shoprunner'
         },
     ]
     return job_update_response_list
@@ -148,7 +181,7 @@ def job_update_response_list_old():
                     'cluster_attributes': 'attrs'
                 },
                 'libraries': [
-                    {'egg': 'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg'},
+                    {'egg': 'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg'},
                     {'egg': 'dbfs:/FileStore/jars/01832402-test-library-plus-stuff_0_0_0_py3_6-e5f8c.egg'}
                 ]
             },
@@ -0,0 +1,42 @@
+from unittest import mock
+
+import requests
+import responses
+
+from stork.api_calls import get_call, post_call, run_calls, Sleep
+
+
+def calls_with_retry():
+    try:
+        res = yield post_call('/api/2.0/dbfs/close', data='{}')
+    except requests.ConnectionError:
+        yield Sleep(3)
+        res = yield get_call('/api/2.0/dbfs/get-status?path=/lib.egg')
+    return res.json()
+
+
+@mock.patch('stork.api_calls.time.sleep')
+@responses.activate
+def test_run_calls(sleep_mock, client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/dbfs/get-status',
+        status=200,
+        json={'file_size': 4},
+    )
+
+    assert run_calls(client, calls_with_retry()) == {'file_size': 4}
+    sleep_mock.assert_called_once_with(3)
+
+
+@responses.activate
+def test_run_calls_sends_responses(client, host):
+    responses.add(
+        responses.POST,
+        host + '/api/2.0/dbfs/close',
+        status=200,
+        json={},
+    )
+
+    assert run_calls(client, calls_with_retry()) == {}
+    assert responses.calls[0].request.body == '{}'
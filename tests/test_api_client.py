@@ -0,0 +1,83 @@
+import responses
+
+from stork import __version__
+from stork.api_client import APIClient
+from stork.call_timings import CallTimings
+from stork.retry_policy import RetryPolicy
+
+
+@responses.activate
+def test_api_client_default_headers(host):
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=200)
+
+    with APIClient(host, 'test_token') as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 200
+    headers = responses.calls[0].request.headers
+    assert headers['Authorization'] == 'Bearer test_token'
+    assert headers['Accept-Encoding'] == 'gzip, deflate'
+    assert headers['User-Agent'] == 'stork/{}'.format(__version__)
+
+
+@responses.activate
+def test_api_client_reuses_session(host):
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=200)
+    responses.add(responses.POST, host + '/api/2.0/jobs/reset', status=200)
+
+    with APIClient(host, 'test_token') as client:
+        session = client.session
+        client.get('/api/2.0/jobs/list')
+        client.post('/api/2.0/jobs/reset', data='{}')
+        assert client.session is session
+
+    assert len(responses.calls) == 2
+    assert responses.calls[1].request.body == '{}'
+
+
+def test_api_client_pool_size(host):
+    with APIClient(host, 'test_token', pool_size=32) as client:
+        adapter = client.session.get_adapter(host)
+        assert adapter._pool_maxsize == 32
+
+
+@responses.activate
+def test_api_client_timings(host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=503,
+        json={},
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        body='{"jobs": []}',
+    )
+    responses.add(responses.POST, host + '/api/2.0/jobs/reset', status=400)
+    timings = CallTimings()
+
+    with APIClient(
+        host,
+        'test_token',
+        retry_policy=RetryPolicy(backoff_factor=0),
+        timings=timings,
+    ) as client:
+        client.get('/api/2.0/jobs/list?limit=25&offset=0')
+        client.post('/api/2.0/jobs/reset', data='{"job_id": 3}')
+
+    assert [
+        (
+            call['endpoint'],
+            call['status_code'],
+            call['bytes_sent'],
+            call['bytes_received'],
+            call['retries'],
+        )
+        for call in timings.calls
+    ] == [
+        ('GET /api/2.0/jobs/list', 200, 0, 12, 1),
+        ('POST /api/2.0/jobs/reset', 400, 13, 0, 0),
+    ]
+    assert all(call['seconds'] >= 0 for call in timings.calls)
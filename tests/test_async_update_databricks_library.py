@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+from functools import partial
+from unittest import mock
+
+import pytest
+
+from stork.async_api_client import AsyncAPIClient
+from stork.call_timings import CallTimings
+from stork.file_name import FileNameMatch
+from stork.retry_policy import RetryPolicy
+from stork.snapshot import WorkspaceSnapshot
+from stork.sync_workspace import sync_workspace
+
+from .fake_databricks import FakeDatabricks, FakeWorkspace
+
+web = pytest.importorskip('aiohttp.web')
+
+from stork.async_update_databricks_library import (  # noqa: E402
+    delete_old_versions,
+    get_job_list,
+    get_library_mapping,
+    update_databricks_async,
+    update_job_libraries,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def run_with_server(routes, func):
+    """
+    run func(client) against a local server answering each (method, path)
+     in routes with routes[(method, path)](request, body)
+
+    Returns
+    -------
+    the result of func, and a list of (method, path_qs, body) for each call
+    """
+    calls = []
+
+    async def handler(request):
+        body = await request.text()
+        calls.append((request.method, request.path_qs, body))
+        status, payload = routes[(request.method, request.path)](
+            request, body
+        )
+        return web.json_response(payload, status=status)
+
+    async def main():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncAPIClient(
+                'http://127.0.0.1:{}'.format(port),
+                '',
+                retry_policy=RetryPolicy(backoff_factor=0),
+            ) as client:
+                return await func(client)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main()), calls
+
+
+def library_status_routes(workspace_list_response, libraries):
+    def status(request, body):
+        return 200, libraries[int(request.query['libraryId']) - 1]
+
+    return {
+        ('GET', '/api/2.0/workspace/list'):
+            lambda request, body: (200, workspace_list_response),
+        ('GET', '/api/1.2/libraries/status'): status,
+    }
+
+
+@pytest.fixture
+def libraries(
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+):
+    return [
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7,
+    ]
+
+
+def test_get_library_mapping(
+    workspace_list_response,
+    libraries,
+    id_nums,
+    library_mapping,
+    prod_folder,
+):
+    (library_map_actual, id_nums_actual), calls = run_with_server(
+        library_status_routes(workspace_list_response, libraries),
+        lambda client: get_library_mapping(logger, prod_folder, client),
+    )
+
+    assert len(calls) == 8
+    assert id_nums == id_nums_actual
+    assert library_mapping == library_map_actual
+
+
+def test_get_job_list(job_list, job_list_response, library_mapping):
+    job_list_actual, calls = run_with_server(
+        {
+            ('GET', '/api/2.0/jobs/list'):
+                lambda request, body: (200, job_list_response),
+        },
+        lambda client: get_job_list(
+            logger,
+            FileNameMatch('test-library-1.1.2.egg'),
+            library_mapping,
+            client,
+        ),
+    )
+
+    assert len(calls) == 1
+    assert job_list_actual == job_list
+
+
+def test_update_job_libraries(job_list, job_update_response_list_new):
+    def reset(request, body):
+        return 200, {}
+
+    results, calls = run_with_server(
+        {('POST', '/api/2.0/jobs/reset'): reset},
+        lambda client: update_job_libraries(
+            logger,
+            job_list,
+            FileNameMatch('test-library-1.0.3.egg'),
+            'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+            client,
+        ),
+    )
+
+    assert [job['job_name'] for job in results['updated']] == ['job_3']
+    assert results['failed'] == []
+    assert [json.loads(body) for _, _, body in calls] == (
+        job_update_response_list_new
+    )
+
+
+def test_update_job_libraries_failed(job_list):
+    results, calls = run_with_server(
+        {
+            ('POST', '/api/2.0/jobs/reset'):
+                lambda request, body: (400, {
+                    'error_code': 'INVALID_STATE',
+                    'message': 'job is being edited',
+                }),
+        },
+        lambda client: update_job_libraries(
+            logger,
+            job_list,
+            FileNameMatch('test-library-1.0.3.egg'),
+            'dbfs:/FileStore/jars/some_library_uri',
+            client,
+        ),
+    )
+
+    assert results['updated'] == []
+    assert [job['job_name'] for job in results['failed']] == ['job_3']
+
+
+def test_delete_old_versions(id_nums, prod_folder):
+    deleted, calls = run_with_server(
+        {
+            ('POST', '/api/1.2/libraries/delete'):
+                lambda request, body: (200, {}),
+        },
+        lambda client: delete_old_versions(
+            logger,
+            FileNameMatch('test-library-1.0.3-SNAPSHOT.egg'),
+            id_nums,
+            client=client,
+            prod_folder=prod_folder,
+        ),
+    )
+
+    assert {body for _, _, body in calls} == {'libraryId=5', 'libraryId=6'}
+    assert (
+        set(deleted['deleted']) ==
+        {'test-library-1.0.1.egg', 'test-library-1.0.2.egg'}
+    )
+    assert deleted['failed'] == []
+
+
+def test_retry_transient_errors():
+    responses = iter([(503, {}), (503, {}), (200, {'jobs': []})])
+    res, calls = run_with_server(
+        {
+            ('GET', '/api/2.0/jobs/list'):
+                lambda request, body: next(responses),
+        },
+        lambda client: client.get('/api/2.0/jobs/list'),
+    )
+
+    assert res.status_code == 200
+    assert res.json() == {'jobs': []}
+    assert len(calls) == 3
+
+
+def test_update_databricks_async(
+    tmp_path,
+    workspace_list_response,
+    libraries,
+    job_list_response,
+    prod_folder,
+    cfg,
+    caplog,
+):
+    path = tmp_path / 'test-library-1.0.3.egg'
+    path.write_bytes(b'egg')
+    routes = library_status_routes(workspace_list_response, libraries)
+    routes.update({
+        ('GET', '/api/2.0/workspace/get-status'):
+            lambda request, body: (404, {
+                'error_code': 'RESOURCE_DOES_NOT_EXIST',
+                'message': 'not found',
+            }),
+        ('POST', '/api/1.2/libraries/upload'):
+            lambda request, body: (200, {}),
+        ('POST', '/api/2.0/dbfs/put'): lambda request, body: (200, {}),
+        ('GET', '/api/2.0/jobs/list'):
+            lambda request, body: (200, job_list_response),
+        ('POST', '/api/2.0/jobs/reset'): lambda request, body: (200, {}),
+        ('POST', '/api/1.2/libraries/delete'):
+            lambda request, body: (200, {}),
+    })
+
+    async def patched_update(client):
+        # route the client opened by update_databricks_async to the server
+        with mock.patch(
+            'stork.async_update_databricks_library.AsyncAPIClient',
+            lambda host, token, **kwargs: AsyncAPIClient(
+                client.host, token, **kwargs
+            ),
+        ), mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+            await update_databricks_async(
+                logger,
+                str(path),
+                '',
+                prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+
+    _, calls = run_with_server(routes, patched_update)
+
+    paths = [path_qs.split('?')[0] for _, path_qs, _ in calls]
+    assert paths.count('/api/1.2/libraries/upload') == 1
+    assert paths.count('/api/2.0/jobs/reset') == 1
+    assert paths.count('/api/1.2/libraries/delete') == 2
+    assert caplog.record_tuples[-1][2] == (
+        'removed old versions: test-library-1.0.1.egg, '
+        'test-library-1.0.2.egg'
+    )
+
+
+def test_update_databricks_async_snapshot(tmp_path):
+    workspace = FakeWorkspace.synthetic(n_jobs=40, n_libraries=10)
+    cfg_path = tmp_path / '.storkcfg'
+    library_path = tmp_path / 'library_0-1.0.5-py3.6.egg'
+    library_path.write_bytes(b'egg')
+    snapshot_factory = partial(
+        WorkspaceSnapshot,
+        snapshot_dir=str(tmp_path / 'snapshots'),
+    )
+    timings = CallTimings()
+
+    with FakeDatabricks(workspace) as server, \
+            mock.patch('stork.update_databricks_library.CFG_FILE',
+                       str(cfg_path)), \
+            mock.patch('stork.sync_workspace.WorkspaceSnapshot',
+                       snapshot_factory), \
+            mock.patch('stork.update_databricks_library.WorkspaceSnapshot',
+                       snapshot_factory):
+        cfg_path.write_text(
+            '[DEFAULT]\nhost = {}\nprod_folder = {}\n'
+            .format(server.url, workspace.prod_folder)
+        )
+        sync_workspace(logger, token='')
+        asyncio.run(update_databricks_async(
+            logger,
+            str(library_path),
+            '',
+            workspace.prod_folder,
+            update_jobs=True,
+            cleanup=True,
+            use_snapshot=True,
+            timings=timings,
+        ))
+        jobs_listed = server.count('GET', '/api/2.0/jobs/list')
+        jobs_reset = server.count('POST', '/api/2.0/jobs/reset')
+
+    # jobs are found in the snapshot, which is kept up to date - they are
+    #  only listed again to check no other job uses an old version
+    assert jobs_listed == 2 * 2
+    assert jobs_reset > 0
+    new_library = 'dbfs:/FileStore/jars/' + [
+        lib for lib in workspace.libraries.values()
+        if lib['name'] == 'library_0-1.0.5'
+    ][0]['files'][0]
+    with snapshot_factory(server.url) as snapshot:
+        assert sum(
+            {'egg': new_library} in job['settings']['libraries']
+            for job in snapshot.iter_jobs()
+        ) == jobs_reset
+    assert sum(
+        call['endpoint'] == 'POST /api/2.0/jobs/reset'
+        for call in timings.calls
+    ) == jobs_reset
+    assert all(
+        call['bytes_sent'] > 0
+        for call in timings.calls
+        if call['endpoint'] == 'POST /api/2.0/dbfs/add-block'
+    )
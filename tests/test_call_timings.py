@@ -0,0 +1,84 @@
+import json
+
+from stork.call_timings import CallTimings
+
+
+def test_summary():
+    timings = CallTimings()
+    for i in range(1, 21):
+        timings.record('GET', '/api/1.2/libraries/status?libraryId={}'
+                       .format(i), i / 100.0, 200, 0, 100, 0)
+    timings.record('POST', '/api/2.0/jobs/reset', 1.5, 400, 50, 20, 2)
+    timings.record('POST', '/api/2.0/jobs/reset', 0.5, None, 0, 0, 5)
+
+    summary = timings.summary()
+
+    # slowest endpoint in total first
+    assert [row['endpoint'] for row in summary] == [
+        'GET /api/1.2/libraries/status',
+        'POST /api/2.0/jobs/reset',
+    ]
+    status, reset = summary
+    assert status['count'] == 20
+    assert status['p50'] == 0.1
+    assert status['p95'] == 0.19
+    assert status['max'] == 0.2
+    assert status['bytes_received'] == 2000
+    assert status['errors'] == 0
+    assert reset['count'] == 2
+    assert reset['p50'] == 0.5
+    assert reset['max'] == 1.5
+    assert reset['retries'] == 7
+    assert reset['errors'] == 2
+
+
+def test_format_table():
+    timings = CallTimings()
+    timings.record('GET', '/api/2.0/jobs/list', 0.25, 200, 0, 10, 0)
+
+    lines = timings.format_table().split('\n')
+
+    assert lines[0].split() == [
+        'endpoint', 'count', 'p50', 'ms', 'p95', 'ms', 'max', 'ms',
+        'retries', 'errors',
+    ]
+    assert lines[2].split() == [
+        'GET', '/api/2.0/jobs/list', '1', '250.0', '250.0', '250.0', '0', '0',
+    ]
+
+
+def test_for_workspace():
+    timings = CallTimings()
+    for workspace in ['dev', 'prod']:
+        timings.for_workspace(workspace).record(
+            'GET', '/api/2.0/jobs/list', 0.25, 200, 0, 10, 0,
+        )
+
+    # calls to each workspace are kept in the shared record, but apart
+    assert len(timings.calls) == 2
+    assert sorted(
+        (row['workspace'], row['endpoint'], row['count'])
+        for row in timings.summary()
+    ) == [
+        ('dev', 'GET /api/2.0/jobs/list', 1),
+        ('prod', 'GET /api/2.0/jobs/list', 1),
+    ]
+    assert sorted(
+        line.split()[:3] for line in timings.format_table().split('\n')[2:]
+    ) == [
+        ['[dev]', 'GET', '/api/2.0/jobs/list'],
+        ['[prod]', 'GET', '/api/2.0/jobs/list'],
+    ]
+
+
+def test_save(tmp_path):
+    timings = CallTimings()
+    timings.record('GET', '/api/2.0/jobs/list', 0.25, 200, 0, 10, 0)
+    path = str(tmp_path / 'timings.json')
+
+    timings.save(path)
+
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved['summary'] == timings.summary()
+    assert saved['calls'] == timings.calls
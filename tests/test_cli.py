@@ -1,12 +1,19 @@
+import json
 import logging
-from os.path import expanduser, join
+import subprocess
+import sys
+from os.path import dirname, expanduser, join
 from unittest import mock
 
+import pytest
 from click.testing import CliRunner
 from configparser import ConfigParser
 
+import stork
+from stork import __version__
+from stork.cli import cli
 from stork.configure import configure
-from stork.cli_commands import upload, upload_and_update
+from stork.cli_commands import sync, upload, upload_and_update
 
 
 logging.basicConfig(level=logging.INFO)
@@ -184,6 +191,7 @@ def test_upload(update_databricks_mock, config_mock, existing_config):
         '/test_folder',
         cleanup=False,
         update_jobs=False,
+        timings=None,
     )
     assert not result.exception
 
@@ -219,6 +227,7 @@ def test_upload_all_options(
         'new_folder',
         cleanup=False,
         update_jobs=False,
+        timings=None,
     )
     assert not result.exception
 
@@ -276,11 +285,16 @@ def test_upload_and_update_cleanup(
     config_mock.assert_called_once()
     update_databricks_mock.assert_called_with(
         logger,
-        '/path/to/egg',
+        ['/path/to/egg'],
         'test_token',
         '/test_folder',
         cleanup=True,
         update_jobs=True,
+        max_workers=1,
+        verify_jobs=False,
+        use_cache=False,
+        use_snapshot=False,
+        timings=None,
     )
     assert not result.exception
 
@@ -304,15 +318,115 @@ def test_upload_and_update_no_cleanup(
     config_mock.assert_called_once()
     update_databricks_mock.assert_called_with(
         logger,
-        '/path/to/egg',
+        ['/path/to/egg'],
         'test_token',
         '/test_folder',
         cleanup=False,
         update_jobs=True,
+        max_workers=1,
+        verify_jobs=False,
+        use_cache=False,
+        use_snapshot=False,
+        timings=None,
+    )
+    assert not result.exception
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_workers(
+    update_databricks_mock,
+    config_mock,
+    existing_config
+):
+
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        ['--path', '/path/to/egg', '--workers', '8']
+    )
+
+    config_mock.assert_called_once()
+    update_databricks_mock.assert_called_with(
+        logger,
+        ['/path/to/egg'],
+        'test_token',
+        '/test_folder',
+        cleanup=True,
+        update_jobs=True,
+        max_workers=8,
+        verify_jobs=False,
+        use_cache=False,
+        use_snapshot=False,
+        timings=None,
     )
     assert not result.exception
 
 
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_many_paths(
+    update_databricks_mock,
+    config_mock,
+    existing_config,
+    tmpdir,
+):
+    config_mock.return_value = existing_config
+    tmpdir.join('library_b-1.0.0-py3.6.egg').write('')
+    tmpdir.join('library_c-2.0.0-py3.6.egg').write('')
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        [
+            '--path', '/path/to/library_a-1.0.0-py3.6.egg',
+            '--path', str(tmpdir.join('*.egg')),
+        ]
+    )
+
+    update_databricks_mock.assert_called_with(
+        logger,
+        [
+            '/path/to/library_a-1.0.0-py3.6.egg',
+            str(tmpdir.join('library_b-1.0.0-py3.6.egg')),
+            str(tmpdir.join('library_c-2.0.0-py3.6.egg')),
+        ],
+        'test_token',
+        '/test_folder',
+        cleanup=True,
+        update_jobs=True,
+        max_workers=1,
+        verify_jobs=False,
+        use_cache=False,
+        use_snapshot=False,
+        timings=None,
+    )
+    assert not result.exception
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_glob_no_match(
+    update_databricks_mock,
+    config_mock,
+    existing_config,
+    tmpdir,
+):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        ['--path', str(tmpdir.join('*.egg'))]
+    )
+
+    assert result.exit_code == 2
+    assert 'no files match' in result.output
+    update_databricks_mock.assert_not_called()
+
+
 @mock.patch('stork.cli_commands._load_config')
 def test_upload_and_update_missing_token(config_mock):
 
@@ -349,3 +463,350 @@ def test_upload_and_update_missing_folder(config_mock, empty_config):
         'no folder found - either provide a command line argument or set up'
         ' a default by running `stork configure`'
     )
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.sync_workspace')
+def test_sync(sync_workspace_mock, config_mock, existing_config):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(sync, ['--workers', '4'])
+
+    sync_workspace_mock.assert_called_with(
+        logger,
+        'test_token',
+        max_workers=4,
+        profile='DEFAULT',
+    )
+    assert not result.exception
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.sync_workspace')
+def test_sync_profile(sync_workspace_mock, config_mock, existing_config):
+    existing_config['staging'] = {'token': 'staging_token'}
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(sync, ['--profile', 'staging'])
+
+    sync_workspace_mock.assert_called_with(
+        logger,
+        'staging_token',
+        max_workers=1,
+        profile='staging',
+    )
+    assert not result.exception
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.sync_workspace')
+def test_sync_missing_profile(
+    sync_workspace_mock,
+    config_mock,
+    existing_config,
+):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(sync, ['--profile', 'staging'])
+
+    assert str(result.exception) == (
+        'no profile staging found: please run `stork configure --profile '
+        'staging` to set it up'
+    )
+    sync_workspace_mock.assert_not_called()
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.save_plan')
+@mock.patch('stork.cli_commands.plan_update')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_plan(
+    update_databricks_mock,
+    plan_mock,
+    save_mock,
+    config_mock,
+    existing_config
+):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        ['--path', '/path/to/egg', '--plan', 'plan.json', '--workers', '4'],
+    )
+
+    assert not result.exception
+    plan_mock.assert_called_with(
+        logger,
+        ['/path/to/egg'],
+        'test_token',
+        cleanup=True,
+        max_workers=4,
+        timings=None,
+    )
+    save_mock.assert_called_with(plan_mock.return_value, 'plan.json')
+    update_databricks_mock.assert_not_called()
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.load_plan')
+@mock.patch('stork.cli_commands.apply_plan')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_apply(
+    update_databricks_mock,
+    apply_mock,
+    load_mock,
+    config_mock,
+    existing_config,
+    tmp_path,
+):
+    config_mock.return_value = existing_config
+    plan_path = str(tmp_path / 'plan.json')
+    with open(plan_path, 'w') as f:
+        f.write('{}')
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        ['--apply', plan_path, '--no-cleanup'],
+    )
+
+    assert not result.exception
+    load_mock.assert_called_with(plan_path)
+    apply_mock.assert_called_with(
+        logger,
+        load_mock.return_value,
+        'test_token',
+        cleanup=False,
+        max_workers=1,
+        timings=None,
+    )
+    update_databricks_mock.assert_not_called()
+
+
+@pytest.mark.parametrize('args', [
+    [],
+    ['--path', '/path/to/egg', '--apply', 'setup.py'],
+    ['--path', '/path/to/egg', '--plan', 'plan.json', '--snapshot'],
+    ['--path', '/path/to/egg', '--profile', 'dev', '--all-profiles'],
+    ['--path', '/path/to/egg', '--profile', 'dev', '--token', 'abc'],
+    ['--path', '/path/to/egg', '--all-profiles', '--plan', 'plan.json'],
+])
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_plan_usage(
+    update_databricks_mock,
+    config_mock,
+    args,
+    existing_config,
+):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(upload_and_update, args)
+
+    assert result.exit_code == 2
+    update_databricks_mock.assert_not_called()
+
+
+@mock.patch('stork.cli_commands._load_config')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_timings(
+    update_databricks_mock,
+    config_mock,
+    existing_config,
+    tmp_path,
+):
+    config_mock.return_value = existing_config
+    timings_path = str(tmp_path / 'timings.json')
+
+    def record_calls(*args, timings, **kwargs):
+        for offset, seconds, retries in [(0, 0.2, 0), (25, 0.4, 1)]:
+            timings.record(
+                'GET',
+                '/api/2.0/jobs/list?offset={}'.format(offset),
+                seconds,
+                200,
+                0,
+                10,
+                retries,
+            )
+
+    update_databricks_mock.side_effect = record_calls
+
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        [
+            '--path', '/path/to/egg',
+            '--timings',
+            '--timings-json', timings_path,
+        ],
+    )
+
+    assert not result.exception
+    assert 'GET /api/2.0/jobs/list' in result.output
+    with open(timings_path) as f:
+        saved = json.load(f)
+    assert saved['summary'][0]['count'] == 2
+    assert saved['summary'][0]['retries'] == 1
+    assert len(saved['calls']) == 2
+
+
+def test_configure_profile(tmp_path):
+    cfg_path = str(tmp_path / '.storkcfg')
+    with open(cfg_path, 'w') as f:
+        f.write(
+            '[DEFAULT]\nhost = https://default\ntoken = default-token\n'
+            'prod_folder = /prod\n'
+        )
+
+    runner = CliRunner()
+    with mock.patch('stork.configure.CFG_FILE', cfg_path):
+        result = runner.invoke(
+            configure,
+            ['--profile', 'dev'],
+            input='https://dev\ndev-token\ndev-token\n/dev_folder/\n',
+        )
+
+    assert not result.exception
+    config = ConfigParser()
+    config.read(cfg_path)
+    assert dict(config['dev']) == {
+        'host': 'https://dev',
+        'token': 'dev-token',
+        'prod_folder': '/dev_folder',
+    }
+    assert config.get('DEFAULT', 'host') == 'https://default'
+
+
+@mock.patch('stork.cli_commands.update_workspaces')
+@mock.patch('stork.cli_commands.update_databricks')
+def test_upload_and_update_profiles(
+    update_databricks_mock,
+    update_workspaces_mock,
+):
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        [
+            '--path', '/path/to/egg',
+            '--profile', 'dev',
+            '--profile', 'prod',
+            '--workers', '4',
+        ],
+    )
+
+    assert not result.exception
+    update_databricks_mock.assert_not_called()
+    update_workspaces_mock.assert_called_with(
+        logger,
+        ['/path/to/egg'],
+        profiles=['dev', 'prod'],
+        cleanup=True,
+        max_workers=4,
+        verify_jobs=False,
+        use_cache=False,
+        use_snapshot=False,
+        timings=None,
+    )
+
+
+@mock.patch('stork.cli_commands.update_workspaces')
+def test_upload_and_update_all_profiles(update_workspaces_mock):
+    runner = CliRunner()
+    result = runner.invoke(
+        upload_and_update,
+        ['--path', '/path/to/egg', '--all-profiles'],
+    )
+
+    assert not result.exception
+    assert update_workspaces_mock.call_args[1]['profiles'] is None
+
+
+def _imported_modules(code):
+    """
+    modules imported by running code in a new interpreter, from the output
+     of -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+        # so that this copy of stork is imported, installed or not
+        cwd=dirname(dirname(stork.__file__)),
+    )
+    return {
+        line.split('|')[-1].strip() for line in result.stderr.splitlines()
+        if line.startswith('import time:')
+    }
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7),
+    reason='-X importtime is only available from Python 3.7, and stork '
+           'imports update_databricks eagerly before it',
+)
+@pytest.mark.parametrize('args', [['--version'], ['configure', '--help']])
+def test_cli_lazy_imports(args):
+    modules = _imported_modules(
+        'import sys; from stork.cli import cli; sys.argv[1:] = {!r}; '
+        'cli(standalone_mode=False)'.format(args)
+    )
+
+    assert 'stork.cli' in modules
+    for heavy in [
+        'requests',
+        'click_log',
+        'stork.cli_commands',
+        'stork.update_databricks_library',
+        'stork.async_update_databricks_library',
+    ]:
+        assert heavy not in modules
+
+
+def test_cli_lists_lazy_commands():
+    runner = CliRunner()
+    result = runner.invoke(cli, ['--help'])
+
+    assert not result.exception
+    for command in [
+        'configure',
+        'create-cluster',
+        'sync',
+        'upload',
+        'upload-and-update',
+    ]:
+        assert command in result.output
+
+
+def test_cli_version():
+    runner = CliRunner()
+    result = runner.invoke(cli, ['--version'])
+
+    assert result.output == 'Version {}\n'.format(__version__)
+
+
+@mock.patch('stork.cli_commands.update_databricks')
+@mock.patch('stork.cli_commands._load_config')
+def test_cli_upload(config_mock, update_databricks_mock, existing_config):
+    config_mock.return_value = existing_config
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ['upload', '--path', '/path/to/egg'])
+
+    assert not result.exception
+    assert update_databricks_mock.call_count == 1
+
+
+def test_update_databricks_import():
+    from stork.update_databricks_library import update_databricks
+
+    assert stork.update_databricks is update_databricks
+    with pytest.raises(AttributeError):
+        stork.not_an_attribute
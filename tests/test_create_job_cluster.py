@@ -0,0 +1,220 @@
+import json
+import logging
+from unittest import mock
+
+import pytest
+import responses
+
+from stork.create_job_cluster import (
+    create_job_library,
+    wait_for_cluster,
+    wait_for_libraries,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def job_cluster_response():
+    return {
+        'job_id': 3,
+        'settings': {
+            'name': 'job_3',
+            'new_cluster': {
+                'spark_version': '7.3.x-scala2.12',
+                'node_type_id': 'i3.xlarge',
+                'aws_attributes': {'availability': 'SPOT'},
+                'num_workers': 2,
+            },
+            'libraries': [
+                {'egg': 'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg'},  # noqa: E501
+            ],
+        },
+    }
+
+
+def add_cluster_states(host, states):
+    for state in states:
+        responses.add(
+            responses.GET,
+            host + '/api/2.0/clusters/get',
+            status=200,
+            json={'cluster_id': '1234', 'state': state},
+        )
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_cluster(sleep_mock, client, host):
+    add_cluster_states(host, ['PENDING', 'PENDING', 'RUNNING'])
+
+    state = wait_for_cluster('1234', client, ('RUNNING',), float('inf'))
+
+    assert state == 'RUNNING'
+    assert len(responses.calls) == 3
+    assert [c[0][0] for c in sleep_mock.call_args_list] == [1, 2]
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_cluster_terminated(sleep_mock, client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/clusters/get',
+        status=200,
+        json={
+            'cluster_id': '1234',
+            'state': 'TERMINATED',
+            'state_message': 'out of capacity',
+        },
+    )
+
+    with pytest.raises(Exception) as err:
+        wait_for_cluster('1234', client, ('RUNNING',), float('inf'))
+    assert str(err.value) == 'Cluster 1234 is TERMINATED: out of capacity'
+
+
+@mock.patch('stork.create_job_cluster.time.monotonic')
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_cluster_timeout(sleep_mock, monotonic_mock, client, host):
+    add_cluster_states(host, ['PENDING'])
+    monotonic_mock.side_effect = [0, 5, 10]
+
+    with pytest.raises(TimeoutError):
+        wait_for_cluster('1234', client, ('RUNNING',), 10)
+    assert [c[0][0] for c in sleep_mock.call_args_list] == [1, 2]
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_libraries(sleep_mock, client, host):
+    for status in ['PENDING', 'INSTALLING', 'INSTALLED']:
+        responses.add(
+            responses.GET,
+            host + '/api/2.0/libraries/cluster-status',
+            status=200,
+            json={
+                'cluster_id': '1234',
+                'library_statuses': [
+                    {'library': {'egg': 'a.egg'}, 'status': 'INSTALLED'},
+                    {'library': {'egg': 'b.egg'}, 'status': status},
+                ],
+            },
+        )
+
+    wait_for_libraries('1234', client, float('inf'))
+
+    assert len(responses.calls) == 3
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_libraries_not_listed_yet(sleep_mock, client, host):
+    # libraries just attached may not be listed at first
+    for library_statuses in [
+        [],
+        [{'library': {'egg': 'a.egg'}, 'status': 'INSTALLED'}],
+        [
+            {'library': {'egg': 'a.egg'}, 'status': 'INSTALLED'},
+            {'library': {'egg': 'b.egg'}, 'status': 'INSTALLED'},
+        ],
+    ]:
+        responses.add(
+            responses.GET,
+            host + '/api/2.0/libraries/cluster-status',
+            status=200,
+            json={'cluster_id': '1234', 'library_statuses': library_statuses},
+        )
+
+    wait_for_libraries('1234', client, float('inf'), n_libraries=2)
+
+    assert len(responses.calls) == 3
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_wait_for_libraries_failed(sleep_mock, client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/libraries/cluster-status',
+        status=200,
+        json={
+            'cluster_id': '1234',
+            'library_statuses': [{
+                'library': {'egg': 'b.egg'},
+                'status': 'FAILED',
+                'messages': ['bad egg'],
+            }],
+        },
+    )
+
+    with pytest.raises(Exception) as err:
+        wait_for_libraries('1234', client, float('inf'))
+    assert str(err.value) == (
+        "Libraries failed to install: {'egg': 'b.egg'}: bad egg"
+    )
+
+
+@mock.patch('stork.create_job_cluster.time.sleep')
+@responses.activate
+def test_create_job_library_wait(
+    sleep_mock,
+    job_cluster_response,
+    caplog,
+    host,
+    cfg,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/get/',
+        status=200,
+        json=job_cluster_response,
+    )
+    responses.add(
+        responses.POST,
+        host + '/api/2.0/clusters/create',
+        status=200,
+        json={'cluster_id': '1234'},
+    )
+    responses.add(
+        responses.POST,
+        host + '/api/2.0/libraries/install',
+        status=200,
+        json={},
+    )
+    add_cluster_states(host, ['PENDING', 'PENDING', 'RUNNING'])
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/libraries/cluster-status',
+        status=200,
+        json={
+            'cluster_id': '1234',
+            'library_statuses': [
+                {'library': {'egg': 'a.egg'}, 'status': 'INSTALLED'},
+            ],
+        },
+    )
+
+    with mock.patch('stork.create_job_cluster.CFG_FILE', cfg):
+        create_job_library(logger, 3, 'debug', '', wait=True)
+
+    urls = [call.request.url.split('?')[0] for call in responses.calls]
+    assert urls == [
+        host + '/api/2.0/jobs/get/',
+        host + '/api/2.0/clusters/create',
+        host + '/api/2.0/clusters/get',
+        host + '/api/2.0/libraries/install',
+        host + '/api/2.0/clusters/get',
+        host + '/api/2.0/clusters/get',
+        host + '/api/2.0/libraries/cluster-status',
+    ]
+    assert json.loads(responses.calls[3].request.body) == {
+        'cluster_id': '1234',
+        'libraries': job_cluster_response['settings']['libraries'],
+    }
+    assert [r[2] for r in caplog.record_tuples] == [
+        'Cluster debug is starting',
+        'New cluster debug created on Databricks',
+        'Cluster debug is running with all libraries installed',
+    ]
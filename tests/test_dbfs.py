@@ -0,0 +1,179 @@
+import base64
+import json
+from unittest import mock
+
+import pytest
+import responses
+
+from stork.api_client import APIClient
+from stork.api_error import APIError
+from stork.dbfs import DBFSUploadError, upload_to_dbfs
+
+from .fake_databricks import FakeDatabricks
+
+
+@pytest.fixture
+def egg_file(tmp_path):
+    path = tmp_path / 'test-library-1.0.3.egg'
+    path.write_bytes(b'0123456789')
+    return str(path)
+
+
+def add_block_data(call):
+    return base64.b64decode(json.loads(call.request.body)['data'])
+
+
+def add_dbfs_responses(host, add_block_statuses, file_sizes=(10,)):
+    responses.add(
+        responses.POST,
+        host + '/api/2.0/dbfs/create',
+        status=200,
+        json={'handle': 7},
+    )
+    for status in add_block_statuses:
+        responses.add(
+            responses.POST,
+            host + '/api/2.0/dbfs/add-block',
+            status=status,
+            json={} if status == 200 else {'error': 'unavailable'},
+        )
+    responses.add(
+        responses.POST,
+        host + '/api/2.0/dbfs/close',
+        status=200,
+        json={},
+    )
+    for file_size in file_sizes:
+        responses.add(
+            responses.GET,
+            host + '/api/2.0/dbfs/get-status',
+            status=200,
+            json={'path': '/lib.egg', 'file_size': file_size},
+        )
+
+
+def add_blocks(calls):
+    return [
+        add_block_data(call) for call in calls
+        if call.request.url.endswith('add-block')
+    ]
+
+
+@responses.activate
+def test_upload_to_dbfs(egg_file, client, host):
+    add_dbfs_responses(host, [200, 200, 200])
+
+    upload_to_dbfs(egg_file, '/FileStore/jars/stork/lib.egg', client, 4)
+
+    urls = [call.request.url for call in responses.calls]
+    assert urls == [host + '/api/2.0/dbfs/' + endpoint for endpoint in [
+        'create', 'add-block', 'add-block', 'add-block', 'close',
+        'get-status?path=/FileStore/jars/stork/lib.egg',
+    ]]
+    assert json.loads(responses.calls[0].request.body) == {
+        'path': '/FileStore/jars/stork/lib.egg',
+        'overwrite': True,
+    }
+    assert [add_block_data(call) for call in responses.calls[1:4]] == [
+        b'0123', b'4567', b'89',
+    ]
+    assert json.loads(responses.calls[4].request.body) == {'handle': 7}
+
+
+@mock.patch('stork.api_calls.time.sleep')
+@responses.activate
+def test_upload_to_dbfs_resends_failed_block(
+    sleep_mock,
+    egg_file,
+    client,
+    host,
+):
+    add_dbfs_responses(host, [200, 503, 200, 200])
+
+    upload_to_dbfs(egg_file, '/lib.egg', client, 4)
+
+    assert add_blocks(responses.calls) == [b'0123', b'4567', b'4567', b'89']
+    sleep_mock.assert_called_once_with(2)
+
+
+@mock.patch('stork.api_calls.time.sleep')
+@responses.activate
+def test_upload_to_dbfs_restarts_on_wrong_size(
+    sleep_mock,
+    egg_file,
+    client,
+    host,
+):
+    # the failed call wrote the second block after all, so the resent block
+    #  made the file too long
+    add_dbfs_responses(host, [200, 503, 200, 200, 200, 200, 200], [14, 10])
+
+    upload_to_dbfs(egg_file, '/lib.egg', client, 4)
+
+    urls = [call.request.url.split('?')[0] for call in responses.calls]
+    assert urls.count(host + '/api/2.0/dbfs/create') == 2
+    assert add_blocks(responses.calls) == [
+        b'0123', b'4567', b'4567', b'89', b'0123', b'4567', b'89',
+    ]
+
+
+@mock.patch('stork.dbfs.MAX_UPLOAD_RETRIES', 1)
+@responses.activate
+def test_upload_to_dbfs_wrong_size(egg_file, client, host):
+    add_dbfs_responses(host, [200], [14])
+
+    with pytest.raises(DBFSUploadError) as err:
+        upload_to_dbfs(egg_file, '/lib.egg', client, 4)
+    assert str(err.value) == (
+        'upload to /lib.egg failed: 14 bytes written instead of 10'
+    )
+    urls = [call.request.url.split('?')[0] for call in responses.calls]
+    assert urls.count(host + '/api/2.0/dbfs/create') == 2
+
+
+@mock.patch('stork.api_calls.time.sleep')
+@responses.activate
+def test_upload_to_dbfs_fatal_error(sleep_mock, egg_file, client, host):
+    add_dbfs_responses(host, [200, 400])
+
+    with pytest.raises(APIError):
+        upload_to_dbfs(egg_file, '/lib.egg', client, 4)
+    # a block the API rejected is not sent again
+    assert add_blocks(responses.calls) == [b'0123', b'4567']
+    sleep_mock.assert_not_called()
+    assert not any(
+        call.request.url.endswith('close') for call in responses.calls
+    )
+
+
+@mock.patch('stork.dbfs.MAX_BLOCK_RETRIES', 1)
+@mock.patch('stork.api_calls.time.sleep')
+@responses.activate
+def test_upload_to_dbfs_gives_up(sleep_mock, egg_file, client, host):
+    add_dbfs_responses(host, [503, 503])
+
+    with pytest.raises(APIError):
+        upload_to_dbfs(egg_file, '/lib.egg', client, 4)
+    assert len(add_blocks(responses.calls)) == 2
+    assert not any(
+        call.request.url.endswith('close') for call in responses.calls
+    )
+
+
+@mock.patch('stork.api_calls.time.sleep')
+@mock.patch('stork.api_client.time.sleep')
+def test_upload_to_dbfs_unreliable_server(
+    api_sleep_mock,
+    sleep_mock,
+    tmp_path,
+):
+    path = tmp_path / 'test-library-1.0.3.jar'
+    path.write_bytes(bytes(range(256)) * 40)
+
+    with FakeDatabricks(error_rate=0.2, seed=3) as server, \
+            APIClient(server.url, '') as client:
+        upload_to_dbfs(str(path), '/lib.jar', client, 1000)
+        failures = server.count('POST', '/api/2.0/dbfs/add-block') - 11
+
+    assert failures > 0
+    assert server.workspace.read_file('/lib.jar') == path.read_bytes()
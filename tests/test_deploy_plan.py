@@ -0,0 +1,331 @@
+import json
+import logging
+from unittest import mock
+
+import pytest
+import responses
+
+from stork.deploy_plan import apply_plan, load_plan, plan_update, save_plan
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def libraries(
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+):
+    return [
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7,
+    ]
+
+
+@pytest.fixture
+def library_path(tmp_path):
+    path = tmp_path / 'test-library-1.0.4.egg'
+    path.write_bytes(b'egg')
+    return str(path)
+
+
+@pytest.fixture
+def plan(
+    library_path,
+    libraries,
+    workspace_list_response,
+    job_list_response,
+    host,
+    cfg,
+):
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            host + '/api/2.0/workspace/get-status',
+            status=404,
+            json={'error_code': 'RESOURCE_DOES_NOT_EXIST', 'message': ''},
+        )
+        rsps.add(
+            responses.GET,
+            host + '/api/2.0/workspace/list',
+            status=200,
+            json=workspace_list_response,
+        )
+        for i, lib in enumerate(libraries):
+            rsps.add(
+                responses.GET,
+                host + '/api/1.2/libraries/status?libraryId={}'.format(i + 1),
+                status=200,
+                json=lib,
+            )
+        rsps.add(
+            responses.GET,
+            host + '/api/2.0/jobs/list',
+            status=200,
+            json=job_list_response,
+        )
+        with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+            return plan_update(
+                logger,
+                [library_path],
+                token='',
+                max_workers=2,
+            )
+
+
+def test_plan_update(plan, library_path, host, prod_folder, caplog):
+    assert plan['host'] == host
+    assert plan['prod_folder'] == prod_folder
+    assert [
+        (lib['path'], lib['library'], lib['status'])
+        for lib in plan['libraries']
+    ] == [(library_path, 'test-library-1.0.4', 'new')]
+    assert [job['job_name'] for job in plan['jobs']] == ['job_3']
+    assert plan['jobs'][0]['replacements'] == {
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg':
+            ['egg', 'test-library-1.0.4'],
+    }
+    assert [(lib['filename'], lib['id_num']) for lib in plan['deletes']] == [
+        ('test-library-1.0.1.egg', 5),
+        ('test-library-1.0.2.egg', 6),
+        ('test-library-1.0.3.egg', 7),
+    ]
+    assert len(plan['library_statuses']) == 7
+    # the plan is made while setting up the fixture
+    assert caplog.get_records('setup')[-1].getMessage() == (
+        'plan: upload test-library-1.0.4; update jobs job_3; delete '
+        'test-library-1.0.1.egg, test-library-1.0.2.egg, '
+        'test-library-1.0.3.egg'
+    )
+
+
+def test_save_plan(plan, tmp_path):
+    plan_path = str(tmp_path / 'plan.json')
+    save_plan(plan, plan_path)
+
+    assert load_plan(plan_path) == json.loads(json.dumps(plan))
+
+
+def test_load_plan_wrong_version(tmp_path):
+    plan_path = str(tmp_path / 'plan.json')
+    with open(plan_path, 'w') as f:
+        json.dump({'version': 0}, f)
+
+    with pytest.raises(ValueError):
+        load_plan(plan_path)
+
+
+NEW_URI = '5a6b7c8d-test-library_1_0_4_py3_6-e5f8c.egg'
+
+
+def add_apply_responses(
+    host,
+    workspace_list_response,
+    job_list,
+    listed_jobs,
+):
+    """
+    answer the calls of apply_plan, with listed_jobs as the jobs listed
+     before old versions are deleted
+    """
+    workspace_list_response['objects'].append({
+        'object_type': 'LIBRARY',
+        'path': '/test-library-1.0.4',
+        'object_id': 8,
+    })
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/upload',
+        status=200,
+        json={},
+    )
+    responses.add(responses.POST, host + '/api/2.0/dbfs/put', json={})
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/1.2/libraries/status?libraryId=8',
+        status=200,
+        json={
+            'name': 'test-library-1.0.4',
+            'libType': 'python-egg',
+            'files': [NEW_URI],
+        },
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/get?job_id=3',
+        status=200,
+        json={'job_id': 3, 'settings': job_list[0]['settings']},
+    )
+    responses.add(responses.POST, host + '/api/2.0/jobs/reset', json={})
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        json={'jobs': listed_jobs},
+    )
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/delete',
+        status=200,
+        json={},
+    )
+
+
+def updated_jobs(job_list_response):
+    # the jobs listed once job_3 is moved to test-library-1.0.4
+    jobs = json.loads(json.dumps(job_list_response['jobs']))
+    jobs[2]['settings']['libraries'][0] = {
+        'egg': 'dbfs:/FileStore/jars/' + NEW_URI,
+    }
+    return jobs
+
+
+@responses.activate
+def test_apply_plan(
+    plan,
+    tmp_path,
+    workspace_list_response,
+    job_list,
+    job_list_response,
+    host,
+    cfg,
+):
+    # the plan is applied as read back from its file
+    plan_path = str(tmp_path / 'plan.json')
+    save_plan(plan, plan_path)
+    plan = load_plan(plan_path)
+    add_apply_responses(
+        host,
+        workspace_list_response,
+        job_list,
+        updated_jobs(job_list_response),
+    )
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        apply_plan(logger, plan, token='')
+
+    # only the new library's status is fetched: the rest are in the plan,
+    #  and jobs are only listed to check before deleting
+    paths = [call.request.path_url.split('?')[0] for call in responses.calls]
+    assert paths.count('/api/1.2/libraries/status') == 1
+    assert paths.index('/api/2.0/jobs/list') > paths.index(
+        '/api/2.0/jobs/reset'
+    )
+    reset = [
+        json.loads(call.request.body) for call in responses.calls
+        if call.request.path_url == '/api/2.0/jobs/reset'
+    ]
+    assert reset[0]['new_settings']['libraries'][0] == {
+        'egg': 'dbfs:/FileStore/jars/' + NEW_URI,
+    }
+    assert sorted(
+        call.request.body for call in responses.calls
+        if call.request.path_url == '/api/1.2/libraries/delete'
+    ) == ['libraryId=5', 'libraryId=6', 'libraryId=7']
+
+
+@responses.activate
+def test_apply_plan_job_added(
+    plan,
+    workspace_list_response,
+    job_list,
+    job_list_response,
+    host,
+    cfg,
+    caplog,
+):
+    # a job using an old version was created after the plan was made
+    listed_jobs = updated_jobs(job_list_response) + [{
+        'job_id': 5,
+        'settings': {
+            'name': 'job_5',
+            'libraries': [{
+                'egg': 'dbfs:/FileStore/jars/'
+                       '47fb08a7-test-library_1_0_2_py3_6-e5f8c.egg',
+            }],
+        },
+    }]
+    add_apply_responses(host, workspace_list_response, job_list, listed_jobs)
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        apply_plan(logger, plan, token='')
+
+    paths = [call.request.path_url.split('?')[0] for call in responses.calls]
+    assert '/api/2.0/jobs/reset' in paths
+    assert '/api/1.2/libraries/delete' not in paths
+    assert caplog.record_tuples[-1][2] == (
+        'not removing old versions: still used by jobs changed since the '
+        'jobs to update were listed: job_5'
+    )
+
+
+def test_apply_plan_library_changed(plan, library_path, cfg):
+    with open(library_path, 'wb') as f:
+        f.write(b'different egg')
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(ValueError) as err:
+            apply_plan(logger, plan, token='')
+
+    assert str(err.value) == (
+        '{} changed since the plan was made: please make a new plan'
+        .format(library_path)
+    )
+
+
+def test_apply_plan_other_workspace(plan, cfg):
+    plan = dict(plan, host='https://other-org.cloud.databricks.com')
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(ValueError):
+            apply_plan(logger, plan, token='')
+
+
+@responses.activate
+def test_apply_plan_library_not_listed(
+    plan,
+    workspace_list_response,
+    host,
+    prod_folder,
+    cfg,
+):
+    # the new library was uploaded, but has since left the production folder
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/upload',
+        status=200,
+        json={},
+    )
+    responses.add(responses.POST, host + '/api/2.0/dbfs/put', json={})
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(ValueError) as err:
+            apply_plan(logger, plan, token='')
+
+    assert str(err.value) == (
+        'test-library-1.0.4 is no longer in {}: please make a new plan'
+        .format(prod_folder)
+    )
+    paths = [call.request.path_url for call in responses.calls]
+    assert '/api/2.0/jobs/reset' not in paths
@@ -0,0 +1,155 @@
+import logging
+import time
+from unittest import mock
+
+import pytest
+
+from stork.api_client import APIClient
+from stork.api_error import APIError
+from stork.create_job_cluster import create_job_library
+from stork.retry_policy import RetryPolicy
+from stork.update_databricks_library import iter_jobs, update_databricks
+
+from .fake_databricks import FakeDatabricks, FakeWorkspace
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def workspace():
+    return FakeWorkspace.synthetic(n_jobs=60, n_libraries=20)
+
+
+@pytest.fixture
+def server(workspace):
+    with FakeDatabricks(workspace) as server:
+        yield server
+
+
+@pytest.fixture
+def server_cfg(server, workspace, tmp_path):
+    cfg_path = tmp_path / '.storkcfg'
+    cfg_path.write_text(
+        '[DEFAULT]\nhost = {}\nprod_folder = {}\n'
+        .format(server.url, workspace.prod_folder)
+    )
+    return str(cfg_path)
+
+
+def test_synthetic_workspace(workspace):
+    assert len(workspace.libraries) == 20
+    assert len(workspace.jobs) == 60
+    assert workspace.libraries[1]['name'] == 'library_0-1.0.0'
+    assert workspace.libraries[20]['name'] == 'library_3-1.0.4'
+    assert workspace.libraries[20]['libType'] == 'java-jar'
+    # the same seed gives the same workspace
+    assert FakeWorkspace.synthetic(n_jobs=60, n_libraries=20).jobs == (
+        workspace.jobs
+    )
+
+
+def test_iter_jobs(server, workspace):
+    with APIClient(server.url, '') as client:
+        jobs = list(iter_jobs(client))
+
+    assert [job['job_id'] for job in jobs] == sorted(workspace.jobs)
+    assert server.count('GET', '/api/2.0/jobs/list') == 3
+
+
+def test_update_databricks(server, workspace, server_cfg, tmp_path):
+    library_path = tmp_path / 'library_0-1.0.5-py3.6.egg'
+    library_path.write_bytes(b'egg')
+    old_paths = {
+        'dbfs:/FileStore/jars/' + workspace.libraries[library_id]['files'][0]
+        for library_id in range(1, 6)
+    }
+    using_library = [
+        job_id for job_id, job in workspace.jobs.items()
+        if any(
+            library.get('egg') in old_paths
+            for library in job['settings']['libraries']
+        )
+    ]
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', server_cfg):
+        update_databricks(
+            logger,
+            str(library_path),
+            token='',
+            folder=workspace.prod_folder,
+            update_jobs=True,
+            cleanup=True,
+            max_workers=4,
+        )
+
+    # the old versions are replaced by the new one
+    assert [
+        lib['name'] for lib in workspace.libraries.values()
+        if lib['name'].startswith('library_0-')
+    ] == ['library_0-1.0.5']
+    new_path = FakeWorkspace.job_library(
+        list(workspace.libraries.values())[-1]
+    )
+    assert using_library
+    for job_id in using_library:
+        assert new_path in workspace.jobs[job_id]['settings']['libraries']
+    assert server.count('POST', '/api/2.0/jobs/reset') == len(using_library)
+
+
+def test_create_job_library(server, workspace, server_cfg):
+    job_id = min(workspace.jobs)
+
+    with mock.patch('stork.create_job_cluster.CFG_FILE', server_cfg):
+        create_job_library(logger, job_id, 'debug', token='', wait=True)
+
+    cluster, = workspace.clusters.values()
+    assert cluster['cluster_name'] == 'debug'
+    assert cluster['libraries'] == (
+        workspace.jobs[job_id]['settings']['libraries']
+    )
+
+
+def test_fail(server):
+    server.fail('GET', '/api/2.0/jobs/list', times=2)
+
+    with APIClient(
+        server.url,
+        '',
+        retry_policy=RetryPolicy(backoff_factor=0),
+    ) as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 200
+    assert server.count('GET', '/api/2.0/jobs/list') == 3
+
+
+def test_rate_limit(server):
+    server.rate_limit = 0
+
+    with APIClient(
+        server.url,
+        '',
+        retry_policy=RetryPolicy(max_retries=0),
+    ) as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 429
+    assert APIError(res).code == 'REQUEST_LIMIT_EXCEEDED'
+
+
+def test_latency(server):
+    server.latency = 0.05
+
+    with APIClient(server.url, '') as client:
+        start = time.perf_counter()
+        client.get('/api/2.0/jobs/list')
+
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_unknown_endpoint(server):
+    with APIClient(server.url, '') as client:
+        res = client.get('/api/2.0/clusters/list')
+
+    assert res.status_code == 404
+    assert APIError(res).code == 'ENDPOINT_NOT_FOUND'
@@ -1,3 +1,5 @@
+import copy
+import pickle
 from unittest import mock
 
 import pytest
@@ -138,3 +140,65 @@ def test_filename_match_should_not_replace_snapshot():
     match_1 = FileNameMatch('test-library-1.1.3.egg')
     match_2 = FileNameMatch('test-library-0.0.3-SNAPSHOT.egg')
     assert not match_1.replace_version(match_2, mock.MagicMock())
+
+
+def test_filename_match_should_replace_two_digit_minor():
+    # 1.10.0 is newer than 1.9.0, though 10.0 < 9.0 as floats
+    match_1 = FileNameMatch('test-library-1.10.0.egg')
+    match_2 = FileNameMatch('test-library-1.9.0.egg')
+    assert match_1.minor_key == (10, 0)
+    assert match_1.replace_version(match_2, mock.MagicMock())
+    assert not match_2.replace_version(match_1, mock.MagicMock())
+
+
+def test_filename_match_should_replace_two_digit_patch():
+    match_1 = FileNameMatch('test-library-1.0.10.egg')
+    match_2 = FileNameMatch('test-library-1.0.9.egg')
+    assert match_1.replace_version(match_2, mock.MagicMock())
+    assert not match_2.replace_version(match_1, mock.MagicMock())
+
+
+def test_filename_match_hashable():
+    match_1 = FileNameMatch('test-library-1.0.3.egg')
+    match_2 = FileNameMatch('test-library-1.0.3-py3.5.egg')
+    match_3 = FileNameMatch('test-library-1.0.4.egg')
+    assert len({match_1, match_2, match_3}) == 2
+    assert {match_1: 'a'}[match_2] == 'a'
+
+
+def test_filename_match_immutable():
+    match = FileNameMatch('test-library-1.0.3.egg')
+    with pytest.raises(AttributeError):
+        match.version = '1.0.4'
+    with pytest.raises(AttributeError):
+        match.extra = 'attribute'
+    assert not hasattr(match, '__dict__')
+
+
+def test_filename_match_copy():
+    match = FileNameMatch('test-library-1.0.3-py3.6.egg')
+    copied = copy.deepcopy(match)
+    assert copied == match
+    assert copied.filename == match.filename
+    assert pickle.loads(pickle.dumps(match)) == match
+
+
+def test_parse_many():
+    results = FileNameMatch.parse_many([
+        'new_library-1.0.0-py3.6.egg',
+        'test-library-1.0.3.zip',
+        'new_library-1.0.0-SNAPSHOT.jar',
+        'test-library-1.0.3-askjdhfa.egg',
+    ])
+
+    assert [filename for filename, _, _ in results] == [
+        'new_library-1.0.0-py3.6.egg',
+        'test-library-1.0.3.zip',
+        'new_library-1.0.0-SNAPSHOT.jar',
+        'test-library-1.0.3-askjdhfa.egg',
+    ]
+    assert results[0][1] == FileNameMatch('new_library-1.0.0-py3.6.egg')
+    assert results[0][2] is None
+    assert results[1][1:] == (None, 'not an egg or jar')
+    assert results[2][1].lib_type == 'java-jar'
+    assert results[3][1:] == (None, 'file name is not parsable')
@@ -0,0 +1,112 @@
+import logging
+
+from stork.file_name import FileNameMatch
+from stork.job_index import JobLibraryIndex
+
+logger = logging.getLogger(__name__)
+
+
+def test_from_jobs(job_list_response, library_mapping):
+    index = JobLibraryIndex.from_jobs(
+        logger,
+        job_list_response['jobs'],
+        library_mapping,
+    )
+
+    assert set(index) == {
+        ('awesome_library_a', 0, 'egg'),
+        ('awesome_library_b', 4, 'egg'),
+        ('test-library', 0, 'egg'),
+        ('test-library', 1, 'egg'),
+        ('test-library-plus-stuff', 0, 'egg'),
+    }
+    # job_2 uses test-library 1.0.0, which isn't in the production folder
+    assert [
+        job['job_name'] for job in index.jobs_using('test-library', '1', 'egg')
+    ] == ['job_3']
+    assert [
+        job['job_name']
+        for job in index.jobs_using('test-library-plus-stuff', 0, 'egg')
+    ] == ['job_2', 'job_3', 'job_4']
+    assert index.jobs_using('test-library', 2, 'egg') == []
+    assert index.jobs_using('test-library', 1, 'jar') == []
+
+
+def test_replaceable_by(job_list_response, library_mapping, job_list):
+    index = JobLibraryIndex.from_jobs(
+        logger,
+        job_list_response['jobs'],
+        library_mapping,
+    )
+
+    assert index.replaceable_by(
+        logger,
+        FileNameMatch('test-library-1.1.2.egg'),
+    ) == job_list
+    # not newer than the version in use
+    assert index.replaceable_by(
+        logger,
+        FileNameMatch('test-library-1.0.1.egg'),
+    ) == []
+    assert index.replaceable_by(
+        logger,
+        FileNameMatch('awesome_library_b-4.3.0.egg'),
+    )[0]['job_name'] == 'job_1'
+
+
+def test_add_job_jar(library_mapping):
+    library_mapping = dict(library_mapping, **{
+        'a1b2c3-test-library_1_0_1-e5f8c.jar':
+        FileNameMatch('test-library-1.0.1.jar'),
+    })
+    jar_path = 'dbfs:/FileStore/jars/a1b2c3-test-library_1_0_1-e5f8c.jar'
+    egg_path = (
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg'
+    )
+    index = JobLibraryIndex(library_mapping)
+    index.add_job(logger, {
+        'job_id': 5,
+        'settings': {
+            'name': 'job_5',
+            'libraries': [
+                {'jar': jar_path},
+                {'egg': egg_path},
+            ],
+        },
+    })
+
+    assert set(index) == {
+        ('test-library', 1, 'jar'),
+        ('test-library', 1, 'egg'),
+    }
+    assert index.replaceable_by(
+        logger,
+        FileNameMatch('test-library-1.0.2.jar'),
+    )[0]['library_path'] == jar_path
+
+
+def test_replaceable_in_job(job_list_response, library_mapping):
+    # a job on its own gives the same libraries as an index of every job
+    index = JobLibraryIndex.from_jobs(
+        logger,
+        job_list_response['jobs'],
+        library_mapping,
+    )
+    for filename in [
+        'test-library-1.1.2.egg',
+        'test-library-1.0.1.egg',
+        'test-library-1.0.1.jar',
+        'test-library-plus-stuff-0.1.0.egg',
+        'awesome_library_b-4.3.0.egg',
+    ]:
+        match = FileNameMatch(filename)
+        assert [
+            job_library
+            for job in job_list_response['jobs']
+            for job_library in JobLibraryIndex.replaceable_in_job(
+                logger,
+                job,
+                library_mapping,
+                match,
+            )
+        ] == index.replaceable_by(logger, match)
@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+import zipfile
+from os.path import getsize
+from unittest import mock
+
+import pytest
+
+from stork.api_client import APIClient
+from stork.configure import _load_config, PROFILE
+from stork.dbfs import get_dbfs_file_size
+from stork.file_name import FileNameMatch
+from stork.update_databricks_library import (
+    DBFS_UPLOAD_FOLDER,
+    get_library_mapping,
+    load_library,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def workspace(request):
+    folder = request.config.getoption('upload_folder')
+    if folder is None:
+        pytest.skip('pass --upload_folder to upload a library to Databricks')
+    config = _load_config(request.config.getoption('cfg'))
+    host = request.config.getoption('host') or config.get(PROFILE, 'host')
+    token = request.config.getoption('token') or config.get(PROFILE, 'token')
+    with APIClient(host, token) as client:
+        yield folder, client
+
+
+def test_large_library_registered_from_dbfs(workspace, tmp_path):
+    # uploads a library through DBFS to a real workspace, to check that
+    #  Databricks registers it in a way jobs can use - only run when given
+    #  --upload_folder, as it writes to the workspace
+    folder, client = workspace
+    match = FileNameMatch(
+        'stork_upload_test-0.0.{}.jar'.format(int(time.time()))
+    )
+    path = str(tmp_path / match.filename)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as jar:
+        # more than one DBFS block
+        jar.writestr('data.bin', b'\0' * (3 * 1024 * 1024))
+
+    staged_path = '{}/{}-{}.{}'.format(
+        DBFS_UPLOAD_FOLDER,
+        match.library_name,
+        match.version,
+        match.suffix,
+    )
+    # send even this small file through DBFS
+    with mock.patch(
+        'stork.update_databricks_library.CHUNKED_UPLOAD_THRESHOLD',
+        0,
+    ):
+        load_library(path, match, folder, client)
+    # upload_to_dbfs relies on the size DBFS reports once the file is closed
+    assert get_dbfs_file_size(staged_path, client) == getsize(path)
+    id_nums = {}
+    try:
+        library_map, id_nums = get_library_mapping(logger, folder, client)
+        uri, = [
+            uri for uri, name_match in library_map.items()
+            if name_match == match
+        ]
+        # the path update_databricks points jobs at
+        job_path = 'dbfs:/FileStore/jars/' + uri
+        res = client.get(
+            '/api/2.0/dbfs/get-status?path={}'.format(job_path[len('dbfs:'):])
+        )
+        assert res.status_code == 200, res.text
+        assert res.json()['file_size'] == getsize(path)
+    finally:
+        library = id_nums.get('{}-{}'.format(
+            match.library_name,
+            match.version,
+        ))
+        if library is not None:
+            client.post(
+                '/api/1.2/libraries/delete',
+                data={'libraryId': library['id_num']},
+            )
+        client.post('/api/2.0/dbfs/delete', data=json.dumps({
+            'path': staged_path,
+        }))
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from unittest import mock
+
+from stork.library_cache import LibraryStatusCache
+
+
+def test_library_cache_round_trip(tmp_path, library_1):
+    cache = LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+    assert cache.get(1) is None
+
+    cache.set(1, library_1)
+    cache.save()
+
+    reloaded = LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+    assert reloaded.get(1) == {
+        'name': library_1['name'],
+        'libType': library_1['libType'],
+        'files': library_1['files'],
+    }
+
+
+def test_library_cache_per_host(tmp_path, library_1):
+    cache = LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+    cache.set(1, library_1)
+    cache.save()
+
+    other = LibraryStatusCache('https://host-b', cache_dir=str(tmp_path))
+    assert other.get(1) is None
+
+
+def test_library_cache_evict_missing(tmp_path, library_1, library_2):
+    cache = LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+    cache.set(1, library_1)
+    cache.set(2, library_2)
+
+    assert cache.evict_missing([2, 3]) == ['1']
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
+
+
+def test_library_cache_unreadable_file(tmp_path):
+    cache = LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+    with open(cache.path, 'w') as f:
+        f.write('not json')
+
+    assert LibraryStatusCache(
+        'https://host-a',
+        cache_dir=str(tmp_path),
+    ).statuses == {}
+
+
+def test_library_cache_concurrent_saves(tmp_path, library_1, library_2):
+    # as when two deploys on one machine save the cache of a host at once
+    caches = [
+        LibraryStatusCache('https://host-a', cache_dir=str(tmp_path))
+        for _ in range(2)
+    ]
+    for library_id in range(500):
+        caches[0].set(library_id, library_1)
+        caches[1].set(library_id, library_2)
+
+    def save(cache):
+        for _ in range(20):
+            cache.save()
+
+    threads = [
+        threading.Thread(target=save, args=(cache,)) for cache in caches
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(caches[0].path) as f:
+        statuses = json.load(f)['statuses']
+    assert statuses in (caches[0].statuses, caches[1].statuses)
+    assert os.listdir(str(tmp_path)) == [os.path.basename(caches[0].path)]
+
+
+def test_library_cache_in_memory(library_1):
+    cache = LibraryStatusCache(
+        'https://host-a',
+        cache_dir=None,
+        statuses={'1': {'name': library_1['name']}},
+    )
+    assert cache.path is None
+    assert cache.get(1) == {'name': library_1['name']}
+
+    cache.set(2, library_1)
+    with mock.patch('stork.library_cache.tempfile.mkstemp') as mkstemp:
+        cache.save()
+
+    mkstemp.assert_not_called()
+    assert cache.get(2) is not None
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import json
+
+import pytest
+import responses
+
+from stork.api_error import APIError
+from stork.file_name import FileNameMatch
+from stork.library_digest import (
+    DIGEST_FOLDER,
+    file_digest,
+    get_stored_digest,
+    library_exists,
+    store_digest,
+)
+
+match = FileNameMatch('test-library-1.0.3-py3.6.egg')
+digest_path = DIGEST_FOLDER + '/other/folder/test-library-1.0.3.egg.sha256'
+
+
+def test_file_digest(tmpdir):
+    path = tmpdir.join('test-library-1.0.3-py3.6.egg')
+    path.write_binary(b'library contents')
+    assert file_digest(str(path)) == (
+        hashlib.sha256(b'library contents').hexdigest()
+    )
+
+
+@responses.activate
+def test_library_exists(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/get-status',
+        status=200,
+        json={'object_type': 'LIBRARY', 'path': '/other/folder/x'},
+    )
+    assert library_exists('/other/folder', match, client)
+    assert responses.calls[0].request.url.endswith(
+        'path=/other/folder/test-library-1.0.3'
+    )
+
+
+@responses.activate
+def test_library_exists_trailing_slash(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/get-status',
+        status=200,
+        json={'object_type': 'LIBRARY', 'path': '/other/folder/x'},
+    )
+    assert library_exists('/other/folder/', match, client)
+    assert responses.calls[0].request.url.endswith(
+        'path=/other/folder/test-library-1.0.3'
+    )
+
+
+@responses.activate
+def test_library_exists_missing(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/get-status',
+        status=404,
+        json={
+            'error_code': 'RESOURCE_DOES_NOT_EXIST',
+            'message': 'Path (/other/folder/x) doesn\'t exist.',
+        },
+    )
+    assert not library_exists('/other/folder', match, client)
+
+
+@responses.activate
+def test_library_exists_APIError(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/get-status',
+        status=403,
+        json={'error_code': 'PERMISSION_DENIED', 'message': 'no access'},
+    )
+    with pytest.raises(APIError) as err:
+        library_exists('/other/folder', match, client)
+    assert err.value.code == 'PERMISSION_DENIED'
+
+
+@responses.activate
+def test_get_stored_digest(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/dbfs/read',
+        status=200,
+        json={
+            'bytes_read': 6,
+            'data': base64.b64encode(b'abc123').decode('ascii'),
+        },
+    )
+    assert get_stored_digest('/other/folder', match, client) == 'abc123'
+    assert responses.calls[0].request.url.endswith('path=' + digest_path)
+
+
+@responses.activate
+def test_get_stored_digest_trailing_slash(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/dbfs/read',
+        status=200,
+        json={
+            'bytes_read': 6,
+            'data': base64.b64encode(b'abc123').decode('ascii'),
+        },
+    )
+    assert get_stored_digest('/other/folder/', match, client) == 'abc123'
+    assert responses.calls[0].request.url.endswith('path=' + digest_path)
+
+
+@responses.activate
+def test_get_stored_digest_missing(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/dbfs/read',
+        status=404,
+        json={'error_code': 'RESOURCE_DOES_NOT_EXIST', 'message': 'missing'},
+    )
+    assert get_stored_digest('/other/folder', match, client) is None
+
+
+@responses.activate
+def test_store_digest(client, host):
+    responses.add(responses.POST, host + '/api/2.0/dbfs/put', status=200)
+    store_digest('/other/folder', match, 'abc123', client)
+    assert json.loads(responses.calls[0].request.body) == {
+        'path': digest_path,
+        'contents': base64.b64encode(b'abc123').decode('ascii'),
+        'overwrite': True,
+    }
@@ -0,0 +1,146 @@
+import threading
+from unittest import mock
+
+import pytest
+import responses
+from configparser import ConfigParser
+
+from stork.api_client import APIClient
+from stork.rate_limiter import (
+    MIN_RATE,
+    RateLimiter,
+    TokenBucket,
+)
+
+
+class FakeClock(object):
+    # stands in for time.monotonic and time.sleep
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with mock.patch('stork.rate_limiter.time', clock):
+        yield clock
+
+
+def test_token_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(rate=2)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [0.5, 1.0]
+
+
+def test_token_bucket_refills(clock):
+    bucket = TokenBucket(rate=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 1
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+
+
+def test_token_bucket_shared_across_threads(clock):
+    bucket = TokenBucket(rate=10)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 10 in the first burst, then each waiting caller reserves its own slot
+    assert sorted(clock.sleeps) == pytest.approx(
+        [i / 10 for i in range(1, 21)]
+    )
+
+
+def test_token_bucket_adapts(clock):
+    bucket = TokenBucket(rate=8)
+    bucket.slow_down()
+    assert bucket.rate == 4
+    for _ in range(10):
+        bucket.slow_down()
+    assert bucket.rate == MIN_RATE
+    for _ in range(100):
+        bucket.speed_up()
+    assert bucket.rate == 8
+
+
+def test_rate_limiter_endpoint_family():
+    family = RateLimiter.endpoint_family
+    assert family('/api/2.0/jobs/list?limit=25&offset=0') == 'jobs'
+    assert family('/api/1.2/libraries/status?libraryId=1') == 'libraries'
+    assert family('/api/2.0/libraries/install') == 'libraries'
+    assert family('/api/2.0/workspace/list?path=/prod') == 'workspace'
+    assert family('/api/2.0/clusters/create') == 'clusters'
+
+
+def test_rate_limiter_from_config():
+    config = ConfigParser()
+    config['DEFAULT'] = {
+        'host': 'test_host',
+        'rate_limit_jobs': '5',
+        'rate_limit_workspace': '0',
+    }
+    limiter = RateLimiter.from_config(config)
+    assert limiter.buckets['jobs'].rate == 5
+    assert 'workspace' not in limiter.buckets
+    # families without a rate are not limited
+    assert 'libraries' not in limiter.buckets
+
+
+def test_rate_limiter_unlimited_by_default():
+    config = ConfigParser()
+    config['DEFAULT'] = {'host': 'test_host'}
+    limiter = RateLimiter.from_config(config)
+    assert limiter.buckets == {}
+    assert limiter.reserve('/api/2.0/jobs/list') == 0
+
+
+def test_rate_limiter_from_config_profile():
+    config = ConfigParser()
+    config['DEFAULT'] = {'rate_limit_jobs': '5', 'rate_limit_dbfs': '2'}
+    config['prod'] = {'rate_limit_jobs': '10'}
+    limiter = RateLimiter.from_config(config, 'prod')
+    assert limiter.buckets['jobs'].rate == 10
+    # keys missing from the profile are read from the default one
+    assert limiter.buckets['dbfs'].rate == 2
+
+
+def test_rate_limiter_from_config_invalid():
+    config = ConfigParser()
+    config['DEFAULT'] = {'rate_limit_jobs': 'fast'}
+    with pytest.raises(ValueError) as err:
+        RateLimiter.from_config(config)
+    assert str(err.value) == (
+        'rate_limit_jobs must be a number of requests per second, not fast'
+    )
+
+
+@mock.patch('stork.api_client.time.sleep')
+@responses.activate
+def test_api_client_rate_limited(sleep_mock, host):
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=429)
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=200)
+    limiter = RateLimiter({'jobs': 4})
+
+    with APIClient(host, '', rate_limiter=limiter) as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 200
+    assert limiter.buckets['jobs'].rate == pytest.approx(2.2)
@@ -0,0 +1,200 @@
+from json import dumps
+from unittest import mock
+
+import pytest
+import requests
+import responses
+
+from stork.api_client import APIClient
+from stork.api_error import APIError
+from stork.retry_policy import RetryPolicy
+
+
+def make_response(status_code, json=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    if json is not None:
+        response._content = dumps(json).encode('utf-8')
+    return response
+
+
+@pytest.mark.parametrize('status_code,expected', [
+    (200, False),
+    (400, False),
+    (404, False),
+    (429, True),
+    (500, False),
+    (502, True),
+    (503, True),
+    (504, True),
+])
+def test_should_retry_idempotent(status_code, expected):
+    policy = RetryPolicy()
+    response = make_response(status_code, json={'error': 'x'})
+    assert policy.should_retry_response(
+        'GET', '/api/2.0/jobs/list', response, 0
+    ) == expected
+    assert policy.should_retry_response(
+        'POST', '/api/2.0/jobs/reset', response, 0
+    ) == expected
+
+
+@pytest.mark.parametrize('status_code,expected', [
+    (429, True),
+    (500, False),
+    (503, False),
+])
+def test_should_retry_non_idempotent(status_code, expected):
+    policy = RetryPolicy()
+    response = make_response(status_code, json={'error': 'x'})
+    assert policy.should_retry_response(
+        'POST', '/api/1.2/libraries/upload', response, 0
+    ) == expected
+
+
+def test_should_retry_error_code():
+    policy = RetryPolicy()
+    response = make_response(400, json={
+        'error_code': 'REQUEST_LIMIT_EXCEEDED',
+        'message': 'slow down',
+    })
+    assert policy.should_retry_response(
+        'POST', '/api/2.0/clusters/create', response, 0
+    )
+
+
+def test_should_retry_limits():
+    policy = RetryPolicy(max_retries=2, max_non_idempotent_retries=1)
+    response = make_response(429)
+    assert policy.should_retry_response(
+        'GET', '/api/2.0/jobs/list', response, 1
+    )
+    assert not policy.should_retry_response(
+        'GET', '/api/2.0/jobs/list', response, 2
+    )
+    assert policy.should_retry_response(
+        'POST', '/api/1.2/libraries/upload', response, 0
+    )
+    assert not policy.should_retry_response(
+        'POST', '/api/1.2/libraries/upload', response, 1
+    )
+
+
+def test_should_retry_connection_errors():
+    policy = RetryPolicy()
+    assert policy.should_retry_error(
+        'GET', '/api/2.0/jobs/list', requests.exceptions.ConnectionError(), 0
+    )
+    assert not policy.should_retry_error(
+        'POST',
+        '/api/1.2/libraries/upload',
+        requests.exceptions.ConnectionError(),
+        0,
+    )
+    assert policy.should_retry_error(
+        'POST',
+        '/api/1.2/libraries/upload',
+        requests.exceptions.ConnectTimeout(),
+        0,
+    )
+
+
+def test_backoff_exponential_with_jitter():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=10)
+    for attempt, delay in [(0, 1), (1, 2), (2, 4), (3, 8), (4, 10), (9, 10)]:
+        backoff = policy.backoff(attempt)
+        assert delay / 2 <= backoff <= delay
+
+
+def test_backoff_retry_after():
+    policy = RetryPolicy(max_backoff=30)
+    assert policy.backoff(
+        0, make_response(429, headers={'Retry-After': '7'})
+    ) == 7
+    assert policy.backoff(
+        0, make_response(429, headers={'Retry-After': '120'})
+    ) == 30
+    assert policy.backoff(0, make_response(
+        429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+    )) == 0
+
+
+def test_api_error_retryable():
+    assert APIError(make_response(503, json={'error': 'down'})).retryable
+    assert APIError(make_response(400, json={
+        'error_code': 'TEMPORARILY_UNAVAILABLE',
+        'message': 'down',
+    })).retryable
+    assert not APIError(make_response(500, json={
+        'error_code': 'RESOURCE_ALREADY_EXISTS',
+        'message': 'already exists',
+    })).retryable
+    assert not APIError(make_response(403, json={'error': 'no'})).retryable
+
+
+@mock.patch('stork.api_client.time.sleep')
+@responses.activate
+def test_api_client_retries(sleep_mock, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=429,
+        headers={'Retry-After': '3'},
+    )
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=503)
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        json={'jobs': []},
+    )
+
+    with APIClient(host, '') as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 200
+    assert len(responses.calls) == 3
+    assert sleep_mock.call_args_list[0] == mock.call(3)
+
+
+@mock.patch('stork.api_client.time.sleep')
+@responses.activate
+def test_api_client_gives_up(sleep_mock, host):
+    responses.add(responses.GET, host + '/api/2.0/jobs/list', status=503)
+
+    policy = RetryPolicy(max_retries=2)
+    with APIClient(host, '', retry_policy=policy) as client:
+        res = client.get('/api/2.0/jobs/list')
+
+    assert res.status_code == 503
+    assert len(responses.calls) == 3
+    assert sleep_mock.call_count == 2
+
+
+@mock.patch('stork.api_client.time.sleep')
+@responses.activate
+def test_api_client_retry_resends_file(sleep_mock, host, tmp_path):
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/upload',
+        status=429,
+    )
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/upload',
+        status=200,
+    )
+    path = tmp_path / 'test-library-1.0.3.egg'
+    path.write_bytes(b'egg file contents')
+
+    with APIClient(host, '') as client:
+        with open(str(path), 'rb') as file_obj:
+            res = client.post(
+                '/api/1.2/libraries/upload',
+                files={'uri': file_obj},
+            )
+
+    assert res.status_code == 200
+    assert len(responses.calls) == 2
+    assert b'egg file contents' in responses.calls[1].request.body
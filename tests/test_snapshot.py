@@ -0,0 +1,131 @@
+import logging
+
+import responses
+
+from stork.snapshot import WorkspaceSnapshot
+from stork.update_databricks_library import (
+    FileNameMatch,
+    get_job_list,
+    get_library_mapping,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def test_snapshot_sync_jobs(tmp_path, job_list_response):
+    jobs = job_list_response['jobs']
+    with WorkspaceSnapshot('https://host-a', str(tmp_path)) as snapshot:
+        assert snapshot.synced_at is None
+        assert snapshot.sync_jobs(jobs) == {
+            'added': 4, 'changed': 0, 'removed': 0,
+        }
+        snapshot.mark_synced()
+
+    with WorkspaceSnapshot('https://host-a', str(tmp_path)) as snapshot:
+        assert snapshot.synced_at is not None
+        assert list(snapshot.iter_jobs()) == [
+            {'job_id': job['job_id'], 'settings': job['settings']}
+            for job in jobs
+        ]
+        changed = dict(jobs[1], settings=dict(jobs[1]['settings'], name='x'))
+        assert snapshot.sync_jobs([jobs[0], changed, jobs[3]]) == {
+            'added': 0, 'changed': 1, 'removed': 1,
+        }
+        assert [
+            job['settings']['name'] for job in snapshot.iter_jobs()
+        ] == ['job_1', 'x', 'job_4']
+
+
+def test_snapshot_per_host(tmp_path, job_list_response):
+    with WorkspaceSnapshot('https://host-a', str(tmp_path)) as snapshot:
+        snapshot.sync_jobs(job_list_response['jobs'])
+
+    with WorkspaceSnapshot('https://host-b', str(tmp_path)) as snapshot:
+        assert list(snapshot.iter_jobs()) == []
+
+
+@responses.activate
+def test_get_library_mapping_snapshot(
+    tmp_path,
+    workspace_list_response,
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+    id_nums,
+    library_mapping,
+    client,
+    host,
+    prod_folder,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    libraries = [
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7,
+    ]
+    for i, lib in enumerate(libraries):
+        responses.add(
+            responses.GET,
+            host + '/api/1.2/libraries/status?libraryId={}'.format(i+1),
+            status=200,
+            json=lib,
+        )
+
+    with WorkspaceSnapshot(host, str(tmp_path)) as snapshot:
+        # library 8 has since been removed from the folder
+        snapshot.set(8, library_7)
+        for i, lib in enumerate(libraries[:5]):
+            snapshot.set(i + 1, lib)
+        snapshot.save()
+
+        # used as a cache, only new libraries are fetched
+        get_library_mapping(logger, prod_folder, client, cache=snapshot)
+        assert len(responses.calls) == 3
+        assert snapshot.library_ids() == [1, 2, 3, 4, 5, 6, 7]
+
+        # read from the snapshot, nothing is fetched
+        library_map, id_nums_actual = get_library_mapping(
+            logger,
+            prod_folder,
+            client,
+            snapshot=snapshot,
+        )
+    assert len(responses.calls) == 3
+    assert library_map == library_mapping
+    assert id_nums_actual == id_nums
+
+
+@responses.activate
+def test_get_job_list_snapshot(
+    tmp_path,
+    job_list_response,
+    library_mapping,
+    job_list,
+    client,
+    host,
+):
+    with WorkspaceSnapshot(host, str(tmp_path)) as snapshot:
+        snapshot.sync_jobs(job_list_response['jobs'])
+        job_list_actual = get_job_list(
+            logger,
+            FileNameMatch('test-library-1.1.2.egg'),
+            library_mapping,
+            client,
+            snapshot=snapshot,
+        )
+
+    assert len(responses.calls) == 0
+    assert job_list_actual == job_list
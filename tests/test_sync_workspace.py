@@ -0,0 +1,75 @@
+import logging
+from functools import partial
+from unittest import mock
+
+import responses
+
+from stork.snapshot import WorkspaceSnapshot
+from stork.sync_workspace import sync_workspace
+
+logger = logging.getLogger(__name__)
+
+
+@responses.activate
+def test_sync_workspace(
+    tmp_path,
+    job_list_response,
+    workspace_list_response,
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+    caplog,
+    host,
+    cfg,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        json=job_list_response,
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    for i, lib in enumerate([
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7,
+    ]):
+        responses.add(
+            responses.GET,
+            host + '/api/1.2/libraries/status?libraryId={}'.format(i+1),
+            status=200,
+            json=lib,
+        )
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg), \
+            mock.patch(
+                'stork.sync_workspace.WorkspaceSnapshot',
+                partial(WorkspaceSnapshot, snapshot_dir=str(tmp_path)),
+            ):
+        first = sync_workspace(logger, token='')
+        second = sync_workspace(logger, token='')
+
+    assert first == {'added': 4, 'changed': 0, 'removed': 0}
+    assert second == {'added': 0, 'changed': 0, 'removed': 0}
+    # library statuses are only fetched by the first sync
+    assert len(responses.calls) == 1 + 1 + 7 + 1 + 1
+    assert caplog.record_tuples[-1][2] == (
+        'synced jobs (0 added, 0 changed, 0 removed) and 7 production '
+        'libraries from {}'.format(host)
+    )
+    with WorkspaceSnapshot(host, str(tmp_path)) as snapshot:
+        assert snapshot.synced_at is not None
+        assert len(list(snapshot.iter_jobs())) == 4
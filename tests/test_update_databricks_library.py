@@ -1,22 +1,34 @@
 import logging
+from functools import partial
 from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
 import json
 import pytest
 import responses
 import requests
 
-from .unittest_helpers import strip_whitespace
+from .fake_databricks import FakeDatabricks, FakeWorkspace
+from .unittest_helpers import calls_returning, strip_whitespace
+from stork.library_cache import LibraryStatusCache
+from stork.snapshot import WorkspaceSnapshot
+from stork.sync_workspace import sync_workspace
 from stork.update_databricks_library import (
     APIError,
     FileNameError,
     FileNameMatch,
     load_library,
     get_job_list,
+    get_job_lists,
     get_library_mapping,
+    iter_jobs,
     update_job_libraries,
+    replace_job_libraries,
     delete_old_versions,
     update_databricks,
+    JobUpdateError,
+    LibraryDeleteError,
+    LibraryConflictError,
 )
 
 logger = logging.getLogger(__name__)
@@ -27,8 +39,12 @@ def request_callback(request):
     return(200, {}, request.body)
 
 
+@mock.patch(
+    'stork.update_databricks_library.getsize',
+    mock.Mock(return_value=17),
+)
 @responses.activate
-def test_load_library_egg(host, prod_folder):
+def test_load_library_egg(client, host, prod_folder):
     filename = 'test-library-1.0.3-py3.6.egg'
 
     responses.add(
@@ -45,13 +61,16 @@ def test_load_library_egg(host, prod_folder):
             filename=filename,
             match=FileNameMatch(filename),
             folder=prod_folder,
-            token='',
-            host=host,
+            client=client,
         )
 
 
+@mock.patch(
+    'stork.update_databricks_library.getsize',
+    mock.Mock(return_value=17),
+)
 @responses.activate
-def test_load_library_jar(host, prod_folder):
+def test_load_library_jar(client, host, prod_folder):
     filename = 'test-library-1.0.3.jar'
 
     responses.add(
@@ -68,13 +87,16 @@ def test_load_library_jar(host, prod_folder):
             filename=filename,
             match=FileNameMatch(filename),
             folder=prod_folder,
-            token='',
-            host=host,
+            client=client,
         )
 
 
+@mock.patch(
+    'stork.update_databricks_library.getsize',
+    mock.Mock(return_value=17),
+)
 @responses.activate
-def test_load_library_APIError(host, prod_folder):
+def test_load_library_APIError(client, host, prod_folder):
     filename = 'test-library-1.0.3-py3.6.egg'
 
     responses.add(
@@ -92,14 +114,60 @@ def test_load_library_APIError(host, prod_folder):
                 filename=filename,
                 match=FileNameMatch(filename),
                 folder=prod_folder,
-                token='',
-                host=host,
+                client=client,
             )
         assert err.code == 'http 401'
 
 
+@mock.patch(
+    'stork.update_databricks_library.getsize',
+    return_value=300 * 1024 * 1024,
+)
+@mock.patch('stork.update_databricks_library.upload_to_dbfs_calls')
+@responses.activate
+def test_load_library_chunked(
+    upload_mock,
+    getsize_mock,
+    client,
+    host,
+    prod_folder,
+):
+    filename = 'dist/test-library-1.0.3.jar'
+
+    responses.add(
+        responses.POST,
+        host + '/api/1.2/libraries/upload',
+        status=200,
+    )
+
+    load_library(
+        filename=filename,
+        match=FileNameMatch('test-library-1.0.3.jar'),
+        folder=prod_folder,
+        client=client,
+    )
+
+    upload_mock.assert_called_with(
+        filename,
+        '/FileStore/jars/stork/test-library-1.0.3.jar',
+    )
+    assert len(responses.calls) == 1
+    assert parse_qs(responses.calls[0].request.body) == {
+        'libType': ['java-jar'],
+        'name': ['test-library-1.0.3'],
+        'folder': [prod_folder],
+        'uri': ['dbfs:/FileStore/jars/stork/test-library-1.0.3.jar'],
+    }
+
+
 @responses.activate
-def test_get_job_list(library_mapping, job_list, job_list_response, host):
+def test_get_job_list(
+    library_mapping,
+    job_list,
+    job_list_response,
+    client,
+    host,
+):
 
     responses.add(
         responses.GET,
@@ -112,14 +180,143 @@ def test_get_job_list(library_mapping, job_list, job_list_response, host):
         logger,
         match=match,
         library_mapping=library_mapping,
-        token='',
-        host=host,
+        client=client,
     )
 
     assert len(responses.calls) == 1
     assert job_list_actual == job_list
 
 
+@responses.activate
+def test_get_job_lists(
+    library_mapping,
+    job_list,
+    job_list_response,
+    client,
+    host,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        json=job_list_response,
+    )
+    library_mapping = dict(
+        library_mapping,
+        **{
+            '01832402-test-library-plus-stuff_0_1_0_py3_6-e5f8c.egg':
+            FileNameMatch('test-library-plus-stuff-0.1.0.egg'),
+        }
+    )
+    job_lists = get_job_lists(
+        logger,
+        [
+            FileNameMatch('test-library-1.1.2.egg'),
+            FileNameMatch('test-library-plus-stuff-0.1.0.egg'),
+        ],
+        library_mapping,
+        client,
+    )
+
+    # the jobs are listed once for both libraries
+    assert len(responses.calls) == 1
+    assert job_lists[0] == job_list
+    assert [job['job_name'] for job in job_lists[1]] == [
+        'job_2', 'job_3', 'job_4',
+    ]
+
+
+def paged_jobs_callback(job_list_response, page_size):
+    # serves job_list_response one page at a time, as the jobs/list API does
+    def callback(request):
+        query = parse_qs(urlparse(request.url).query)
+        assert int(query['limit'][0]) == page_size
+        offset = int(query['offset'][0])
+        jobs = job_list_response['jobs']
+        page = {
+            'jobs': jobs[offset:offset + page_size],
+            'has_more': offset + page_size < len(jobs),
+        }
+        return (200, {}, json.dumps(page))
+    return callback
+
+
+@responses.activate
+def test_iter_jobs_pages(job_list_response, client, host):
+    responses.add_callback(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        callback=paged_jobs_callback(job_list_response, page_size=3),
+    )
+
+    jobs = iter_jobs(client, page_size=3)
+    first_job = next(jobs)
+    # only the first page has been fetched so far
+    assert len(responses.calls) == 1
+    assert first_job == job_list_response['jobs'][0]
+
+    assert [first_job] + list(jobs) == job_list_response['jobs']
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_iter_jobs_no_jobs(client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=200,
+        json={'has_more': False},
+    )
+
+    assert list(iter_jobs(client)) == []
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_get_job_list_pages(
+    library_mapping,
+    job_list,
+    job_list_response,
+    client,
+    host,
+):
+    responses.add_callback(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        callback=paged_jobs_callback(job_list_response, page_size=25),
+    )
+    job_list_response['jobs'] = job_list_response['jobs'] * 10
+    match = FileNameMatch('test-library-1.1.2.egg')
+    job_list_actual = get_job_list(
+        logger,
+        match=match,
+        library_mapping=library_mapping,
+        client=client,
+    )
+
+    assert len(responses.calls) == 2
+    assert job_list_actual == job_list * 10
+
+
+@responses.activate
+def test_get_job_list_APIError(library_mapping, client, host):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/list',
+        status=403,
+        json={'error_code': 'PERMISSION_DENIED', 'message': 'no'},
+    )
+
+    with pytest.raises(APIError) as err:
+        get_job_list(
+            logger,
+            match=FileNameMatch('test-library-1.1.2.egg'),
+            library_mapping=library_mapping,
+            client=client,
+        )
+    assert err.value.code == 'PERMISSION_DENIED'
+
+
 @responses.activate
 def test_get_library_mapping(
     workspace_list_response,
@@ -132,6 +329,56 @@ def test_get_library_mapping(
     library_7,
     id_nums,
     library_mapping,
+    client,
+    host,
+    prod_folder,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    for i, lib in enumerate([
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7
+    ]):
+        responses.add(
+            responses.GET,
+            host + '/api/1.2/libraries/status?libraryId={}'.format(i+1),
+            status=200,
+            json=lib,
+        )
+
+    library_map_actual, id_nums_actual = get_library_mapping(
+        logger,
+        client=client,
+        prod_folder=prod_folder,
+    )
+
+    assert len(responses.calls) == 8
+    assert id_nums == id_nums_actual
+    assert library_mapping == library_map_actual
+
+
+@responses.activate
+def test_get_library_mapping_concurrent(
+    workspace_list_response,
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+    id_nums,
+    library_mapping,
+    client,
     host,
     prod_folder,
 ):
@@ -159,21 +406,156 @@ def test_get_library_mapping(
 
     library_map_actual, id_nums_actual = get_library_mapping(
         logger,
-        token='',
-        host=host,
+        client=client,
         prod_folder=prod_folder,
+        max_workers=4,
     )
 
     assert len(responses.calls) == 8
     assert id_nums == id_nums_actual
+    assert list(id_nums_actual.keys()) == list(id_nums.keys())
+    assert library_mapping == library_map_actual
+
+
+@responses.activate
+def test_get_library_mapping_cache(
+    workspace_list_response,
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+    id_nums,
+    library_mapping,
+    client,
+    host,
+    prod_folder,
+    tmp_path,
+):
+    cache = LibraryStatusCache(host, cache_dir=str(tmp_path))
+    libraries = [
+        library_1,
+        library_2,
+        library_3,
+        library_4,
+        library_5,
+        library_6,
+        library_7
+    ]
+    for i, lib in enumerate(libraries[:5]):
+        cache.set(i + 1, lib)
+    # no longer in the production folder
+    cache.set(99, library_1)
+    cache.save()
+
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    for i, lib in enumerate(libraries):
+        responses.add(
+            responses.GET,
+            host + '/api/1.2/libraries/status?libraryId={}'.format(i+1),
+            status=200,
+            json=lib,
+        )
+
+    library_map_actual, id_nums_actual = get_library_mapping(
+        logger,
+        client=client,
+        prod_folder=prod_folder,
+        cache=LibraryStatusCache(host, cache_dir=str(tmp_path)),
+    )
+
+    assert [call.request.url for call in responses.calls[1:]] == [
+        host + '/api/1.2/libraries/status?libraryId=6',
+        host + '/api/1.2/libraries/status?libraryId=7',
+    ]
+    assert id_nums == id_nums_actual
     assert library_mapping == library_map_actual
 
+    saved = LibraryStatusCache(host, cache_dir=str(tmp_path))
+    assert sorted(saved.statuses.keys()) == ['1', '2', '3', '4', '5', '6', '7']
+
+
+@responses.activate
+def test_get_library_mapping_concurrent_APIError(
+    workspace_list_response,
+    library_1,
+    client,
+    host,
+    prod_folder,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/1.2/libraries/status?libraryId=1',
+        status=200,
+        json=library_1,
+    )
+    for i in range(2, 8):
+        responses.add(
+            responses.GET,
+            host + '/api/1.2/libraries/status?libraryId={}'.format(i),
+            status=403,
+            json={'error': 'permission denied'},
+        )
+
+    with pytest.raises(APIError) as err:
+        get_library_mapping(
+            logger,
+            client=client,
+            prod_folder=prod_folder,
+            max_workers=4,
+        )
+    assert err.value.code == 'http 403'
+
 
 @responses.activate
 def test_update_job_libraries(
+    job_list,
+    job_update_response_list_new,
+    client,
+    host,
+):
+    responses.add_callback(
+        responses.POST,
+        host + '/api/2.0/jobs/reset',
+        callback=request_callback,
+    )
+
+    results = update_job_libraries(
+        logger,
+        job_list,
+        FileNameMatch('test-library-1.0.3.egg'),
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+        client,
+    )
+
+    # settings come from the job list, so no jobs/get is needed
+    assert len(responses.calls) == 1
+    assert (
+        json.loads(responses.calls[0].response.text) ==
+        job_update_response_list_new[0]
+    )
+    assert results == {'updated': job_list, 'skipped': [], 'failed': []}
+
+
+@responses.activate
+def test_update_job_libraries_without_settings(
     job_list,
     job_update_response_list_old,
     job_update_response_list_new,
+    client,
     host,
 ):
     for job in job_update_response_list_old:
@@ -188,14 +570,16 @@ def test_update_job_libraries(
             host + '/api/2.0/jobs/reset',
             callback=request_callback,
         )
+    job_list = [
+        {k: v for k, v in job.items() if k != 'settings'} for job in job_list
+    ]
 
-    update_job_libraries(
+    results = update_job_libraries(
         logger,
         job_list,
-        FileNameMatch('test_library-1.2.3.egg'),
-        'dbfs:/FileStore/jars/some_library_uri',
-        '',
-        host,
+        FileNameMatch('test-library-1.0.3.egg'),
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+        client,
     )
 
     assert len(responses.calls) == 2
@@ -203,37 +587,291 @@ def test_update_job_libraries(
         json.loads(responses.calls[1].response.text) ==
         job_update_response_list_new[0]
     )
+    assert results == {'updated': job_list, 'skipped': [], 'failed': []}
 
 
-@pytest.mark.usefixtures('id_nums')
 @responses.activate
-def test_delete_old_versions(id_nums, host, prod_folder):
-    for i in range(2):
-        responses.add_callback(
-            responses.POST,
-            host + '/api/1.2/libraries/delete',
-            callback=request_callback,
-        )
+def test_update_job_libraries_verify(
+    job_list,
+    job_update_response_list_old,
+    job_update_response_list_new,
+    client,
+    host,
+):
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/get?job_id=3',
+        status=200,
+        json=job_update_response_list_old[0],
+    )
+    responses.add_callback(
+        responses.POST,
+        host + '/api/2.0/jobs/reset',
+        callback=request_callback,
+    )
+
+    results = update_job_libraries(
+        logger,
+        job_list,
+        FileNameMatch('test-library-1.0.3.egg'),
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+        client,
+        verify=True,
+    )
+
+    assert len(responses.calls) == 2
+    assert (
+        json.loads(responses.calls[1].response.text) ==
+        job_update_response_list_new[0]
+    )
+    assert results == {'updated': job_list, 'skipped': [], 'failed': []}
+
+
+@responses.activate
+def test_update_job_libraries_verify_changed(
+    job_list,
+    job_update_response_list_old,
+    client,
+    host,
+):
+    changed_job = job_update_response_list_old[0]
+    changed_job['settings']['name'] = 'job_3_renamed'
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/get?job_id=3',
+        status=200,
+        json=changed_job,
+    )
+
+    results = update_job_libraries(
+        logger,
+        job_list,
+        FileNameMatch('test-library-1.0.3.egg'),
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+        client,
+        verify=True,
+    )
+
+    assert len(responses.calls) == 1
+    assert results['updated'] == []
+    assert results['failed'] == [dict(
+        job_list[0],
+        error="settings of job 'job_3' changed since it was listed",
+    )]
+
+
+@responses.activate
+def test_update_job_libraries_reports_each_job(
+    job_update_response_list_old,
+    client,
+    host,
+):
+    library_path = (
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_1_py3_6-e5f8c.egg'
+    )
+    old_job = job_update_response_list_old[0]
+    job_list = [
+        {'job_id': i, 'job_name': 'job_{}'.format(i), 'library_path': path}
+        for i, path in [
+            (3, library_path),
+            (4, library_path),
+            (5, 'dbfs:/FileStore/jars/somewhere_else.egg'),
+        ]
+    ]
+    for job in job_list:
+        responses.add(
+            responses.GET,
+            host + '/api/2.0/jobs/get?job_id={}'.format(job['job_id']),
+            status=200,
+            json=dict(old_job, job_id=job['job_id']),
+        )
+
+    def reset_callback(request):
+        if json.loads(request.body)['job_id'] == 4:
+            return (400, {}, json.dumps({
+                'error_code': 'INVALID_PARAMETER_VALUE',
+                'message': 'bad settings',
+            }))
+        return (200, {}, request.body)
+
+    responses.add_callback(
+        responses.POST,
+        host + '/api/2.0/jobs/reset',
+        callback=reset_callback,
+    )
+
+    results = update_job_libraries(
+        logger,
+        job_list,
+        FileNameMatch('test-library-1.0.3.egg'),
+        'dbfs:/FileStore/jars/some_library_uri',
+        client,
+        max_workers=3,
+    )
+
+    assert len(responses.calls) == 5
+    assert results['updated'] == [job_list[0]]
+    assert results['skipped'] == [job_list[2]]
+    assert results['failed'] == [dict(
+        job_list[1],
+        error='INVALID_PARAMETER_VALUE: bad settings',
+    )]
+
+
+@responses.activate
+def test_replace_job_libraries(job_list, client, host):
+    responses.add_callback(
+        responses.POST,
+        host + '/api/2.0/jobs/reset',
+        callback=request_callback,
+    )
+    job = {
+        'job_id': 3,
+        'job_name': 'job_3',
+        'settings': job_list[0]['settings'],
+    }
+    new_path = (
+        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg'
+    )
+    new_plus_path = (
+        'dbfs:/FileStore/jars/'
+        '01832402-test-library-plus-stuff_0_1_0_py3_6-e5f8c.egg'
+    )
+    replacements = {
+        job_list[0]['library_path']: ('egg', new_path),
+        job['settings']['libraries'][1]['egg']: ('egg', new_plus_path),
+    }
+
+    results = replace_job_libraries(logger, [(job, replacements)], client)
+
+    # both libraries are replaced with a single reset
+    assert len(responses.calls) == 1
+    assert json.loads(responses.calls[0].response.text) == {
+        'job_id': 3,
+        'new_settings': dict(
+            job['settings'],
+            libraries=[{'egg': new_path}, {'egg': new_plus_path}],
+        ),
+    }
+    assert results == {'updated': [job], 'skipped': [], 'failed': []}
+
+
+@pytest.mark.usefixtures('id_nums')
+@responses.activate
+def test_delete_old_versions(id_nums, client, host, prod_folder):
+    for i in range(2):
+        responses.add_callback(
+            responses.POST,
+            host + '/api/1.2/libraries/delete',
+            callback=request_callback,
+        )
 
     actual_deleted_libraries = delete_old_versions(
         logger,
         FileNameMatch('test-library-1.0.3-SNAPSHOT.egg'),
         id_nums,
-        token='',
+        client=client,
         prod_folder=prod_folder,
-        host=host,
     )
 
     assert len(responses.calls) == 2
     actual_responses = [res.response.text for res in responses.calls]
     assert set(actual_responses) == {'libraryId=5', 'libraryId=6'}
     assert (
-        set(actual_deleted_libraries) ==
+        set(actual_deleted_libraries['deleted']) ==
         {'test-library-1.0.1.egg', 'test-library-1.0.2.egg'}
     )
+    assert actual_deleted_libraries['failed'] == []
 
 
-@mock.patch('stork.update_databricks_library.load_library')
+@pytest.mark.parametrize('max_workers', [1, 4])
+@responses.activate
+def test_delete_old_versions_reports_each_library(
+    max_workers,
+    id_nums,
+    client,
+    host,
+    prod_folder,
+):
+    def delete_callback(request):
+        if request.body == 'libraryId=5':
+            return (
+                400,
+                {},
+                json.dumps({
+                    'error_code': 'INVALID_STATE',
+                    'message': 'library is attached to a cluster',
+                }),
+            )
+        return (200, {}, request.body)
+
+    responses.add_callback(
+        responses.POST,
+        host + '/api/1.2/libraries/delete',
+        callback=delete_callback,
+    )
+
+    results = delete_old_versions(
+        logger,
+        FileNameMatch('test-library-1.0.3-SNAPSHOT.egg'),
+        id_nums,
+        client=client,
+        prod_folder=prod_folder,
+        max_workers=max_workers,
+    )
+
+    # the failure does not stop the other library from being deleted
+    assert len(responses.calls) == 2
+    assert results == {
+        'deleted': ['test-library-1.0.2.egg'],
+        'failed': [{
+            'filename': 'test-library-1.0.1.egg',
+            'id_num': 5,
+            'error': 'INVALID_STATE: library is attached to a cluster',
+        }],
+    }
+
+
+@mock.patch('stork.api_client.time.sleep')
+@responses.activate
+def test_delete_old_versions_retried_delete(
+    sleep_mock,
+    id_nums,
+    client,
+    host,
+    prod_folder,
+):
+    # the first delete of each version goes through, but its response is lost
+    for status, body in [
+        (503, {'error_code': 'TEMPORARILY_UNAVAILABLE', 'message': ''}),
+        (503, {'error_code': 'TEMPORARILY_UNAVAILABLE', 'message': ''}),
+        (400, {'error_code': 'RESOURCE_DOES_NOT_EXIST', 'message': ''}),
+        (400, {'error_code': 'RESOURCE_DOES_NOT_EXIST', 'message': ''}),
+    ]:
+        responses.add(
+            responses.POST,
+            host + '/api/1.2/libraries/delete',
+            status=status,
+            json=body,
+        )
+
+    results = delete_old_versions(
+        logger,
+        FileNameMatch('test-library-1.0.3-SNAPSHOT.egg'),
+        id_nums,
+        client=client,
+        prod_folder=prod_folder,
+    )
+
+    assert len(responses.calls) == 4
+    assert results == {
+        'deleted': ['test-library-1.0.1.egg', 'test-library-1.0.2.egg'],
+        'failed': [],
+    }
+
+
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
 @responses.activate
 def test_update_databricks_already_exists(
     load_mock,
@@ -282,15 +920,14 @@ def test_update_databricks_already_exists(
         'some/path/to/test-library-1.0.1-py3.6.egg',
         FileNameMatch('test-library-1.0.1-py3.6.egg'),
         '/other/folder',
-        '',
-        host,
     )
 
 
-@mock.patch('stork.update_databricks_library.load_library')
-@mock.patch('stork.update_databricks_library.get_job_list')
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
 @mock.patch('stork.update_databricks_library.get_library_mapping')
-@mock.patch('stork.update_databricks_library.update_job_libraries')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
 @mock.patch('stork.update_databricks_library.delete_old_versions')
 def test_update_databricks_update_jobs(
     delete_mock,
@@ -307,8 +944,16 @@ def test_update_databricks_update_jobs(
     cfg,
 ):
     path = 'some/path/to/test-library-1.0.3-py3.6.egg'
-    delete_mock.return_value = ['test-library-1.0.1', 'test-library-1.0.2']
-    job_mock.return_value = job_list
+    delete_mock.return_value = {
+        'deleted': ['test-library-1.0.1', 'test-library-1.0.2'],
+        'failed': [],
+    }
+    job_mock.return_value = [job_list]
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
     lib_mock.return_value = (library_mapping, id_nums)
 
     with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
@@ -324,37 +969,56 @@ def test_update_databricks_update_jobs(
     out = [r[2] for r in caplog.record_tuples]
     expected_out = [
         'new library test-library-1.0.3 loaded to Databricks',
-        'current major version of library used by jobs: job_3',
+        'current major version of test-library used by jobs: job_3',
         'updated jobs: job_3',
         'removed old versions: test-library-1.0.1, test-library-1.0.2',
     ]
     match = FileNameMatch('test-library-1.0.3-py3.6.egg')
     assert out == expected_out
-    load_mock.assert_called_with(path, match, prod_folder, '', host)
-    job_mock.assert_called_with(logger, match, library_mapping, '', host)
-    lib_mock.assert_called_with(logger, prod_folder, '', host)
+    load_mock.assert_called_with(path, match, prod_folder)
+    job_mock.assert_called_with(
+        logger, [match], library_mapping, mock.ANY, snapshot=None,
+    )
+    lib_mock.assert_called_with(
+        logger, prod_folder, mock.ANY, max_workers=1, cache=None,
+    )
+    assert lib_mock.call_args[0][2].host == host
     update_mock.assert_called_with(
         logger,
-        job_list,
-        match,
-        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
-        '',
-        host,
+        [(
+            {
+                'job_id': 3,
+                'job_name': 'job_3',
+                'settings': job_list[0]['settings'],
+            },
+            {
+                job_list[0]['library_path']: (
+                    'egg',
+                    'dbfs:/FileStore/jars/'
+                    '47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+                ),
+            },
+        )],
+        mock.ANY,
+        max_workers=1,
+        verify=False,
     )
     delete_mock.assert_called_with(
         logger,
         match,
         id_nums=id_nums,
-        token='',
+        client=mock.ANY,
         prod_folder=prod_folder,
-        host=host,
+        max_workers=1,
+        versions=mock.ANY,
     )
 
 
-@mock.patch('stork.update_databricks_library.load_library')
-@mock.patch('stork.update_databricks_library.get_job_list')
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
 @mock.patch('stork.update_databricks_library.get_library_mapping')
-@mock.patch('stork.update_databricks_library.update_job_libraries')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
 def test_update_databricks_update_jobs_no_cleanup(
     update_mock,
     lib_mock,
@@ -369,8 +1033,13 @@ def test_update_databricks_update_jobs_no_cleanup(
     cfg,
 ):
     path = 'some/path/to/test-library-1.0.3-py3.6.egg'
-    job_mock.return_value = job_list
+    job_mock.return_value = [job_list]
     lib_mock.return_value = (library_mapping, id_nums)
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
     with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
         update_databricks(
             logger,
@@ -383,28 +1052,156 @@ def test_update_databricks_update_jobs_no_cleanup(
     out = [r[2] for r in caplog.record_tuples]
     expected_out = [
         'new library test-library-1.0.3 loaded to Databricks',
-        'current major version of library used by jobs: job_3',
+        'current major version of test-library used by jobs: job_3',
         'updated jobs: job_3',
         ]
     assert out == expected_out
 
     match = FileNameMatch('test-library-1.0.3-py3.6.egg')
-    load_mock.assert_called_with(
-        path, match, prod_folder, '', host,
+    load_mock.assert_called_with(path, match, prod_folder)
+    job_mock.assert_called_with(
+        logger, [match], library_mapping, mock.ANY, snapshot=None,
+    )
+    lib_mock.assert_called_with(
+        logger, prod_folder, mock.ANY, max_workers=1, cache=None,
     )
-    job_mock.assert_called_with(logger, match, library_mapping, '', host)
-    lib_mock.assert_called_with(logger, prod_folder, '', host)
     update_mock.assert_called_with(
         logger,
-        job_list,
-        match,
-        'dbfs:/FileStore/jars/47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
-        '',
-        host,
+        [(
+            {
+                'job_id': 3,
+                'job_name': 'job_3',
+                'settings': job_list[0]['settings'],
+            },
+            {
+                job_list[0]['library_path']: (
+                    'egg',
+                    'dbfs:/FileStore/jars/'
+                    '47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+                ),
+            },
+        )],
+        mock.ANY,
+        max_workers=1,
+        verify=False,
+    )
+
+
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
+@mock.patch('stork.update_databricks_library.get_library_mapping')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
+@mock.patch('stork.update_databricks_library.delete_old_versions')
+def test_update_databricks_update_jobs_failed(
+    delete_mock,
+    update_mock,
+    lib_mock,
+    job_mock,
+    load_mock,
+    library_mapping,
+    id_nums,
+    job_list,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    path = 'some/path/to/test-library-1.0.3-py3.6.egg'
+    job_mock.return_value = [job_list]
+    lib_mock.return_value = (library_mapping, id_nums)
+    failed_job = dict(job_list[0], error='http 503: unavailable')
+    update_mock.return_value = {
+        'updated': [],
+        'skipped': [],
+        'failed': [failed_job],
+    }
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(JobUpdateError) as err:
+            update_databricks(
+                logger,
+                path=path,
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+
+    assert err.value.failed == [failed_job]
+    assert str(err.value) == (
+        'failed to update jobs: job_3 (http 503: unavailable)'
+    )
+    out = [r[2] for r in caplog.record_tuples]
+    assert out[-2:] == [
+        'failed to update job job_3: http 503: unavailable',
+        'not removing old versions: some jobs failed to update',
+    ]
+    delete_mock.assert_not_called()
+
+
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
+@mock.patch('stork.update_databricks_library.get_library_mapping')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
+@mock.patch('stork.update_databricks_library.delete_old_versions')
+def test_update_databricks_cleanup_failed(
+    delete_mock,
+    update_mock,
+    lib_mock,
+    job_mock,
+    load_mock,
+    library_mapping,
+    id_nums,
+    job_list,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    path = 'some/path/to/test-library-1.0.3-py3.6.egg'
+    job_mock.return_value = [job_list]
+    lib_mock.return_value = (library_mapping, id_nums)
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
+    failed_lib = {
+        'filename': 'test-library-1.0.1.egg',
+        'id_num': 5,
+        'error': 'http 503: unavailable',
+    }
+    delete_mock.return_value = {
+        'deleted': ['test-library-1.0.2.egg'],
+        'failed': [failed_lib],
+    }
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(LibraryDeleteError) as err:
+            update_databricks(
+                logger,
+                path=path,
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+
+    assert err.value.failed == [failed_lib]
+    assert str(err.value) == (
+        'failed to remove old versions: test-library-1.0.1.egg '
+        '(http 503: unavailable)'
     )
+    out = [r[2] for r in caplog.record_tuples]
+    assert out[-2:] == [
+        'removed old versions: test-library-1.0.2.egg',
+        'failed to remove old version test-library-1.0.1.egg: '
+        'http 503: unavailable',
+    ]
 
 
-@mock.patch('stork.update_databricks_library.load_library')
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
 def test_update_databricks_only_upload(
     load_mock,
     caplog,
@@ -428,12 +1225,11 @@ def test_update_databricks_only_upload(
         'some/path/to/test-library-1.0.3-py3.6.egg',
         FileNameMatch('test-library-1.0.3-py3.6.egg'),
         prod_folder,
-        '',
-        host,
     )
 
 
-@mock.patch('stork.update_databricks_library.load_library')
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
 def test_update_databricks_wrong_folder(load_mock, caplog, host, cfg):
     with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
         update_databricks(
@@ -451,12 +1247,11 @@ def test_update_databricks_wrong_folder(load_mock, caplog, host, cfg):
         'some/path/to/test-library-1.0.3-py3.6.egg',
         FileNameMatch('test-library-1.0.3-py3.6.egg'),
         '/other/folder',
-        '',
-        host,
     )
 
 
-@mock.patch('stork.update_databricks_library.load_library')
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
 def test_update_databricks_with_jar_only_upload(
     load_mock,
     caplog,
@@ -480,12 +1275,10 @@ def test_update_databricks_with_jar_only_upload(
         'some/path/to/test-library-1.0.3.jar',
         FileNameMatch('test-library-1.0.3.jar'),
         prod_folder,
-        '',
-        host,
     )
 
 
-@mock.patch('stork.update_databricks_library.load_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
 def test_update_databricks_filename_not_match(
     load_mock,
     prod_folder,
@@ -503,3 +1296,534 @@ def test_update_databricks_filename_not_match(
                 cleanup=False,
             )
             assert err.filename == 'test-library-1.0.3.zip'
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.store_digest_calls')
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    calls_returning(False),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_stores_digest(
+    store_mock,
+    load_mock,
+    prod_folder,
+    host,
+    cfg,
+):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        update_databricks(
+            logger,
+            path='some/path/to/test-library-1.0.3-py3.6.egg',
+            token='',
+            folder=prod_folder,
+            update_jobs=False,
+            cleanup=False,
+        )
+    store_mock.assert_called_with(
+        prod_folder,
+        FileNameMatch('test-library-1.0.3-py3.6.egg'),
+        'abc123',
+    )
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
+@mock.patch('stork.update_databricks_library.get_library_mapping')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
+@mock.patch(
+    'stork.library_digest.get_stored_digest_calls',
+    calls_returning('abc123'),
+)
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    calls_returning(True),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_identical_library(
+    update_mock,
+    lib_mock,
+    job_mock,
+    load_mock,
+    library_mapping,
+    id_nums,
+    job_list,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    job_mock.return_value = [job_list]
+    lib_mock.return_value = (library_mapping, id_nums)
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        update_databricks(
+            logger,
+            path='some/path/to/test-library-1.0.3-py3.6.egg',
+            token='',
+            folder=prod_folder,
+            update_jobs=True,
+            cleanup=False,
+        )
+    out = [r[2] for r in caplog.record_tuples]
+    assert out == [
+        'library test-library-1.0.3 already exists with identical contents: '
+        'skipping upload',
+        'current major version of test-library used by jobs: job_3',
+        'updated jobs: job_3',
+    ]
+    load_mock.assert_not_called()
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch(
+    'stork.library_digest.get_stored_digest_calls',
+    calls_returning('def456'),
+)
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    calls_returning(True),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_conflicting_library(load_mock, prod_folder, cfg):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(LibraryConflictError) as err:
+            update_databricks(
+                logger,
+                path='some/path/to/test-library-1.0.3-py3.6.egg',
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+    assert err.value.library_name == 'test-library-1.0.3'
+    load_mock.assert_not_called()
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch(
+    'stork.library_digest.get_stored_digest_calls',
+    calls_returning(None),
+)
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    calls_returning(True),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_exists_without_digest(
+    load_mock,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        update_databricks(
+            logger,
+            path='some/path/to/test-library-1.0.3-py3.6.egg',
+            token='',
+            folder=prod_folder,
+            update_jobs=True,
+            cleanup=True,
+        )
+    out = [r[2] for r in caplog.record_tuples]
+    assert len(out) == 1
+    assert out[0].startswith('This version (1.0.3) already exists')
+    load_mock.assert_not_called()
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
+@mock.patch('stork.update_databricks_library.get_library_mapping')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
+@mock.patch('stork.update_databricks_library.store_digest_calls')
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    calls_returning(False),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_store_digest_fails(
+    store_mock,
+    update_mock,
+    lib_mock,
+    job_mock,
+    load_mock,
+    library_mapping,
+    id_nums,
+    job_list,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    store_mock.side_effect = requests.ConnectionError(
+        'connection reset'
+    )
+    job_mock.return_value = [job_list]
+    lib_mock.return_value = (library_mapping, id_nums)
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        update_databricks(
+            logger,
+            path='some/path/to/test-library-1.0.3-py3.6.egg',
+            token='',
+            folder=prod_folder,
+            update_jobs=True,
+            cleanup=False,
+        )
+    out = [r[2] for r in caplog.record_tuples]
+    assert out == [
+        'could not record the digest of test-library-1.0.3: '
+        'connection reset - releasing it again will not update jobs, as its '
+        'contents can\'t be compared',
+        'new library test-library-1.0.3 loaded to Databricks',
+        'current major version of test-library used by jobs: job_3',
+        'updated jobs: job_3',
+    ]
+
+
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch('stork.update_databricks_library.get_job_lists')
+@mock.patch('stork.update_databricks_library.get_library_mapping')
+@mock.patch('stork.update_databricks_library.replace_job_libraries')
+@mock.patch('stork.update_databricks_library.delete_old_versions')
+def test_update_databricks_batch(
+    delete_mock,
+    update_mock,
+    lib_mock,
+    job_mock,
+    load_mock,
+    library_mapping,
+    id_nums,
+    job_list,
+    caplog,
+    prod_folder,
+    cfg,
+):
+    paths = [
+        'some/path/to/test-library-1.0.3-py3.6.egg',
+        'some/path/to/test-library-plus-stuff-0.1.0-py3.6.egg',
+    ]
+    plus_uri = '01832402-test-library-plus-stuff_0_1_0_py3_6-e5f8c.egg'
+    plus_path = job_list[0]['settings']['libraries'][1]['egg']
+    library_mapping = dict(library_mapping, **{
+        plus_uri: FileNameMatch('test-library-plus-stuff-0.1.0.egg'),
+    })
+    lib_mock.return_value = (library_mapping, id_nums)
+    job_mock.return_value = [
+        job_list,
+        [dict(job_list[0], library_path=plus_path)],
+    ]
+    update_mock.return_value = {
+        'updated': job_list,
+        'skipped': [],
+        'failed': [],
+    }
+    delete_mock.side_effect = [
+        {'deleted': ['test-library-1.0.1'], 'failed': []},
+        {'deleted': [], 'failed': []},
+    ]
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        update_databricks(
+            logger,
+            path=paths,
+            token='',
+            folder=prod_folder,
+            update_jobs=True,
+            cleanup=True,
+        )
+
+    matches = [
+        FileNameMatch('test-library-1.0.3-py3.6.egg'),
+        FileNameMatch('test-library-plus-stuff-0.1.0-py3.6.egg'),
+    ]
+    assert load_mock.call_count == 2
+    # the production folder and the jobs are only scanned once
+    lib_mock.assert_called_once()
+    job_mock.assert_called_once_with(
+        logger, matches, library_mapping, mock.ANY, snapshot=None,
+    )
+    # job_3 uses both libraries, so gets a single update replacing both
+    update_mock.assert_called_once_with(
+        logger,
+        [(
+            {
+                'job_id': 3,
+                'job_name': 'job_3',
+                'settings': job_list[0]['settings'],
+            },
+            {
+                job_list[0]['library_path']: (
+                    'egg',
+                    'dbfs:/FileStore/jars/'
+                    '47fb08a7-test-library_1_0_3_py3_6-e5f8c.egg',
+                ),
+                plus_path: ('egg', 'dbfs:/FileStore/jars/' + plus_uri),
+            },
+        )],
+        mock.ANY,
+        max_workers=1,
+        verify=False,
+    )
+    assert delete_mock.call_count == 2
+    out = [r[2] for r in caplog.record_tuples]
+    assert out == [
+        'new library test-library-1.0.3 loaded to Databricks',
+        'new library test-library-plus-stuff-0.1.0 loaded to Databricks',
+        'current major version of test-library used by jobs: job_3',
+        'current major version of test-library-plus-stuff used by jobs: job_3',
+        'updated jobs: job_3',
+        'removed old versions: test-library-1.0.1',
+    ]
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@mock.patch(
+    'stork.library_digest.get_stored_digest_calls',
+    calls_returning('def456'),
+)
+@mock.patch(
+    'stork.library_digest.library_exists_calls',
+    mock.Mock(side_effect=lambda folder, match: calls_returning(
+        match.library_name == 'test-library-plus-stuff'
+    )()),
+)
+@mock.patch(
+    'stork.update_databricks_library.file_digest',
+    mock.Mock(return_value='abc123'),
+)
+def test_update_databricks_batch_conflict(load_mock, prod_folder, cfg):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(LibraryConflictError):
+            update_databricks(
+                logger,
+                path=[
+                    'some/path/to/test-library-1.0.3-py3.6.egg',
+                    'some/path/to/test-library-plus-stuff-0.1.0-py3.6.egg',
+                ],
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+    # nothing is uploaded if any library conflicts
+    load_mock.assert_not_called()
+
+
+def test_update_databricks_batch_same_major_version(prod_folder, cfg):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg):
+        with pytest.raises(ValueError) as err:
+            update_databricks(
+                logger,
+                path=[
+                    'some/path/to/test-library-1.0.3-py3.6.egg',
+                    'some/path/to/test-library-1.0.4-py3.6.egg',
+                ],
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=True,
+            )
+    assert str(err.value) == (
+        'more than one version 1 of test-library given: only one version of '
+        'each major version of a library can be uploaded at once'
+    )
+
+
+@pytest.mark.usefixtures('new_library')
+@mock.patch('stork.update_databricks_library.load_library_calls')
+@responses.activate
+def test_update_databricks_snapshot(
+    load_mock,
+    tmp_path,
+    job_list_response,
+    workspace_list_response,
+    library_1,
+    library_2,
+    library_3,
+    library_4,
+    library_5,
+    library_6,
+    library_7,
+    job_update_response_list_new,
+    host,
+    prod_folder,
+    cfg,
+):
+    snapshot_factory = partial(WorkspaceSnapshot, snapshot_dir=str(tmp_path))
+    with snapshot_factory(host) as snapshot:
+        snapshot.sync_jobs(job_list_response['jobs'])
+        for lib in [
+            library_1,
+            library_2,
+            library_3,
+            library_4,
+            library_5,
+            library_6,
+        ]:
+            snapshot.set(lib['id'], lib)
+        snapshot.save()
+        snapshot.mark_synced()
+
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/workspace/list',
+        status=200,
+        json=workspace_list_response,
+    )
+    responses.add(
+        responses.GET,
+        host + '/api/1.2/libraries/status?libraryId=7',
+        status=200,
+        json=library_7,
+    )
+    job_3 = job_list_response['jobs'][2]
+    responses.add(
+        responses.GET,
+        host + '/api/2.0/jobs/get?job_id=3',
+        status=200,
+        json=job_3,
+    )
+    responses.add(responses.POST, host + '/api/2.0/jobs/reset', status=200)
+
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg), \
+            mock.patch(
+                'stork.update_databricks_library.WorkspaceSnapshot',
+                snapshot_factory,
+            ):
+        update_databricks(
+            logger,
+            path='some/path/to/test-library-1.0.3-py3.6.egg',
+            token='',
+            folder=prod_folder,
+            update_jobs=True,
+            cleanup=False,
+            use_snapshot=True,
+        )
+
+    # jobs aren't listed: only the job being updated is fetched, to verify it
+    assert [
+        urlparse(call.request.url).path for call in responses.calls
+    ] == [
+        '/api/2.0/workspace/list',
+        '/api/1.2/libraries/status',
+        '/api/2.0/jobs/get',
+        '/api/2.0/jobs/reset',
+    ]
+    assert (
+        json.loads(responses.calls[3].request.body) ==
+        job_update_response_list_new[0]
+    )
+    with snapshot_factory(host) as snapshot:
+        assert [
+            job['settings'] for job in snapshot.iter_jobs()
+            if job['job_id'] == 3
+        ] == [job_update_response_list_new[0]['new_settings']]
+
+
+def test_update_databricks_snapshot_unsynced_job(tmp_path, caplog):
+    workspace = FakeWorkspace.synthetic(n_jobs=10, n_libraries=5)
+    cfg_path = tmp_path / '.storkcfg'
+    library_path = tmp_path / 'library_0-1.0.5-py3.6.egg'
+    library_path.write_bytes(b'egg')
+    snapshot_factory = partial(
+        WorkspaceSnapshot,
+        snapshot_dir=str(tmp_path / 'snapshots'),
+    )
+    old_versions = {
+        lib['name']: lib for lib in workspace.libraries.values()
+    }
+
+    with FakeDatabricks(workspace) as server, \
+            mock.patch('stork.update_databricks_library.CFG_FILE',
+                       str(cfg_path)), \
+            mock.patch('stork.sync_workspace.WorkspaceSnapshot',
+                       snapshot_factory), \
+            mock.patch('stork.update_databricks_library.WorkspaceSnapshot',
+                       snapshot_factory):
+        cfg_path.write_text(
+            '[DEFAULT]\nhost = {}\nprod_folder = {}\n'
+            .format(server.url, workspace.prod_folder)
+        )
+        sync_workspace(logger, token='')
+        unsynced_job = workspace.add_job('unsynced_job', [
+            workspace.job_library(old_versions['library_0-1.0.1']),
+        ])
+        update_databricks(
+            logger,
+            path=str(library_path),
+            token='',
+            folder=workspace.prod_folder,
+            update_jobs=True,
+            cleanup=True,
+            use_snapshot=True,
+        )
+        jobs_reset = server.count('POST', '/api/2.0/jobs/reset')
+        libraries_deleted = server.count('POST', '/api/1.2/libraries/delete')
+
+    # the synced jobs are updated, but the job the snapshot doesn't know
+    #  still uses an old version, so none is removed
+    assert jobs_reset > 0
+    assert libraries_deleted == 0
+    assert set(old_versions) <= {
+        lib['name'] for lib in workspace.libraries.values()
+    }
+    assert workspace.get_job(unsynced_job)['settings']['libraries'] == [
+        workspace.job_library(old_versions['library_0-1.0.1']),
+    ]
+    assert caplog.record_tuples[-1][2] == (
+        'not removing old versions: still used by jobs changed since the '
+        'jobs to update were listed: unsynced_job'
+    )
+
+
+@mock.patch('stork.update_databricks_library.load_library_calls')
+def test_update_databricks_no_snapshot(
+    load_mock,
+    tmp_path,
+    host,
+    prod_folder,
+    cfg,
+):
+    with mock.patch('stork.update_databricks_library.CFG_FILE', cfg), \
+            mock.patch(
+                'stork.update_databricks_library.WorkspaceSnapshot',
+                partial(WorkspaceSnapshot, snapshot_dir=str(tmp_path)),
+            ):
+        with pytest.raises(ValueError) as err:
+            update_databricks(
+                logger,
+                path='some/path/to/test-library-1.0.3-py3.6.egg',
+                token='',
+                folder=prod_folder,
+                update_jobs=True,
+                cleanup=False,
+                use_snapshot=True,
+            )
+    assert str(err.value) == (
+        'no snapshot of {} found: please run `stork sync` first'.format(host)
+    )
+    load_mock.assert_not_called()
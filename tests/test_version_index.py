@@ -0,0 +1,53 @@
+from stork.file_name import FileNameMatch
+from stork.version_index import VersionIndex
+
+
+def test_from_id_nums(id_nums):
+    index = VersionIndex.from_id_nums(id_nums)
+
+    assert len(index) == 7
+    assert [
+        lib['id_num']
+        for lib in index.older_than(FileNameMatch('test-library-1.0.3.egg'))
+    ] == [5, 6]
+    assert index.older_than(FileNameMatch('test-library-1.0.1.egg')) == []
+    assert index.older_than(FileNameMatch('test-library-2.0.0.egg')) == []
+    assert index.older_than(FileNameMatch('other-library-1.0.3.egg')) == []
+
+
+def test_older_than_sorts_by_version():
+    index = VersionIndex()
+    for filename in [
+        'test-library-1.10.0.egg',
+        'test-library-1.9.0.egg',
+        'test-library-1.2.11.egg',
+        'test-library-1.2.2-SNAPSHOT.egg',
+        'test-library-0.11.0.egg',
+    ]:
+        index.add(FileNameMatch(filename), filename)
+
+    assert index.older_than(FileNameMatch('test-library-1.11.0.egg')) == [
+        'test-library-1.2.2-SNAPSHOT.egg',
+        'test-library-1.2.11.egg',
+        'test-library-1.9.0.egg',
+        'test-library-1.10.0.egg',
+    ]
+    assert index.older_than(FileNameMatch('test-library-1.10.0.egg')) == [
+        'test-library-1.2.2-SNAPSHOT.egg',
+        'test-library-1.2.11.egg',
+        'test-library-1.9.0.egg',
+    ]
+    # the same version is not older, snapshot or not
+    assert index.older_than(
+        FileNameMatch('test-library-1.2.2.egg')
+    ) == []
+
+
+def test_older_than_keeps_equal_versions_in_order():
+    index = VersionIndex()
+    for value in ['first', 'second', 'third']:
+        index.add(FileNameMatch('test-library-1.0.0.egg'), value)
+
+    assert index.older_than(FileNameMatch('test-library-1.1.0.egg')) == [
+        'first', 'second', 'third',
+    ]
@@ -0,0 +1,194 @@
+import logging
+import threading
+from functools import partial
+from unittest import mock
+
+import pytest
+
+from stork.call_timings import CallTimings
+from stork.snapshot import WorkspaceSnapshot
+from stork.sync_workspace import sync_workspace
+from stork.workspaces import (
+    load_profiles,
+    update_workspaces,
+    WorkspaceDeployError,
+)
+
+from .fake_databricks import FakeDatabricks, FakeWorkspace
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def write_cfg(tmp_path):
+    def write(contents):
+        cfg_path = tmp_path / '.storkcfg'
+        cfg_path.write_text(contents)
+        return str(cfg_path)
+    return write
+
+
+@pytest.fixture
+def servers():
+    with FakeDatabricks(FakeWorkspace.synthetic(30, 10)) as dev, \
+            FakeDatabricks(FakeWorkspace.synthetic(30, 10, seed=1)) as prod:
+        yield {'dev': dev, 'prod': prod}
+
+
+@pytest.fixture
+def servers_cfg(servers, write_cfg):
+    return write_cfg(
+        '[DEFAULT]\ntoken = default-token\nprod_folder = {}\n'
+        .format(servers['dev'].workspace.prod_folder)
+        + ''.join(
+            '[{}]\nhost = {}\n'.format(profile, server.url)
+            for profile, server in servers.items()
+        )
+    )
+
+
+@pytest.fixture
+def library_path(tmp_path):
+    path = tmp_path / 'library_0-1.0.5-py3.6.egg'
+    path.write_bytes(b'egg')
+    return str(path)
+
+
+def test_load_profiles(write_cfg):
+    cfg = write_cfg(
+        '[DEFAULT]\nhost = https://default\ntoken = default-token\n'
+        'prod_folder = /prod\n'
+        '[dev]\nhost = https://dev\n'
+        '[prod]\nhost = https://prod\ntoken = prod-token\n'
+    )
+
+    with mock.patch('stork.workspaces.CFG_FILE', cfg):
+        assert load_profiles() == {
+            'dev': {
+                'host': 'https://dev',
+                'token': 'default-token',
+                'prod_folder': '/prod',
+            },
+            'prod': {
+                'host': 'https://prod',
+                'token': 'prod-token',
+                'prod_folder': '/prod',
+            },
+        }
+        assert list(load_profiles(['prod'])) == ['prod']
+
+
+@pytest.mark.parametrize('contents, profiles', [
+    ('[DEFAULT]\nhost = https://default\n', None),
+    ('[dev]\nhost = https://dev\ntoken = a\nprod_folder = /prod\n', ['qa']),
+    ('[dev]\nhost = https://dev\ntoken = a\n', None),
+    (
+        '[DEFAULT]\nhost = https://default\ntoken = a\nprod_folder = /prod\n'
+        '[dev]\n[prod]\n',
+        None,
+    ),
+])
+def test_load_profiles_invalid(write_cfg, contents, profiles):
+    cfg = write_cfg(contents)
+
+    with mock.patch('stork.workspaces.CFG_FILE', cfg):
+        with pytest.raises(ValueError):
+            load_profiles(profiles)
+
+
+def test_update_workspaces(servers, servers_cfg, library_path):
+    with mock.patch('stork.workspaces.CFG_FILE', servers_cfg), \
+            mock.patch('stork.update_databricks_library.CFG_FILE',
+                       servers_cfg):
+        results = update_workspaces(logger, [library_path], max_workers=2)
+
+    assert {
+        profile: result['status'] for profile, result in results.items()
+    } == {'dev': 'deployed', 'prod': 'deployed'}
+    for server in servers.values():
+        assert [
+            lib['name'] for lib in server.workspace.libraries.values()
+            if lib['name'].startswith('library_0-')
+        ] == ['library_0-1.0.5']
+
+
+def test_update_workspaces_snapshot(
+    servers,
+    servers_cfg,
+    library_path,
+    tmp_path,
+):
+    snapshot_factory = partial(
+        WorkspaceSnapshot,
+        snapshot_dir=str(tmp_path / 'snapshots'),
+    )
+    timings = CallTimings()
+
+    with mock.patch('stork.workspaces.CFG_FILE', servers_cfg), \
+            mock.patch('stork.update_databricks_library.CFG_FILE',
+                       servers_cfg), \
+            mock.patch('stork.sync_workspace.WorkspaceSnapshot',
+                       snapshot_factory), \
+            mock.patch('stork.update_databricks_library.WorkspaceSnapshot',
+                       snapshot_factory):
+        for profile in servers:
+            sync_workspace(logger, token='', profile=profile)
+        results = update_workspaces(
+            logger,
+            [library_path],
+            use_snapshot=True,
+            timings=timings,
+        )
+
+    assert {
+        profile: result['status'] for profile, result in results.items()
+    } == {'dev': 'deployed', 'prod': 'deployed'}
+    # the calls to each workspace are timed apart
+    for profile, server in servers.items():
+        assert server.count('POST', '/api/2.0/jobs/reset') > 0
+        assert sum(
+            row['count'] for row in timings.summary()
+            if row['workspace'] == profile
+            and row['endpoint'] == 'POST /api/2.0/jobs/reset'
+        ) == server.count('POST', '/api/2.0/jobs/reset')
+
+
+def test_update_workspaces_failure(servers, servers_cfg, library_path):
+    servers['prod'].fail(
+        'GET',
+        '/api/2.0/workspace/get-status',
+        status=403,
+        error_code='PERMISSION_DENIED',
+    )
+
+    with mock.patch('stork.workspaces.CFG_FILE', servers_cfg), \
+            mock.patch('stork.update_databricks_library.CFG_FILE',
+                       servers_cfg):
+        with pytest.raises(WorkspaceDeployError) as err:
+            update_workspaces(logger, [library_path], ['dev', 'prod'])
+
+    assert list(err.value.failed) == ['prod']
+    assert 'PERMISSION_DENIED' in err.value.failed['prod']
+    # the other workspace is still released
+    assert any(
+        lib['name'] == 'library_0-1.0.5'
+        for lib in servers['dev'].workspace.libraries.values()
+    )
+
+
+@mock.patch('stork.workspaces.update_databricks')
+def test_update_workspaces_concurrent(
+    update_databricks_mock,
+    servers_cfg,
+    library_path,
+):
+    # each release waits for the other, so they must run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    update_databricks_mock.side_effect = lambda *args, **kwargs: barrier.wait()
+
+    with mock.patch('stork.workspaces.CFG_FILE', servers_cfg):
+        update_workspaces(logger, [library_path])
+
+    assert sorted(
+        call[1]['profile'] for call in update_databricks_mock.call_args_list
+    ) == ['dev', 'prod']
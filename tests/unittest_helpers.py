@@ -1,3 +1,6 @@
+from unittest import mock
+
+
 def strip_whitespace(string_value):
     """
     Return the input string without space, tab,
@@ -6,3 +9,15 @@ def strip_whitespace(string_value):
     return ''.join(
         [c for c in string_value if c != ' ' and c != '\n' and c != '\t']
     )
+
+
+def calls_returning(value):
+    """
+    Return a mock of a generator of API calls (see stork.api_calls)
+    which makes no calls and returns value
+    """
+    def calls(*args, **kwargs):
+        return value
+        yield
+
+    return mock.Mock(side_effect=calls)